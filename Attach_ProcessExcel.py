@@ -3,16 +3,42 @@ import sys
 import time
 import os
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from openpyxl import load_workbook, Workbook
-from Chat_ProcessSingleInput import process_question
+from Chat_ProcessSingleInput import process_question, process_question_batch
 from L5XGen_Routine import ProcessRoutineExcel, GenerateRoutine
 from L5XGen_AOI import GenerateAOI
+from L5XGen_Program import ProcessProjectExcel, GenerateProgram, group_column_index
+from Metrics_Registry import STAGE_LATENCY, PIPELINE_ERRORS, EXCEL_ROWS
 
-def process_excel_file(input_file_path: str, mode: str, log_file_path: str = "LogExcel.xlsx", output_l5x_path: str = "Output.L5X"):
+DEFAULT_EXCEL_CONCURRENCY = int(os.environ.get("LLM4L5X_EXCEL_CONCURRENCY", "4"))
+MAX_EXCEL_CONCURRENCY = 16
+DEFAULT_EXCEL_BATCH_SIZE = int(os.environ.get("LLM4L5X_EXCEL_BATCH_SIZE", "1"))  # rows per model prompt, 1 = no batching
+
+# Modes that export every routine of the workbook as one Program/Controller L5X
+PROJECT_MODES = {"program": "Program", "controller": "Controller"}
+
+PIPELINE = "process_excel_file"   # label for the per-stage metrics
+
+def _observe_stage(stage: str, start_time: float) -> float:
+    """Records the time since start_time for this stage and returns the new start time."""
+    now = time.time()
+    STAGE_LATENCY.observe(now - start_time, pipeline=PIPELINE, stage=stage)
+    return now
+
+def process_excel_file(input_file_path: str, mode: str, log_file_path: str = "LogExcel.xlsx", output_l5x_path: str = "Output.L5X",
+                       concurrency: int = DEFAULT_EXCEL_CONCURRENCY, batch_size: int = DEFAULT_EXCEL_BATCH_SIZE, protocol: str = None,
+                       group_column=None):
     """
     Processes an Excel file and generates Routine or AOI L5X file based on mode.
+    Modes 'program' and 'controller' export several routines in one L5X: one per sheet, or the
+    rows of the first sheet grouped by group_column (a column letter or header).
+    Rows are packed 'batch_size' at a time into one LineX-labeled model prompt, and up to
+    'concurrency' prompts are sent at once; results and log entries keep the sheet order.
+    protocol selects the model output format ('full' or 'compact', default IL_PROTOCOL).
     Returns True on success, False on failure.
     """
+    total_start = stage_start = time.time()
     try:
         # Load input Excel
         try:
@@ -20,6 +46,9 @@ def process_excel_file(input_file_path: str, mode: str, log_file_path: str = "Lo
             ws = wb.active
         except Exception as e:
             raise ValueError(f"❌ Failed to read Excel file: {e}")
+        # Check the group column before any rows go to the model
+        if mode in PROJECT_MODES and group_column is not None:
+            group_column_index(ws, group_column)
 
         # Prepare log workbook
         try:
@@ -36,24 +65,44 @@ def process_excel_file(input_file_path: str, mode: str, log_file_path: str = "Lo
             "Model Output", "Detected Keywords", "Detected Instruction", "Match"
         ])
 
-        num = 0
-
-        # Process each question row
-        for row_idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-            question_cell = row[0]
+        # Collect question rows first so they can be processed concurrently
+        jobs = []
+        sheets = wb.worksheets if mode in PROJECT_MODES and group_column is None else [ws]
+        for sheet in sheets:
+            for row_idx, row in enumerate(sheet.iter_rows(min_row=2), start=2):
+                question = row[0].value
+                if not question:
+                    continue
+                jobs.append((len(jobs) + 1, row_idx, row, question))
+        stage_start = _observe_stage("read", stage_start)
+
+        def run_batch(batch):
+            print(f"\n[{batch[0][0]}-{batch[-1][0]}]---------------------------------------------------------------------------------------------")
+            questions = [question for _, _, _, question in batch]
+            try:
+                if len(batch) == 1:
+                    return [(process_question(questions[0], protocol), None)]
+                return [(result, None) for result in process_question_batch(questions, protocol)]
+            except Exception as e:
+                traceback.print_exc()
+                return [(None, e)] * len(batch)
+
+        workers = max(1, min(int(concurrency or 1), MAX_EXCEL_CONCURRENCY))
+        size = max(1, int(batch_size or 1))
+        batches = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+        print(f"Processing {len(jobs)} rows in {len(batches)} batch(es) of up to {size} with {workers} worker(s)")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = [outcome for batch_outcomes in executor.map(run_batch, batches) for outcome in batch_outcomes]
+        stage_start = _observe_stage("questions", stage_start)
+
+        # Write results back in the original row order
+        for (num, row_idx, row, question), (result, error) in zip(jobs, outcomes):
             ilcode_cell = row[1]
             response_time_cell = row[2]
 
-            question = question_cell.value
-            if not question:
-                continue
-
-            num += 1
-            print(f"\n[{num}]---------------------------------------------------------------------------------------------")
-            start_time = time.time()
-
             try:
-                result = process_question(question)
+                if error is not None:
+                    raise error
 
                 ilcode_cell.value = result["final_output"]
                 response_time_cell.value = result["time_taken"]
@@ -70,32 +119,49 @@ def process_excel_file(input_file_path: str, mode: str, log_file_path: str = "Lo
                         if validated["detected_instrs"][i] else "None",
                         validated["matches"][i]
                     ])
+                EXCEL_ROWS.inc(outcome="error" if result["error"] else "ok")
 
             except Exception as e:
                 print(f"❌ Error processing question in row {row_idx}: {e}")
                 traceback.print_exc()
                 ilcode_cell.value = "Error"
                 response_time_cell.value = "Error"
+                EXCEL_ROWS.inc(outcome="error")
+                PIPELINE_ERRORS.inc(pipeline=PIPELINE)
 
         # Save updated input file
         wb.save(input_file_path)
+        stage_start = _observe_stage("write_results", stage_start)
 
         # Generate L5X text
         try:
-            text_output = ProcessRoutineExcel(input_file_path)
+            if mode in PROJECT_MODES:
+                project_routines = ProcessProjectExcel(input_file_path, group_column)
+            else:
+                text_output = ProcessRoutineExcel(input_file_path)
         except Exception as e:
             print(f"❌ Error extracting text output: {e}")
             traceback.print_exc()
             return False  # Failed to extract text
+        stage_start = _observe_stage("extract_text", stage_start)
 
         # Generate L5X file
         if mode == 'routine':
-            routine_result = GenerateRoutine(text_output, output_file=output_l5x_path)
+            routine_result = GenerateRoutine(text_output, output_file=output_l5x_path, return_text=False)
             if routine_result["success"]:
                 print(f"✅ Routine file generated: {output_l5x_path}")
             else:
                 print(f"❌ Failed to generate routine: {routine_result['error']}")
                 return False
+        elif mode in PROJECT_MODES:
+            project_result = GenerateProgram(project_routines, output_file=output_l5x_path,
+                                             target=PROJECT_MODES[mode], return_text=False)
+            if project_result["success"]:
+                print(f"✅ {PROJECT_MODES[mode]} file generated with {len(project_result['routines'])} routine(s) "
+                      f"and {project_result['tag_count']} tag(s): {output_l5x_path}")
+            else:
+                print(f"❌ Failed to generate {mode}: {project_result['error']}")
+                return False
         elif mode == 'aoi':
             aoi_result = GenerateAOI(text_output, output_file=output_l5x_path)
             if aoi_result["success"]:
@@ -106,11 +172,13 @@ def process_excel_file(input_file_path: str, mode: str, log_file_path: str = "Lo
         else:
             print(f"⚠️ Unknown mode: {mode}. No L5X file generated.")
             return False
+        stage_start = _observe_stage("generate_l5x", stage_start)
 
         # Save log file
         try:
             log_wb.save(log_file_path)
             print(f"✅ Log file generated: {log_file_path}")
+            _observe_stage("save_log", stage_start)
         except Exception as e:
             print(f"❌ Error saving log file: {e}")
             traceback.print_exc()
@@ -120,5 +188,7 @@ def process_excel_file(input_file_path: str, mode: str, log_file_path: str = "Lo
         print(f"❌ Unhandled processing error: {e}")
         traceback.print_exc()
         return False
+    finally:
+        _observe_stage("total", total_start)
 
     return True  # ✅ SUCCESS
@@ -0,0 +1,232 @@
+# Bench_Pipeline.py
+#
+# Stage-level latency benchmark for the chat pipeline. Model calls are served by a ReplayBackend,
+# so the numbers show what the Python stages cost and are comparable between releases.
+#
+#   python Bench_Pipeline.py --output bench.json
+#   python Bench_Pipeline.py --baseline bench.json --threshold 0.25     # exit code 1 on regression
+#   python Bench_Pipeline.py --latency-ms 800 --ms-per-token 20         # simulate a real model server
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+
+# === Configurable variables ===
+DEFAULT_CORPUS = "Bench_Pipeline_corpus.json"
+DEFAULT_ITERATIONS = 50
+DEFAULT_WARMUP = 3
+DEFAULT_THRESHOLD = 0.25        # allowed relative slowdown of the compared percentile
+DEFAULT_MIN_DELTA_MS = 0.05     # ignore regressions smaller than this (timer noise on sub-ms stages)
+DEFAULT_METRIC = "p95_ms"
+
+STAGES = ["intent", "synthesize", "il_generation", "parse", "validate", "sanitize", "rung", "end_to_end"]
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(durations) -> dict:
+    """Turns a list of durations (seconds) into the per-stage report entry."""
+    values = sorted(durations)
+    total = sum(values)
+    return {
+        "count": len(values),
+        "mean_ms": round(total / len(values) * 1000, 4) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 4),
+        "p95_ms": round(percentile(values, 95) * 1000, 4),
+        "p99_ms": round(percentile(values, 99) * 1000, 4),
+        "max_ms": round(values[-1] * 1000, 4) if values else 0.0,
+        "throughput_per_s": round(len(values) / total, 2) if total else 0.0
+    }
+
+
+def load_corpus(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_replay_backend(corpus: list, args):
+    """Creates the ReplayBackend and registers the corpus responses under the current system prompts."""
+    from model_Backend import ReplayBackend
+    import model_ILCodeGen
+    import model_IntentionAnalyzer
+
+    backend = ReplayBackend(path=args.replay, latency_ms=args.latency_ms, ms_per_token=args.ms_per_token, on_miss="error")
+    for entry in corpus:
+        question = entry["question"]
+        if entry.get("il_output"):
+            backend.add_response(model_ILCodeGen.MODEL_NAME, [
+                {"role": "system", "content": model_ILCodeGen.SYSTEM_MESSAGE},
+                {"role": "user", "content": question}
+            ], entry["il_output"])
+        if entry.get("intent_response"):
+            backend.add_response(model_IntentionAnalyzer.MODEL_NAME, [
+                {"role": "system", "content": model_IntentionAnalyzer.SYSTEM_MESSAGE},
+                {"role": "user", "content": question}
+            ], entry["intent_response"])
+    return backend
+
+
+def run_question(question: str, timings: dict):
+    """Runs one question through every stage, appending each stage's duration to timings."""
+    from model_IntentionAnalyzer import get_intention_response
+    from model_ILCodeGen import get_model_response
+    from Validator_ParseModelResponse import parse_model_output
+    from Validator_ProcessParsedResponse import process_instruction_pairs
+    from Chat_SanitizeModelOutput import sanitize_model_output
+    from Chat_ProcessSingleInput import process_question, split_question_lines
+    from Chat_TemplateSynthesizer import synthesize_lines
+    from L5XGen_Rung import GenerateRung
+
+    def timed(stage, func, *func_args):
+        start_time = time.perf_counter()
+        value = func(*func_args)
+        timings[stage].append(time.perf_counter() - start_time)
+        return value
+
+    timed("intent", get_intention_response, question)
+    timed("synthesize", synthesize_lines, split_question_lines(question))
+    raw_output = timed("il_generation", get_model_response, question)
+    pairs = timed("parse", parse_model_output, raw_output)
+    result = timed("validate", process_instruction_pairs, pairs, question)
+    combined_output = " ".join(result["ops"]).strip() if result["ops"] else raw_output.strip()
+    final_output = timed("sanitize", sanitize_model_output, combined_output)
+    rung = timed("rung", GenerateRung, final_output)
+    if not rung["success"]:
+        raise RuntimeError(f"GenerateRung failed: {rung['error']}")
+
+    result_data = timed("end_to_end", process_question, question)
+    if result_data["error"]:
+        raise RuntimeError(f"process_question failed: {result_data['error']}")
+
+
+def run_benchmark(corpus: list, args) -> dict:
+    from model_Backend import set_backend
+
+    backend = build_replay_backend(corpus, args)
+    set_backend(backend)
+
+    timings = {stage: [] for stage in STAGES}
+    discard = {stage: [] for stage in STAGES}
+    sink = sys.stdout if args.verbose else open(os.devnull, "w", encoding="utf-8")
+
+    wall_start = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        for _ in range(args.warmup):
+            for entry in corpus:
+                run_question(entry["question"], discard)
+        for _ in range(args.iterations):
+            for entry in corpus:
+                run_question(entry["question"], timings)
+    wall_time = time.perf_counter() - wall_start
+    if sink is not sys.stdout:
+        sink.close()
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {
+            "corpus": args.corpus,
+            "questions": len(corpus),
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "latency_ms": args.latency_ms,
+            "ms_per_token": args.ms_per_token,
+            "cache": args.with_cache
+        },
+        "wall_time_s": round(wall_time, 3),
+        "replay": dict(backend.stats),
+        "stages": {stage: summarize(durations) for stage, durations in timings.items()}
+    }
+
+
+def find_regressions(report: dict, baseline: dict, metric: str, threshold: float, min_delta_ms: float) -> list:
+    """Lists every stage whose metric grew by more than threshold (relative) and min_delta_ms (absolute)."""
+    regressions = []
+    for stage, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or metric not in previous:
+            continue
+        limit = previous[metric] * (1 + threshold)
+        if current[metric] > limit and current[metric] - previous[metric] > min_delta_ms:
+            regressions.append({
+                "stage": stage,
+                "metric": metric,
+                "baseline": previous[metric],
+                "current": current[metric],
+                "ratio": round(current[metric] / previous[metric], 3) if previous[metric] else None
+            })
+    return regressions
+
+
+def print_table(report: dict):
+    print(f"{'stage':<15}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'ops/s':>11}", file=sys.stderr)
+    for stage, s in report["stages"].items():
+        print(f"{stage:<15}{s['count']:>7}{s['p50_ms']:>11.3f}{s['p95_ms']:>11.3f}{s['p99_ms']:>11.3f}{s['throughput_per_s']:>11.1f}", file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Stage-level latency benchmark for the chat pipeline.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON list of {question, il_output, intent_response}")
+    parser.add_argument("--replay", default="", help="optional recording file (LLM4L5X_BACKEND=record) with extra responses")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="synthetic fixed latency per model call")
+    parser.add_argument("--ms-per-token", type=float, default=0.0, help="synthetic latency per generated token")
+    parser.add_argument("--with-cache", action="store_true", help="keep the response cache on (off by default)")
+    parser.add_argument("--output", default="", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default="", help="previous JSON report to compare against")
+    parser.add_argument("--metric", default=DEFAULT_METRIC, choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"])
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS)
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    args = parser.parse_args(argv)
+
+    # Must be set before the model modules are imported
+    os.environ["LLM4L5X_CACHE_ENABLED"] = "1" if args.with_cache else "0"
+    os.environ["LLM4L5X_BACKEND"] = "replay"
+
+    corpus = load_corpus(args.corpus)
+    report = run_benchmark(corpus, args)
+
+    exit_code = 0
+    if report["replay"]["misses"]:
+        print(f"❌ {report['replay']['misses']} model call(s) had no recorded response; complete the corpus.", file=sys.stderr)
+        exit_code = 2
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["baseline"] = args.baseline
+        report["regressions"] = find_regressions(report, baseline, args.metric, args.threshold, args.min_delta_ms)
+        for r in report["regressions"]:
+            print(f"❌ {r['stage']} regressed: {r['metric']} {r['baseline']} -> {r['current']} (x{r['ratio']})", file=sys.stderr)
+        if report["regressions"] and not exit_code:
+            exit_code = 1
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    print_table(report)
+    if exit_code == 0:
+        print("✅ Benchmark finished", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,52 @@
 # Chat_ProcessSingleInput.py
+import os
 import time
 import re
+import asyncio
 import traceback
 
-from model_ILCodeGen import get_model_response
+from model_Client import run_sync
+from model_ILCodeGen import get_model_response, get_model_response_async, stream_model_response, resolve_protocol
+from model_ILCodeGen import split_question_lines, LINE_LABEL_PATTERN
+from model_ILCodeGen import il_token_estimate, IL_MAX_TOKENS, IL_ERROR_MESSAGE
 
-from Validator_ParseModelResponse import parse_model_output
-from Validator_ProcessParsedResponse import process_instruction_pairs
-from Validator_Reprompt import generate_reprompt
+from Validator_ParseModelResponse import parse_model_output, parse_model_output_labeled, line_label_number, create_output_parser
+from Validator_ProcessParsedResponse import process_instruction_pairs, validate_instruction
+from Validator_Reprompt import generate_reprompt, generate_partial_reprompt
 
 from Chat_SanitizeModelOutput import sanitize_model_output
+from Chat_TemplateSynthesizer import synthesize_lines, render_instruction_pairs
+from Metrics_Registry import STAGE_LATENCY, PIPELINE_ERRORS
 
-def process_question(question: str):
+ALLOW_REPROMPT = False # Keep this as per your original code
+
+# off     - no validation-driven correction
+# full    - generate_reprompt: the model redoes the whole answer (ALLOW_REPROMPT)
+# partial - only the mismatched lines are re-asked and merged back
+REPROMPT_MODE = os.environ.get("LLM4L5X_REPROMPT_MODE", "full" if ALLOW_REPROMPT else "off").lower()
+PARTIAL_REPROMPT_MAX_ATTEMPTS = int(os.environ.get("LLM4L5X_REPROMPT_MAX_ATTEMPTS", "2"))
+PARTIAL_REPROMPT_BUDGET = float(os.environ.get("LLM4L5X_REPROMPT_BUDGET", "15"))  # seconds for all attempts together
+
+# Stop a streamed generation at the first line that will force a reprompt anyway
+STREAM_EARLY_ABORT = os.environ.get("LLM4L5X_STREAM_EARLY_ABORT", "1") == "1"
+
+# Build IL from templates, without the model, when every line of a question resolves (Chat_TemplateSynthesizer)
+TEMPLATE_SYNTHESIS = os.environ.get("LLM4L5X_TEMPLATE_SYNTHESIS", "1") == "1"
+
+PIPELINE = "process_question"   # label for the per-stage metrics
+
+async def run_off_loop(fn, *args):
     """
-    Handles single question processing end-to-end.
-    Returns a dictionary of the results.
+    Runs a CPU-bound pipeline step (parsing, validation, synthesis, sanitizing) in the event loop's
+    default executor, so the shared model_Client loop only ever waits on model calls.
     """
-    print(f"Processing -------------------------------------------------------------------------------------")
-    print(f"Question: {question}")
-    result_data = {
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+def new_result_data(question: str, protocol: str = "full") -> dict:
+    return {
         "question": question,
+        "protocol": protocol,
+        "line_texts": None,
         "model_output": None,
         "parsed_instructions": [],
         "validated_instructions": [],
@@ -29,55 +56,561 @@ def process_question(question: str):
         "time_taken": None
     }
 
-    try:
-        start_time = time.time()
+def prepare_il_prompt(question: str, result_data: dict) -> str:
+    """
+    Returns the IL prompt for result_data's protocol. The compact protocol does not echo the input,
+    so the question is labeled here and the line texts are kept in result_data for the parser.
+    """
+    if result_data["protocol"] != "compact":
+        return question
+    result_data["line_texts"] = split_question_lines(question) or [question]
+    return build_batch_prompt(result_data["line_texts"])
 
-        raw_output = get_model_response(question) 
-        print(f"\n[Model output]\n{raw_output}\n")
-        result_data["model_output"] = raw_output
+def validate_model_output(question: str, raw_output: str, result_data: dict):
+    """
+    Parses and validates one raw model response into result_data.
+    Returns the validation result, or None if nothing could be parsed.
+    """
+    result_data["model_output"] = raw_output
+    with STAGE_LATENCY.time(pipeline=PIPELINE, stage="parse"):
+        instruction_pairs = parse_model_output(raw_output, result_data["protocol"], result_data["line_texts"])
+    return validate_instruction_pairs(question, instruction_pairs, raw_output, result_data)
 
-        instruction_pairs = parse_model_output(raw_output)
+def validate_instruction_pairs(question: str, instruction_pairs, raw_output: str, result_data: dict):
+    result_data["parsed_instructions"] = instruction_pairs
 
-        if not instruction_pairs:
-            print("No instructions parsed.")
-            print(f"Raw_Output: {raw_output}")
-        else:
-            result = process_instruction_pairs(instruction_pairs, question)
-            result_data["validated_instructions"] = result
-
-            allow_reprompt = False # Keep this as per your original code
-
-            if allow_reprompt:
-                if "No" in result["matches"]:
-                    reprompt_text = generate_reprompt(
-                        question=question,
-                        model_outputs=result["instruction_lines"],
-                        detected_instrs=result["detected_instrs"],
-                        operand_counts=result["operand_counts"],
-                        matches=result["matches"],
-                        found_keywords_list=result["found_keywords_list"],
-                        model_keywords_list=result["model_keywords_list"]
-                    )
-                    print("[Reprompting & Re-Processing]--->>>>>>>>>>>>>>>>>>---------------|")
-                    print(reprompt_text)
-                    raw_output = get_model_response(reprompt_text) # Re-invokes model_ILCodeGen
-                    print(f"[New Model Output]\n{raw_output}\n")
-                    result_data["reprompted"] = True
-                    instruction_pairs = parse_model_output(raw_output)
-                    if instruction_pairs:
-                        result = process_instruction_pairs(instruction_pairs, question)
-                        result_data["validated_instructions"] = result
-
-        combined_output = ' '.join(result["ops"]).strip() if result and result["ops"] else raw_output.strip()
-        print(f"Combined Output: {combined_output}")
+    if not instruction_pairs:
+        print("No instructions parsed.")
+        print(f"Raw_Output: {raw_output}")
+        return None
+
+    with STAGE_LATENCY.time(pipeline=PIPELINE, stage="validate"):
+        result = process_instruction_pairs(instruction_pairs, question)
+    result_data["validated_instructions"] = result
+    return result
+
+def build_reprompt(question: str, result):
+    """
+    Returns the reprompt text when reprompting is enabled and validation found mismatches, else None.
+    """
+    if REPROMPT_MODE != "full" or not result or "No" not in result["matches"]:
+        return None
+
+    reprompt_text = generate_reprompt(
+        question=question,
+        model_outputs=result["instruction_lines"],
+        detected_instrs=result["detected_instrs"],
+        operand_counts=result["operand_counts"],
+        matches=result["matches"],
+        found_keywords_list=result["found_keywords_list"],
+        model_keywords_list=result["model_keywords_list"]
+    )
+    print("[Reprompting & Re-Processing]--->>>>>>>>>>>>>>>>>>---------------|")
+    print(reprompt_text)
+    return reprompt_text
+
+def apply_reprompt_output(question: str, raw_output: str, result_data: dict, result):
+    print(f"[New Model Output]\n{raw_output}\n")
+    result_data["reprompted"] = True
+    instruction_pairs = parse_model_output(raw_output, result_data["protocol"], result_data["line_texts"])
+    if instruction_pairs:
+        result_data["parsed_instructions"] = instruction_pairs
+        result = process_instruction_pairs(instruction_pairs, question)
+        result_data["validated_instructions"] = result
+    return result
+
+def build_partial_reprompt(result, rejected=None):
+    """
+    Returns (prompt, line_indexes) re-asking only the lines where the validator detected a different
+    instruction or operand count, or None when partial reprompting is off or nothing can be corrected.
+    Lines the validator could not classify are left alone; there is nothing to tell the model about them.
+    rejected maps a line index to corrections that still did not match; they are listed in the prompt too.
+    """
+    rejected = rejected or {}
+    if REPROMPT_MODE != "partial" or not result:
+        return None
+    indexes = [i for i, match in enumerate(result["matches"]) if match == "No" and result["detected_instrs"][i]]
+    if not indexes:
+        return None
+
+    prompt = generate_partial_reprompt([
+        (i + 1, result["line_texts"][i], result["detected_instrs"][i], result["operand_counts"][i],
+         ", ".join([result["ops"][i]] + rejected.get(i, [])))
+        for i in indexes
+    ])
+    print(f"[Partial reprompt] lines {[i + 1 for i in indexes]}")
+    print(prompt)
+    return prompt, indexes
+
+def merge_partial_output(question: str, raw_output: str, indexes, result_data: dict, result, rejected: dict):
+    """
+    Merges the corrected LineN blocks into result_data["parsed_instructions"]. A correction replaces the
+    original line only if it now matches the validator; the original line text is kept.
+    Corrections that still do not match are added to rejected. Returns the re-validated result.
+    """
+    print(f"[Partial reprompt output]\n{raw_output}\n")
+    instruction_pairs = list(result_data["parsed_instructions"])
+    corrected = []
+    for label, (_, output_operation, keyword_str, inferred_operation) in parse_model_output_labeled(raw_output, result_data["protocol"]):
+        number = line_label_number(label)
+        if number is None or number - 1 not in indexes:
+            continue
+        line_text = instruction_pairs[number - 1][0]
+        if validate_instruction(line_text, output_operation)[3] == "Yes":
+            instruction_pairs[number - 1] = (line_text, output_operation, keyword_str, inferred_operation)
+            corrected.append(number)
+        elif output_operation not in rejected.setdefault(number - 1, []):
+            rejected[number - 1].append(output_operation)
+
+    result_data["reprompted"] = True
+    result_data["reprompt_mode"] = "partial"
+    result_data["reprompt_attempts"] = result_data.get("reprompt_attempts", 0) + 1
+    result_data.setdefault("reprompted_lines", []).extend(corrected)
+    if not corrected:
+        return result
+    result_data["parsed_instructions"] = instruction_pairs
+    return validate_instruction_pairs(question, instruction_pairs, raw_output, result_data)
+
+def correct_mismatches(question: str, result_data: dict, result):
+    """
+    Partial reprompting: re-asks the mismatched lines up to PARTIAL_REPROMPT_MAX_ATTEMPTS times
+    within PARTIAL_REPROMPT_BUDGET seconds. Returns the (possibly corrected) validation result.
+    """
+    deadline = time.time() + PARTIAL_REPROMPT_BUDGET
+    rejected, last_prompt = {}, None
+    for _ in range(PARTIAL_REPROMPT_MAX_ATTEMPTS):
+        partial = build_partial_reprompt(result, rejected)
+        # An unchanged prompt would only return the same (cached) answer
+        if not partial or partial[0] == last_prompt or time.time() >= deadline:
+            break
+        last_prompt = partial[0]
+        with STAGE_LATENCY.time(pipeline=PIPELINE, stage="reprompt_partial"):
+            partial_output = get_model_response(partial[0], result_data["protocol"])
+        result = merge_partial_output(question, partial_output, partial[1], result_data, result, rejected)
+    return result
+
+async def correct_mismatches_async(question: str, result_data: dict, result):
+    """
+    Async counterpart of correct_mismatches; a model call still running when the budget runs out is cancelled.
+    """
+    deadline = time.time() + PARTIAL_REPROMPT_BUDGET
+    rejected, last_prompt = {}, None
+    for _ in range(PARTIAL_REPROMPT_MAX_ATTEMPTS):
+        partial = build_partial_reprompt(result, rejected)
+        remaining = deadline - time.time()
+        if not partial or partial[0] == last_prompt or remaining <= 0:
+            break
+        last_prompt = partial[0]
+        try:
+            with STAGE_LATENCY.time(pipeline=PIPELINE, stage="reprompt_partial"):
+                partial_output = await asyncio.wait_for(get_model_response_async(partial[0], result_data["protocol"]), timeout=remaining)
+        except asyncio.TimeoutError:
+            print(f"[Partial reprompt] latency budget of {PARTIAL_REPROMPT_BUDGET}s used up")
+            break
+        result = await run_off_loop(merge_partial_output, question, partial_output, partial[1], result_data, result, rejected)
+    return result
+
+def synthesize_result(question: str, result_data: dict) -> bool:
+    """
+    Fills result_data from the template synthesizer when every line of the question resolves.
+    Returns False, leaving result_data untouched, when the question needs the model.
+    """
+    if not TEMPLATE_SYNTHESIS:
+        return False
+    with STAGE_LATENCY.time(pipeline=PIPELINE, stage="synthesize"):
+        instruction_pairs = synthesize_lines(split_question_lines(question))
+    if not instruction_pairs:
+        return False
+
+    raw_output = render_instruction_pairs(instruction_pairs)
+    print(f"\n[Template output]\n{raw_output}\n")
+    result_data["model_output"] = raw_output
+    result_data["synthesized"] = True
+    result = validate_instruction_pairs(question, instruction_pairs, raw_output, result_data)
+    sanitize_result(result_data, result, raw_output)
+    return True
+
+def sanitize_result(result_data: dict, result, raw_output: str) -> dict:
+    """
+    Sanitizes the validated instructions into result_data["final_output"].
+    Raises ValueError when the model call failed or none of its output parsed; the callers turn
+    that into final_output "Error" instead of sanitizing the raw text into an empty rung.
+    """
+    if not result or not result["ops"]:
+        if raw_output.strip() == IL_ERROR_MESSAGE:
+            raise ValueError(IL_ERROR_MESSAGE)
+        raise ValueError("No instructions could be parsed from the model output.")
+    combined_output = ' '.join(result["ops"]).strip()
+    print(f"Combined Output: {combined_output}")
+    with STAGE_LATENCY.time(pipeline=PIPELINE, stage="sanitize"):
         result_data["final_output"] = sanitize_model_output(combined_output)
-        print("Final Output:", result_data["final_output"], flush=True)
+    print("Final Output:", result_data["final_output"], flush=True)
+    return result_data
+
+def finalize_model_output(question: str, raw_output: str, result_data: dict, instruction_pairs=None) -> dict:
+    """
+    Parses, validates, optionally reprompts and sanitizes one raw model response into result_data.
+    instruction_pairs, if given, are the already parsed blocks of raw_output.
+    """
+    if instruction_pairs is None:
+        result = validate_model_output(question, raw_output, result_data)
+    else:
+        result_data["model_output"] = raw_output
+        result = validate_instruction_pairs(question, instruction_pairs, raw_output, result_data)
+
+    reprompt_text = build_reprompt(question, result)
+    if reprompt_text:
+        with STAGE_LATENCY.time(pipeline=PIPELINE, stage="reprompt"):
+            raw_output = get_model_response(reprompt_text, result_data["protocol"]) # Re-invokes model_ILCodeGen
+        result = apply_reprompt_output(question, raw_output, result_data, result)
+
+    result = correct_mismatches(question, result_data, result)
+    return sanitize_result(result_data, result, raw_output)
+
+async def finalize_model_output_async(question: str, raw_output: str, result_data: dict, instruction_pairs=None) -> dict:
+    """
+    Async counterpart of finalize_model_output; the model calls are awaited on the loop and
+    the parsing, validation and sanitizing run in its executor.
+    """
+    if instruction_pairs is None:
+        result = await run_off_loop(validate_model_output, question, raw_output, result_data)
+    else:
+        result_data["model_output"] = raw_output
+        result = await run_off_loop(validate_instruction_pairs, question, instruction_pairs, raw_output, result_data)
+
+    reprompt_text = build_reprompt(question, result)
+    if reprompt_text:
+        with STAGE_LATENCY.time(pipeline=PIPELINE, stage="reprompt"):
+            raw_output = await get_model_response_async(reprompt_text, result_data["protocol"])
+        result = await run_off_loop(apply_reprompt_output, question, raw_output, result_data, result)
+
+    result = await correct_mismatches_async(question, result_data, result)
+    return await run_off_loop(sanitize_result, result_data, result, raw_output)
+
+async def process_question_async(question: str, protocol=None):
+    """
+    Handles single question processing end-to-end without blocking the event loop on model calls.
+    protocol selects the model output format ('full' or 'compact', default IL_PROTOCOL).
+    Returns a dictionary of the results.
+    """
+    print(f"Processing -------------------------------------------------------------------------------------")
+    print(f"Question: {question}")
+    result_data = new_result_data(question, resolve_protocol(protocol))
+
+    try:
+        start_time = time.time()
+
+        if not await run_off_loop(synthesize_result, question, result_data):
+            prompt = prepare_il_prompt(question, result_data)
+            with STAGE_LATENCY.time(pipeline=PIPELINE, stage="il_generation"):
+                raw_output = await get_model_response_async(prompt, result_data["protocol"])
+            print(f"\n[Model output]\n{raw_output}\n")
+
+            await finalize_model_output_async(question, raw_output, result_data)
 
         result_data["time_taken"] = round(time.time() - start_time, 2)
+        STAGE_LATENCY.observe(time.time() - start_time, pipeline=PIPELINE, stage="total")
     except Exception as e:
         print(f"(/°Д°)/ Error in single question processing: {e}")
         traceback.print_exc()
         result_data["error"] = str(e)
         result_data["final_output"] = "Error"
+        PIPELINE_ERRORS.inc(pipeline=PIPELINE)
 
     return result_data
+
+async def process_questions_async(questions, protocol=None):
+    """
+    Runs process_question_async for every question concurrently and returns the results in input order.
+    The per-model limit in model_Client bounds how many reach the model server at once.
+    """
+    return await asyncio.gather(*(process_question_async(q, protocol) for q in questions))
+
+def synthesize_questions(questions, protocol: str, start_time: float):
+    """
+    Runs synthesize_result over questions. Returns (results, model_indexes): one result dictionary
+    per question the templates resolve (None elsewhere) and the indexes of the questions that need the model.
+    """
+    results = [None] * len(questions)
+    model_indexes = []
+    for index, question in enumerate(questions):
+        result_data = new_result_data(question, protocol)
+        if synthesize_result(question, result_data):
+            result_data["time_taken"] = round(time.time() - start_time, 2)
+            results[index] = result_data
+        else:
+            model_indexes.append(index)
+    return results, model_indexes
+
+def build_batch_prompt(lines) -> str:
+    """Packs lines (questions or their clauses) into one 'Line1: ... LineN: ...' prompt, one label per entry."""
+    return "\n".join(f"Line{i}: {' '.join(str(line).split())}" for i, line in enumerate(lines, start=1))
+
+def batch_question_lines(question):
+    """
+    Returns the lines a question is sent as in a batch (see split_question_lines), or None when it
+    cannot be split reliably - nothing left after splitting, or text before its first 'LineX:' label -
+    and has to go through process_question_async on its own.
+    """
+    question = str(question)
+    lines = split_question_lines(question)
+    if not lines:
+        return None
+    label = LINE_LABEL_PATTERN.search(question)
+    if label and question[:label.start()].strip():
+        return None
+    return lines
+
+def build_batch_lines(questions):
+    """
+    Splits every question into its lines and numbers them consecutively across the batch.
+    Returns (line_texts, line_ranges): all lines, Line1 first, and for each question the
+    range of its LineN numbers, or None for a question batch_question_lines cannot split.
+    """
+    line_texts, line_ranges = [], []
+    for question in questions:
+        lines = batch_question_lines(question)
+        if lines is None:
+            line_ranges.append(None)
+            continue
+        line_ranges.append(range(len(line_texts) + 1, len(line_texts) + len(lines) + 1))
+        line_texts.extend(lines)
+    return line_texts, line_ranges
+
+def _same_line(echoed: str, sent: str) -> bool:
+    return " ".join(echoed.lower().split()).strip(" .,;") == " ".join(sent.lower().split()).strip(" .,;")
+
+def batch_instruction_pairs(labeled, line_range, line_texts, protocol: str):
+    """
+    Returns the instruction pairs of one question from the parsed batch output, or None unless the
+    question got exactly its own blocks: one block per LineN in line_range and, for the full protocol,
+    each echoing the line it was sent. A merged, split or shifted block sends the question back to
+    process_question_async.
+    """
+    blocks = {number: [] for number in line_range}
+    for label, instruction_pair in labeled:
+        number = line_label_number(label)
+        if number in blocks:
+            blocks[number].append(instruction_pair)
+
+    instruction_pairs = []
+    for number, pairs in blocks.items():
+        if len(pairs) != 1:
+            return None
+        if protocol != "compact" and not _same_line(pairs[0][0], line_texts[number - 1]):
+            return None
+        instruction_pairs.append(pairs[0])
+    return instruction_pairs
+
+def split_batches(questions, indexes, protocol: str):
+    """
+    Groups the questions at indexes, in order, into batches whose prompt fits the IL output cap
+    (il_token_estimate of the batch prompt at most IL_MAX_TOKENS), so no batch answer is cut off.
+    Returns (batches, single_indexes): lists of at least two indexes, and the questions that
+    go through process_question_async on their own - those batch_question_lines cannot split,
+    those too long to share a batch, and a batch's last question when it is left alone.
+    """
+    batches, single_indexes = [], []
+    batch, batch_lines = [], []
+    for index in indexes:
+        lines = batch_question_lines(questions[index])
+        if lines is None:
+            single_indexes.append(index)
+            continue
+        if batch and il_token_estimate(build_batch_prompt(batch_lines + lines), protocol) > IL_MAX_TOKENS:
+            batches.append(batch)
+            batch, batch_lines = [], []
+        batch.append(index)
+        batch_lines.extend(lines)
+    if batch:
+        batches.append(batch)
+
+    single_indexes.extend(batch[0] for batch in batches if len(batch) == 1)
+    return [batch for batch in batches if len(batch) > 1], sorted(single_indexes)
+
+async def process_batch_async(questions, indexes, protocol: str, start_time: float, results: list) -> list:
+    """
+    Sends the questions at indexes as one LineX-labeled prompt and fills results for every question
+    that got exactly its own blocks back. Returns the indexes left for process_question_async.
+    """
+    batch_questions = [questions[index] for index in indexes]
+    line_texts, line_ranges = build_batch_lines(batch_questions)
+    print(f"Processing batch of {len(indexes)} ---------------------------------------------------------------------")
+    batch_prompt = build_batch_prompt(line_texts)
+    print(batch_prompt)
+
+    try:
+        with STAGE_LATENCY.time(pipeline=PIPELINE, stage="il_generation_batch"):
+            raw_output = await get_model_response_async(batch_prompt, protocol)
+        print(f"\n[Batch model output]\n{raw_output}\n")
+        labeled = await run_off_loop(parse_model_output_labeled, raw_output, protocol, line_texts)
+    except Exception as e:
+        print(f"(/°Д°)/ Error in batch processing, falling back to single questions: {e}")
+        traceback.print_exc()
+        return list(indexes)
+
+    retry_indexes = []
+    for index, question, line_range in zip(indexes, batch_questions, line_ranges):
+        instruction_pairs = batch_instruction_pairs(labeled, line_range, line_texts, protocol)
+        if instruction_pairs is None:
+            retry_indexes.append(index)
+            continue
+
+        result_data = new_result_data(question, protocol)
+        result_data["batched"] = True
+        if protocol == "compact":
+            result_data["line_texts"] = line_texts[line_range.start - 1:line_range.stop - 1]
+        try:
+            # The same reprompt and partial correction steps as a question processed on its own
+            await finalize_model_output_async(question, raw_output, result_data, instruction_pairs)
+            result_data["time_taken"] = round(time.time() - start_time, 2)
+        except Exception as e:
+            print(f"(/°Д°)/ Error in batched question processing: {e}")
+            traceback.print_exc()
+            result_data["error"] = str(e)
+            result_data["final_output"] = "Error"
+            PIPELINE_ERRORS.inc(pipeline=PIPELINE)
+        results[index] = result_data
+
+    if retry_indexes:
+        print(f"Retrying {len(retry_indexes)} question(s) not answered line for line by the batch: {[i + 1 for i in retry_indexes]}")
+    return retry_indexes
+
+async def process_question_batch_async(questions, protocol=None):
+    """
+    Sends several questions to the model in LineX-labeled prompts, so the system prompt is processed
+    once per batch rather than once per question. Every question is split into its lines, the lines
+    are numbered across the batch, and each question takes back exactly the blocks of its own lines,
+    to be validated and sanitized like process_question. split_batches keeps each batch within the
+    output token cap. Questions that cannot be split, or whose blocks are missing, merged or shifted,
+    are processed on their own. Questions the template synthesizer resolves are answered without
+    the model. Returns one result dictionary per question, in input order.
+    """
+    questions = list(questions)
+    protocol = resolve_protocol(protocol)
+    start_time = time.time()
+
+    # Questions the templates resolve never reach the model
+    results, model_indexes = await run_off_loop(synthesize_questions, questions, protocol, start_time)
+
+    batches, retry_indexes = split_batches(questions, model_indexes, protocol)
+    retried_batches = await asyncio.gather(*(process_batch_async(questions, batch, protocol, start_time, results) for batch in batches))
+    for batch_retries in retried_batches:
+        retry_indexes.extend(batch_retries)
+
+    if retry_indexes:
+        retried = await asyncio.gather(*(process_question_async(questions[i], protocol) for i in retry_indexes))
+        for index, result_data in zip(retry_indexes, retried):
+            results[index] = result_data
+
+    return results
+
+def process_question_batch(questions, protocol=None):
+    """Synchronous wrapper around process_question_batch_async."""
+    return run_sync(process_question_batch_async(questions, protocol))
+
+def process_question(question: str, protocol=None):
+    """
+    Handles single question processing end-to-end.
+    Returns a dictionary of the results.
+    Synchronous wrapper around process_question_async: the model calls run on model_Client's shared
+    event loop, the parsing and validation in its executor, so concurrent callers do not queue behind each other.
+    """
+    return run_sync(process_question_async(question, protocol))
+
+def _line_event(index: int, instruction_pair) -> dict:
+    line_text, output_operation, keyword_str, inferred_operation = instruction_pair
+    found_keywords, detected_instr, operand_count, match = validate_instruction(line_text, output_operation)
+    return {
+        "index": index,
+        "line_text": line_text,
+        "output_operation": output_operation,
+        "model_keywords": keyword_str,
+        "inferred_operation": inferred_operation,
+        "found_keywords": found_keywords,
+        "detected_instr": detected_instr,
+        "operand_count": operand_count,
+        "match": match
+    }
+
+def is_unrecoverable(line_event: dict) -> bool:
+    """
+    True when a streamed line already decides that the answer will be regenerated: full reprompting is on
+    and the validator detected a different instruction or operand count than the model wrote.
+    """
+    return REPROMPT_MODE == "full" and line_event["match"] == "No" and line_event["detected_instr"] is not None
+
+def stream_question(question: str, protocol=None):
+    """
+    Streaming variant of process_question. Yields (event, data) tuples:
+      ("token", str)  - every chunk as the model produces it
+      ("line", dict)  - every LineX block as soon as it is complete, parsed and validated
+      ("final", dict) - the same result dictionary process_question returns
+    With STREAM_EARLY_ABORT, generation stops at the first unrecoverable line (see is_unrecoverable);
+    the final result then has "stream_aborted": True. protocol is as for process_question; with the
+    compact protocol every line is emitted as soon as its record ends.
+    A question the template synthesizer resolves yields its lines and the final result without tokens.
+    """
+    print(f"Streaming ---------------------------------------------------------------------------------------")
+    print(f"Question: {question}")
+    result_data = new_result_data(question, resolve_protocol(protocol))
+    start_time = time.time()
+    chunks = []
+    instruction_pairs = []
+    aborted = False
+
+    try:
+        if synthesize_result(question, result_data):
+            for index, pair in enumerate(result_data["parsed_instructions"]):
+                yield "line", _line_event(index, pair)
+        else:
+            prompt = prepare_il_prompt(question, result_data)
+            parser = create_output_parser(result_data["protocol"], result_data["line_texts"])
+            model_stream = stream_model_response(prompt, result_data["protocol"])
+            try:
+                for chunk in model_stream:
+                    chunks.append(chunk)
+                    yield "token", chunk
+
+                    for _, pair in parser.feed(chunk):
+                        line_event = _line_event(len(instruction_pairs), pair)
+                        instruction_pairs.append(pair)
+                        yield "line", line_event
+                        if STREAM_EARLY_ABORT and is_unrecoverable(line_event):
+                            aborted = True
+                            break
+                    if aborted:
+                        break
+            finally:
+                # Closing the model stream stops generation on the server
+                model_stream.close()
+
+            if aborted:
+                result_data["stream_aborted"] = True
+                print(f"Stopping generation early: line {len(instruction_pairs)} cannot be used as generated")
+            else:
+                for _, pair in parser.close():
+                    yield "line", _line_event(len(instruction_pairs), pair)
+                    instruction_pairs.append(pair)
+            emitted = len(instruction_pairs)
+
+            raw_output = "".join(chunks).strip()
+            STAGE_LATENCY.observe(time.time() - start_time, pipeline=PIPELINE, stage="il_generation_stream")
+            print(f"\n[Model output]\n{raw_output}\n")
+            finalize_model_output(question, raw_output, result_data, instruction_pairs)
+
+            # A reprompt may have produced further lines
+            for pair in result_data["parsed_instructions"][emitted:]:
+                yield "line", _line_event(emitted, pair)
+                emitted += 1
+
+        result_data["time_taken"] = round(time.time() - start_time, 2)
+        STAGE_LATENCY.observe(time.time() - start_time, pipeline=PIPELINE, stage="total")
+    except Exception as e:
+        print(f"(/°Д°)/ Error in streamed question processing: {e}")
+        traceback.print_exc()
+        result_data["error"] = str(e)
+        result_data["final_output"] = "Error"
+        PIPELINE_ERRORS.inc(pipeline=PIPELINE)
+
+    yield "final", result_data
@@ -1,64 +1,38 @@
 # Chat_SanitizeModelOutput.py
 
-import re
+from L5XGen_ILTokenizer import ILInstruction, tokenize_il, dedup_instructions, render_rung, CDATA_PATTERN
+
+COMPARISON_INSTR = {"EQ", "NE", "LE", "GE", "LT", "GT"}
+NOP_INSTRUCTION = ILInstruction("NOP", (), "NOP()")
+
+def extract_instructions(ModelOutput: str) -> list:
+    """
+    Cleans model output into its instruction list and adds NOP() to a standalone comparison.
+    """
+    instructions = tokenize_il(ModelOutput, normalize=True, strict=True)
+    # Text that would end the CDATA block or split the rung cannot be an operand
+    instructions = [i for i in instructions if "]]>" not in i.text and "\n" not in i.text and "\r" not in i.text]
+    if len(instructions) == 1 and instructions[0].name in COMPARISON_INSTR:
+        instructions.append(NOP_INSTRUCTION)
+    return instructions
 
 def process_model_output(ModelOutput: str) -> str:
     """
     Cleans model output, formats it, and adds NOP() to standalone comparisons.
     """
-    # Phase 1: Strip and normalize
-    no_spaces = ModelOutput.replace(" ", "").replace("),", ")").replace(":", ",").replace("?", "")
-
-    # Phase 2: Match all instructions
-    instructions = re.findall(r"[A-Z]+\([^()]*\)", no_spaces)
-    
-    comparison_instr = {"EQ", "NE", "LE", "GE", "LT", "GT"}
-    final_output = ""
-    
-    for i, instr in enumerate(instructions):
-        instr_name = instr.split("(", 1)[0]
-        
-        # If comparison, check if it's alone
-        if instr_name in comparison_instr:
-            prev_is_comp = i > 0
-            next_is_comp = i < len(instructions) - 1
-            if not prev_is_comp and not next_is_comp:
-                final_output += f"{instr}NOP()"
-            else:
-                final_output += instr
-        else:
-            final_output += instr
-
-    return f"<![CDATA[{final_output};]]>"
+    return render_rung(extract_instructions(ModelOutput))
 
 def remove_duplicate_instructions(input_cdata: str) -> str:
     """
     Removes duplicate instructions from inside a CDATA block.
     """
-    match = re.search(r'<!\[CDATA\[(.*?)\]\]>', input_cdata, re.DOTALL)
+    match = CDATA_PATTERN.search(input_cdata)
     if not match:
         return ""  # Invalid format
-    inner_code = match.group(1)
-
-    # Match all function-like instructions
-    instructions = re.findall(r'\b\w+\([^()]*\)', inner_code)
-
-    seen = set()
-    unique = []
-    for instr in instructions:
-        if instr not in seen:
-            seen.add(instr)
-            unique.append(instr)
-
-    cleaned_code = ''.join(unique)
-    return f"<![CDATA[{cleaned_code};]]>"
+    return render_rung(dedup_instructions(tokenize_il(match.group(1))))
 
 def sanitize_model_output(raw_output: str) -> str:
     """
-    Full pipeline: clean model output and remove duplicates.
+    Full pipeline: clean model output and remove duplicates, from a single tokenizer pass.
     """
-    cleaned = process_model_output(raw_output)
-    deduped = remove_duplicate_instructions(cleaned)
-    return deduped
-
-
+    return render_rung(dedup_instructions(extract_instructions(raw_output)))
@@ -0,0 +1,151 @@
+# Chat_TemplateSynthesizer.py
+#
+# Builds IL for simple lines without the model: detect_instruction names the instruction and its
+# operand count, the tags are taken from the sentence, and the result is only used when every line
+# of a question resolves unambiguously. Anything unclear is left to model_ILCodeGen.
+
+import re
+
+from Validator_InstructionDetection import detect_instruction
+from Validator_ProcessParsedResponse import validate_instruction
+
+# Instructions the templates cover, with the 'Inferred Operation' name used by the IL prompt.
+# Timers, counters and COP need presets/lengths phrased in too many ways and stay with the model.
+OPERATION_NAMES = {
+    'XIC': 'CHECK IF ON', 'XIO': 'CHECK IF OFF',
+    'OTE': 'OUTPUT ENERGIZE', 'OTL': 'OUTPUT LATCH', 'OTU': 'OUTPUT UNLATCH', 'ONS': 'ONE SHOT',
+    'CLR': 'CLEAR', 'MOV': 'MOVE',
+    'EQ': 'EQUALITY', 'NE': 'NOT EQUAL', 'GT': 'GREATER THAN', 'GE': 'GREATER THAN OR EQUAL',
+    'LT': 'LESS THAN', 'LE': 'LESS THAN OR EQUAL',
+    'ADD': 'ADDITION', 'SUB': 'SUBTRACTION', 'MUL': 'MULTIPLICATION', 'DIV': 'DIVISION'
+}
+COMPARISONS = {'EQ', 'NE', 'GT', 'GE', 'LT', 'LE'}
+MATH = {'ADD', 'SUB', 'MUL', 'DIV'}
+
+TOKEN_PATTERN = re.compile(r"[^\s,;()'\"]+")
+NUMBER_PATTERN = re.compile(r"^-?\d+(?:\.\d+)?$")
+TAG_PATTERN = re.compile(r"^[A-Za-z_]\w*(?:\[\d+\])?(?:\.\w+(?:\[\d+\])?)*$")
+# Words that look like tags but are values/instruction names ("set to ON", "XIC")
+NOT_TAGS = {'on', 'off', 'true', 'false', 'high', 'low'} | {name.lower() for name in OPERATION_NAMES} | \
+           {'ton', 'tof', 'ctu', 'ctd', 'cop', 'ms'}
+
+# A negation the matched keyword does not cover ("do not turn on X") or an 'or' the IL prompt
+# would split into separate lines makes the line ambiguous
+NEGATION_PATTERN = re.compile(r"\b(?:not|no|never|don't|doesn't|isn't)\b|n't\b", re.IGNORECASE)
+OR_PATTERN = re.compile(r"\bor\b", re.IGNORECASE)
+# "Set A equal to 5" asks for an assignment (MOV), not a comparison, even though it matches 'equal'
+ASSIGNMENT_PATTERN = re.compile(r"\b(?:set|sets|setting|assign|assigns|assigned|assigning|store|stores|stored|storing)\b|"
+                                r"\bmake\b.*\bequal", re.IGNORECASE)
+# Math results need a destination: "... into C", "... and store it in C"
+DESTINATION_PATTERN = re.compile(r"\b(?:into|in|to|as|store|stored|save|saved|put|giving|gives)\b|=")
+# MOV direction: source, then "to"/"into", then destination
+MOV_DIRECTION_PATTERN = re.compile(r"\b(?:to|into)\b")
+FROM_PATTERN = re.compile(r"\bfrom\b")
+
+def _is_tag(token: str) -> bool:
+    """
+    Only names that cannot be plain English count as tags: they contain a digit, '_' or '.',
+    or a capital letter after the first character (StartButton).
+    """
+    if not TAG_PATTERN.match(token) or token.lower() in NOT_TAGS:
+        return False
+    return any(ch.isdigit() or ch in "_.[" for ch in token) or any(ch.isupper() for ch in token[1:])
+
+def extract_operands(line_text: str):
+    """Returns [(operand, start, end), ...] for every tag or numeric literal in the line, in order."""
+    operands = []
+    for token in TOKEN_PATTERN.finditer(line_text):
+        value = token.group(0).rstrip(".:!?")
+        if NUMBER_PATTERN.match(value) or _is_tag(value):
+            operands.append((value, token.start(), token.start() + len(value)))
+    return operands
+
+def _keyword_span(line_lower: str, keyword: str):
+    """Position of the matched keyword; letter-only keywords must be whole words, as in detect_instruction."""
+    pattern = rf"\b{re.escape(keyword)}\b" if keyword.isalnum() else re.escape(keyword)
+    match = re.search(pattern, line_lower)
+    return match.span() if match else None
+
+def _order_operands(instruction: str, operands, line_lower: str, keyword_span):
+    """
+    Puts the operands in IL order for the instruction, or returns None when the sentence does not
+    make the order clear.
+    """
+    names = [value for value, _, _ in operands]
+    if instruction in COMPARISONS:
+        if ASSIGNMENT_PATTERN.search(line_lower):
+            return None
+        # "A is greater than B": one operand on each side of the keyword
+        first, second = operands
+        return names if first[2] <= keyword_span[0] and second[1] >= keyword_span[1] else None
+
+    if instruction == 'MOV':
+        # "move A into B" / "transfer data from A to B"
+        between = line_lower[operands[0][2]:operands[1][1]]
+        return names if MOV_DIRECTION_PATTERN.search(between) else None
+
+    if instruction in MATH:
+        if not DESTINATION_PATTERN.search(line_lower[operands[1][2]:operands[2][1]]):
+            return None
+        # "subtract B from A into C" -> SUB(A,B,C)
+        if FROM_PATTERN.search(line_lower[operands[0][2]:operands[1][1]]):
+            if instruction != 'SUB':
+                return None
+            names[0], names[1] = names[1], names[0]
+        return names
+
+    return names
+
+def synthesize_line(line_text: str):
+    """
+    Builds one instruction pair (line_text, output_operation, keyword_str, inferred_operation) for a line,
+    or returns None when the line cannot be resolved with confidence.
+    """
+    line_text = " ".join(line_text.split())
+    found_keywords, instruction, operand_count = detect_instruction(line_text)
+    if instruction not in OPERATION_NAMES or not found_keywords:
+        return None
+
+    line_lower = line_text.lower()
+    keyword = found_keywords[0]
+    keyword_span = _keyword_span(line_lower, keyword)
+    # Fallback detections ('timer done', ...) have no keyword in the text to anchor on
+    if keyword_span is None or OR_PATTERN.search(line_text):
+        return None
+    if NEGATION_PATTERN.search(line_lower) and not NEGATION_PATTERN.search(keyword):
+        return None
+
+    operands = [op for op in extract_operands(line_text) if op[2] <= keyword_span[0] or op[1] >= keyword_span[1]]
+    if len(operands) != operand_count:
+        return None
+    # Contacts and coils act on tags, never on literals
+    if operand_count == 1 and NUMBER_PATTERN.match(operands[0][0]):
+        return None
+
+    names = _order_operands(instruction, operands, line_lower, keyword_span)
+    if names is None:
+        return None
+
+    output_operation = f"{instruction}({','.join(names)})"
+    if validate_instruction(line_text, output_operation)[3] != "Yes":
+        return None
+    return line_text, output_operation, keyword, OPERATION_NAMES[instruction]
+
+def synthesize_lines(lines):
+    """
+    Returns the instruction pairs for all lines, or None if any line (or the whole input) is unresolved.
+    """
+    instruction_pairs = []
+    for line_text in lines:
+        instruction_pair = synthesize_line(line_text)
+        if instruction_pair is None:
+            return None
+        instruction_pairs.append(instruction_pair)
+    return instruction_pairs or None
+
+def render_instruction_pairs(instruction_pairs) -> str:
+    """Formats instruction pairs like the IL model's full output, so logs and parsers treat them the same."""
+    return "\n\n".join(
+        f"Line{i}: {line_text}\nFound Keyword: {keyword_str}\nInferred Operation: {inferred_operation}\nOutput Operation: {output_operation}"
+        for i, (line_text, output_operation, keyword_str, inferred_operation) in enumerate(instruction_pairs, start=1)
+    )
@@ -0,0 +1,132 @@
+# L5XGen_ILTokenizer.py
+#
+# One tokenizer for IL text such as "XIC(a)OTE(b)" or "<![CDATA[GT(a,b)NOP();]]>".
+# Chat_SanitizeModelOutput, L5XGen_Tag and the rung/routine generators all work from the
+# instruction list it returns, instead of scanning the text again with their own regexes.
+
+import re
+from collections import namedtuple
+
+# name: the word before '(' as written; operands: top-level, comma separated; text: name(operands)
+ILInstruction = namedtuple("ILInstruction", ["name", "operands", "text"])
+
+# Fast path: when every parenthesis belongs to a flat name(operands) match, one findall is the whole parse
+INSTRUCTION_PATTERN = re.compile(r"\b\w+\([^()]*\)")
+STRICT_INSTRUCTION_PATTERN = re.compile(r"[A-Z]+\([^()]*\)")
+# Otherwise only the parentheses are matched; names and operands are sliced out of the text around them
+PAREN_PATTERN = re.compile(r"[()]")
+UPPERCASE_NAME_PATTERN = re.compile(r"[A-Z]+$")
+CDATA_PATTERN = re.compile(r"<!\[CDATA\[(.*?)\]\]>")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+def normalize_il(text: str) -> str:
+    """
+    The model output clean-up sanitize_model_output has always applied before matching:
+    spaces and '?' removed, ':' read as an operand separator, a ',' right after ')' dropped.
+    """
+    return text.replace(" ", "").replace("),", ")").replace(":", ",").replace("?", "")
+
+def _split_operands(content: str, nested: bool) -> tuple:
+    if not content:
+        return ()
+    if not nested:
+        return tuple(content.split(","))
+    # Commas inside parenthesized expressions belong to the operand
+    operands, depth, start = [], 0, 0
+    for i, ch in enumerate(content):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            operands.append(content[start:i])
+            start = i + 1
+    operands.append(content[start:])
+    return tuple(operands)
+
+def _instruction(name: str, content: str, nested: bool = False):
+    return ILInstruction._make((name, _split_operands(content, nested), f"{name}({content})"))
+
+def tokenize_il(text: str, normalize: bool = False, strict: bool = False) -> list:
+    """
+    Returns the ILInstruction list of text in one left-to-right pass. normalize applies normalize_il
+    first; strict returns strict_instructions of the result.
+    Parentheses inside an instruction that do not start another instruction, as in CPT(x,(a+b)*c),
+    are part of its operands. Another instruction head inside an unfinished instruction drops the
+    unfinished one, and text outside instructions (CDATA markers, ';', branches) is skipped.
+    """
+    if normalize:
+        text = normalize_il(text)
+
+    matches = (STRICT_INSTRUCTION_PATTERN if strict else INSTRUCTION_PATTERN).findall(text)
+    if len(matches) == text.count("(") == text.count(")"):
+        instructions = []
+        for instruction_text in matches:
+            open_at = instruction_text.index("(")
+            content = instruction_text[open_at + 1:-1]
+            instructions.append(ILInstruction._make((instruction_text[:open_at], tuple(content.split(",")) if content else (), instruction_text)))
+        return instructions
+
+    instructions = []
+    name = None
+    content_start = depth = 0
+    nested = False
+    for match in PAREN_PATTERN.finditer(text):
+        position = match.start()
+        if text[position] == "(":
+            # The word right before '(' (same characters as regex \w) makes it an instruction head
+            head_start = position
+            while head_start and (text[head_start - 1].isalnum() or text[head_start - 1] == "_"):
+                head_start -= 1
+            if head_start < position:
+                name, content_start, depth, nested = text[head_start:position], position + 1, 1, False
+            elif name is not None:
+                depth += 1
+                nested = True
+        elif name is not None:
+            depth -= 1
+            if depth == 0:
+                instructions.append(_instruction(name, text[content_start:position], nested))
+                name = None
+    return strict_instructions(instructions) if strict else instructions
+
+def strict_instructions(instructions) -> list:
+    """
+    Keeps the instructions whose name ends in capitals, renamed to those capitals
+    ('XIC', 'xXIC' -> 'XIC'; 'xic' and 'XIC1' are dropped), as sanitize_model_output always required.
+    """
+    strict = []
+    for instruction in instructions:
+        if instruction.name.isupper() and instruction.name.isalpha() and instruction.name.isascii():
+            strict.append(instruction)
+            continue
+        match = UPPERCASE_NAME_PATTERN.search(instruction.name)
+        if match:
+            name = match.group(0)
+            strict.append(ILInstruction._make((name, instruction.operands, name + instruction.text[len(instruction.name):])))
+    return strict
+
+def dedup_instructions(instructions) -> list:
+    """Drops repeated instructions (same text), keeping the first of each."""
+    seen = set()
+    unique = []
+    for instruction in instructions:
+        if instruction.text not in seen:
+            seen.add(instruction.text)
+            unique.append(instruction)
+    return unique
+
+def render_rung(instructions) -> str:
+    """Joins instructions into one rung, wrapped in CDATA."""
+    return f"<![CDATA[{''.join(instruction.text for instruction in instructions)};]]>"
+
+def clean_il_line(line: str) -> str:
+    """Rung text of one IL line: CDATA markers and '?' removed, whitespace collapsed."""
+    if "<![CDATA[" in line:
+        line = CDATA_PATTERN.sub(r"\1", line)
+    line = line.strip().replace("?", "")
+    return WHITESPACE_PATTERN.sub(" ", line)
+
+def parse_il_line(line: str):
+    """Returns (rung_text, instructions) for one line of generated IL."""
+    return clean_il_line(line), tokenize_il(line)
@@ -0,0 +1,245 @@
+# L5XGen_Model.py
+#
+# In-memory Logix project model (Controller, Program, Routine, Rung, Tag, DataType, Member) and the
+# one serializer every generator exports through. A model is built once and can be written as any
+# export target: a Rung, Routine, Program or DataType export, or a whole Controller.
+# The element named by the target gets Use="Target", its containers Use="Context", and the
+# elements inside it no Use attribute, as in Studio 5000's own exports.
+# Collections (tags, rungs, ...) are usually lists; generators work too and keep a very large
+# routine out of memory, but then the model can be written only once.
+
+from datetime import datetime
+from L5XGen_Tag import make_tag_xml
+from L5XGen_Writer import escape_attribute, cdata, join_blocks
+
+SOFTWARE_REVISION = "32.04"
+EXPORT_OPTIONS = {
+    "Rung": ("References NoRawData L5KData DecoratedData Context "
+             "RoutineLabels AliasExtras IOTags NoStringData "
+             "ForceProtectedEncoding AllProjDocTrans"),
+    "Routine": ("References NoRawData L5KData DecoratedData Context Dependencies "
+                "ForceProtectedEncoding AllProjDocTrans"),
+    "Program": ("References NoRawData L5KData DecoratedData Context Dependencies "
+                "ForceProtectedEncoding AllProjDocTrans"),
+    "DataType": ("References NoRawData L5KData DecoratedData Context Dependencies "
+                 "ForceProtectedEncoding AllProjDocTrans"),
+    "Controller": "NoRawData L5KData DecoratedData ForceProtectedEncoding AllProjDocTrans",
+}
+TARGET_TYPES = tuple(EXPORT_OPTIONS)
+
+class Tag:
+    __slots__ = ("name", "data_type")
+
+    def __init__(self, name: str, data_type: str):
+        self.name = name
+        self.data_type = data_type
+
+class Member:
+    """
+    A DataType member. A BOOL packed into a hidden SINT is a DataType="BIT" member with target and
+    bit_number set. description=None writes a self-closing element.
+    """
+    __slots__ = ("name", "data_type", "dimension", "radix", "hidden", "external_access",
+                 "description", "target", "bit_number")
+
+    def __init__(self, name: str, data_type: str, dimension: int = 0, radix: str = "Decimal", hidden: bool = False,
+                 external_access: str = "Read/Write", description: str = None, target: str = None, bit_number: int = None):
+        self.name = name
+        self.data_type = data_type
+        self.dimension = dimension
+        self.radix = radix
+        self.hidden = hidden
+        self.external_access = external_access
+        self.description = description
+        self.target = target
+        self.bit_number = bit_number
+
+class DataType:
+    __slots__ = ("name", "members", "family", "data_class")
+
+    def __init__(self, name: str, members=None, family: str = "NoFamily", data_class: str = "User"):
+        self.name = name
+        self.members = members if members is not None else []
+        self.family = family
+        self.data_class = data_class
+
+class Rung:
+    __slots__ = ("number", "text", "rung_type")
+
+    def __init__(self, number: int, text: str, rung_type: str = "N"):
+        self.number = number
+        self.text = text
+        self.rung_type = rung_type
+
+class Routine:
+    __slots__ = ("name", "rungs", "routine_type")
+
+    def __init__(self, name: str, rungs=None, routine_type: str = "RLL"):
+        self.name = name
+        self.rungs = rungs if rungs is not None else []
+        self.routine_type = routine_type
+
+class Program:
+    __slots__ = ("name", "routines", "tags", "main_routine_name")
+
+    def __init__(self, name: str, routines=None, tags=None, main_routine_name: str = None):
+        self.name = name
+        self.routines = routines if routines is not None else []
+        self.tags = tags if tags is not None else []
+        self.main_routine_name = main_routine_name
+
+class Controller:
+    __slots__ = ("name", "tags", "data_types", "programs", "processor_type", "major_rev", "minor_rev")
+
+    def __init__(self, name: str, tags=None, data_types=None, programs=None,
+                 processor_type: str = "1756-L83E", major_rev: int = 32, minor_rev: int = 11):
+        self.name = name
+        self.tags = tags if tags is not None else []
+        self.data_types = data_types if data_types is not None else []
+        self.programs = programs if programs is not None else []
+        self.processor_type = processor_type
+        self.major_rev = major_rev
+        self.minor_rev = minor_rev
+
+def _use(role: str) -> str:
+    return f' Use="{role}"' if role else ""
+
+def rung_xml(rung: Rung, role: str = "") -> str:
+    """One <Rung> element; role is 'Target' in Rung exports and empty everywhere else."""
+    return f'''<Rung{_use(role)} Number="{rung.number}" Type="{rung.rung_type}">
+<Text>
+{cdata(rung.text)}
+</Text>
+</Rung>'''
+
+def _member_xml(member: Member) -> str:
+    attributes = (f'          <Member Name="{escape_attribute(member.name)}" DataType="{member.data_type}" '
+                  f'Dimension="{member.dimension}" Radix="{member.radix}" Hidden="{str(member.hidden).lower()}"')
+    if member.target is not None:
+        attributes += f' Target="{escape_attribute(member.target)}" BitNumber="{member.bit_number}"'
+    attributes += f' ExternalAccess="{escape_attribute(member.external_access)}"'
+    if member.description is None:
+        return attributes + "/>"
+    description = f"\n          <Description>\n            {cdata(member.description)}\n          </Description>" if member.description else ""
+    return f"{attributes}>{description}\n          </Member>"
+
+def _data_type_xml(data_type: DataType, role: str) -> str:
+    members = "\n".join(_member_xml(member) for member in data_type.members)
+    return f'''      <DataType{_use(role)} Name="{escape_attribute(data_type.name)}" Family="{data_type.family}" Class="{data_type.data_class}">
+        <Members>
+{members}
+        </Members>
+      </DataType>'''
+
+def _find_routine(controller: Controller, routine_name: str):
+    for program in controller.programs:
+        for routine in program.routines:
+            if routine_name is None or routine.name == routine_name:
+                return program, routine
+    raise ValueError(f"Routine '{routine_name}' not found in controller '{controller.name}'.")
+
+def _find(items, name: str, kind: str):
+    for item in items:
+        if name is None or item.name == name:
+            return item
+    raise ValueError(f"{kind} '{name}' not found.")
+
+def iter_l5x(controller: Controller, target_type: str, target_name: str = None, export_date: str = None):
+    """
+    Yields the L5X export of controller for target_type ('Rung', 'Routine', 'Program', 'DataType' or
+    'Controller') piece by piece. target_name picks the routine/program/data type (default: the first);
+    for 'Rung' every rung of that routine is exported.
+    """
+    if target_type not in EXPORT_OPTIONS:
+        raise ValueError(f"Unsupported L5X target '{target_type}'. Use one of: {', '.join(TARGET_TYPES)}.")
+
+    # Only the target and what contains it are written
+    data_types, programs, routine = controller.data_types, controller.programs, None
+    if target_type in ("Rung", "Routine"):
+        program, routine = _find_routine(controller, target_name)
+        programs = [program]
+        target_name = routine.name
+    elif target_type == "Program":
+        programs = [_find(controller.programs, target_name, "Program")]
+        target_name = programs[0].name
+    elif target_type == "DataType":
+        data_types = [_find(controller.data_types, target_name, "DataType")]
+        target_name, programs = data_types[0].name, None
+    else:
+        target_name = controller.name
+
+    # Use roles: containers of the target are context, the target itself target, its contents unmarked
+    is_controller = target_type == "Controller"
+    context = "" if is_controller else "Context"
+    program_role = {"Program": "Target", "Controller": ""}.get(target_type, "Context")
+    routine_role = {"Routine": "Target", "Rung": "Context"}.get(target_type, "")
+    rung_role = "Target" if target_type == "Rung" else ""
+
+    now = export_date or datetime.now().strftime("%a %b %d %H:%M:%S %Y")
+    header = f'SchemaRevision="1.0" SoftwareRevision="{SOFTWARE_REVISION}"'
+    if target_type == "Rung":
+        header += f' TargetType="Rung" TargetCount="{len(routine.rungs)}"'
+    else:
+        header += f' TargetName="{escape_attribute(target_name)}" TargetType="{target_type}"'
+        if target_type == "Routine":
+            header += f' TargetSubType="{routine.routine_type}"'
+    header += f' ContainsContext="{str(not is_controller).lower()}" ExportDate="{now}" ExportOptions="{EXPORT_OPTIONS[target_type]}"'
+
+    controller_attributes = f'Use="{"Target" if is_controller else "Context"}" Name="{escape_attribute(controller.name)}"'
+    if is_controller:
+        controller_attributes += (f' ProcessorType="{escape_attribute(controller.processor_type)}"'
+                                  f' MajorRev="{controller.major_rev}" MinorRev="{controller.minor_rev}"')
+    yield f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<RSLogix5000Content {header}>
+  <Controller {controller_attributes}>
+    <DataTypes{_use(context)}>
+'''
+    data_type_role = "Target" if target_type == "DataType" else context
+    for data_type in data_types:
+        yield _data_type_xml(data_type, data_type_role) + "\n"
+    if programs is None:
+        yield '''    </DataTypes>
+  </Controller>
+</RSLogix5000Content>'''
+        return
+
+    yield f'''    </DataTypes>
+    <Tags{_use(context)}>
+'''
+    yield from join_blocks(make_tag_xml(tag.name, tag.data_type) for tag in controller.tags)
+    yield f'''
+    </Tags>
+    <Programs{_use(context)}>'''
+    for program in programs:
+        main_routine = f' MainRoutineName="{escape_attribute(program.main_routine_name)}"' if program.main_routine_name else ""
+        yield f'''
+      <Program{_use(program_role)} Name="{escape_attribute(program.name)}"{main_routine}>'''
+        if program.tags:
+            yield f'''
+        <Tags{_use(routine_role and "Context")}>
+'''
+            yield from join_blocks(make_tag_xml(tag.name, tag.data_type) for tag in program.tags)
+            yield '''
+        </Tags>'''
+        yield f'''
+        <Routines{_use(routine_role and "Context")}>'''
+        for current in ([routine] if routine is not None else program.routines):
+            yield f'''
+          <Routine{_use(routine_role)} Name="{escape_attribute(current.name)}" Type="{current.routine_type}">
+            <RLLContent{_use(rung_role and "Context")}>
+'''
+            yield from join_blocks(rung_xml(rung, rung_role) for rung in current.rungs)
+            yield '''
+            </RLLContent>
+          </Routine>'''
+        yield '''
+        </Routines>
+      </Program>'''
+    yield '''
+    </Programs>
+  </Controller>
+</RSLogix5000Content>'''
+
+def to_l5x(controller: Controller, target_type: str, target_name: str = None, export_date: str = None) -> str:
+    """iter_l5x as one string."""
+    return "".join(iter_l5x(controller, target_type, target_name, export_date))
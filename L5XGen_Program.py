@@ -0,0 +1,159 @@
+# L5XGen_Program.py
+#
+# Project-level export: many routines, one per Excel sheet or grouped by a column, generated in
+# parallel across processes and written as one Program or Controller L5X with a single
+# controller-scoped tag table.
+
+import os
+import re
+import openpyxl
+from openpyxl.utils import column_index_from_string
+from concurrent.futures import ProcessPoolExecutor
+from L5XGen_Tag import collect_tag_types
+from L5XGen_ILTokenizer import tokenize_il, clean_il_line
+from L5XGen_Writer import write_l5x
+from L5XGen_Model import Controller, Program, Routine, Rung, Tag, iter_l5x
+
+DEFAULT_ROUTINE_PROCESSES = int(os.environ.get("LLM4L5X_ROUTINE_PROCESSES", str(min(8, os.cpu_count() or 1))))
+# Below this many IL lines in total, starting worker processes costs more than it saves
+PARALLEL_MIN_LINES = int(os.environ.get("LLM4L5X_PARALLEL_MIN_LINES", "5000"))
+PROJECT_TARGETS = ("Program", "Controller")
+DEFAULT_ROUTINE_NAME = "Main_Routine"
+
+def routine_name_from(value) -> str:
+    """Routine name from a sheet title or group value: non-word characters become '_', no leading digit."""
+    name = re.sub(r"\W", "_", str(value).strip()).strip("_")
+    if not name:
+        return DEFAULT_ROUTINE_NAME
+    return f"R_{name}" if name[0].isdigit() else name
+
+def group_column_index(ws, group_column) -> int:
+    """1-based index of group_column, given as a column letter ('D') or a header in row 1 ('Routine')."""
+    if not isinstance(group_column, int):
+        index = None
+        name = str(group_column).strip()
+        for cell in next(ws.iter_rows(min_row=1, max_row=1), ()):
+            if cell.value is not None and str(cell.value).strip().lower() == name.lower():
+                index = cell.column
+                break
+        if index is None and name.isalpha() and len(name) <= 3:
+            index = column_index_from_string(name.upper())
+        if index is None:
+            raise ValueError(f"Group column '{group_column}' not found.")
+        group_column = index
+    # Columns A-C hold the question, the generated IL and the response time
+    if group_column <= 3:
+        raise ValueError(f"Group column {group_column} overlaps the question/IL/time columns; use column D or later.")
+    return group_column
+
+def ProcessProjectExcel(filepath, group_column=None) -> dict:
+    """
+    Reads the IL in Column B (starting at row 2) as routines.
+    Without group_column every sheet with IL is one routine named after the sheet; with group_column
+    the rows of the first sheet are grouped by that column, in order of first appearance.
+    Returns {routine_name: newline-separated IL}.
+    """
+    wb = openpyxl.load_workbook(filepath)
+    routines = {}
+
+    def add(name, value):
+        if value is not None:
+            routines.setdefault(routine_name_from(name), []).append(str(value))
+
+    if group_column is None:
+        for ws in wb.worksheets:
+            for (value,) in ws.iter_rows(min_row=2, min_col=2, max_col=2, values_only=True):
+                add(ws.title, value)
+    else:
+        ws = wb.active
+        group_index = group_column_index(ws, group_column)
+        for row in ws.iter_rows(min_row=2, values_only=True):
+            value = row[1] if len(row) > 1 else None
+            group = row[group_index - 1] if len(row) >= group_index else None
+            add(group if group not in (None, "") else DEFAULT_ROUTINE_NAME, value)
+
+    return {name: "\n".join(lines) for name, lines in routines.items()}
+
+def build_routine(item):
+    """
+    Process-pool worker: (routine_name, IL text) -> (routine_name, [(number, rung_text)], {tag: dtype}).
+    Rungs are numbered consecutively so Studio 5000 imports them without renumbering.
+    """
+    routine_name, text = item
+    lines = text.splitlines() if isinstance(text, str) else list(text)
+    tag_types = collect_tag_types(tokenize_il(line) for line in lines)
+    rung_texts = [cl for cl in map(clean_il_line, lines) if cl]
+    return routine_name, list(enumerate(rung_texts)), tag_types
+
+def generate_routines(routines: dict, processes: int = None) -> list:
+    """
+    Runs build_routine for every routine, across up to 'processes' worker processes.
+    Results keep the input order. One routine, processes=1 or a project smaller than
+    PARALLEL_MIN_LINES runs in this process.
+    """
+    items = list(routines.items())
+    processes = max(1, min(int(processes or DEFAULT_ROUTINE_PROCESSES), len(items) or 1))
+    total_lines = sum(text.count("\n") + 1 if isinstance(text, str) else len(text) for _, text in items)
+    if processes == 1 or total_lines < PARALLEL_MIN_LINES:
+        return [build_routine(item) for item in items]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(build_routine, items))
+
+def merge_tag_types(tag_maps):
+    """
+    Merges per-routine tag tables into one controller-scoped table without duplicates.
+    Returns (tag_types, conflicts); conflicts lists (tag, kept_dtype, other_dtype) for tags
+    the routines use with different types, where the first routine's type is kept.
+    """
+    merged = {}
+    conflicts = []
+    for tag_types in tag_maps:
+        for tag, dtype in tag_types.items():
+            kept = merged.setdefault(tag, dtype)
+            if kept != dtype:
+                conflicts.append((tag, kept, dtype))
+    return merged, conflicts
+
+def GenerateProgram(routines: dict, output_file: str = None, target: str = "Program", program_name: str = "Main_Program",
+                    controller_name: str = "SLMBuilt_Program", processes: int = None, return_text: bool = True,
+                    allow_conflicts: bool = False) -> dict:
+    """
+    Converts {routine_name: IL text} into one Program (or Controller) L5X with all routines in one
+    program and their tags merged into the controller tag table.
+    Returns a dict with 'success', 'program_text' (unless return_text=False), 'routines',
+    'tag_count' and 'conflicts', or 'success', 'error' and 'conflicts'.
+    A tag the routines use with different types fails the export, since one of its uses would get
+    an invalid type; with allow_conflicts=True the first routine's type is kept and the export goes on.
+    If output_file is given, the result is also written to disk.
+    """
+    try:
+        if target not in PROJECT_TARGETS:
+            raise ValueError(f"Unsupported project target '{target}'. Use one of: {', '.join(PROJECT_TARGETS)}.")
+        if not routines:
+            raise ValueError("No routines to generate.")
+
+        results = generate_routines(routines, processes)
+        tag_types, conflicts = merge_tag_types(tag_types for _, _, tag_types in results)
+        if conflicts and not allow_conflicts:
+            details = "; ".join(f"'{tag}' as {kept} and {other}" for tag, kept, other in conflicts)
+            return {"success": False, "error": f"Tags used with different data types: {details}.", "conflicts": conflicts}
+        for tag, kept, other in conflicts:
+            print(f"⚠️ Tag '{tag}' is used as {kept} and {other}; keeping {kept}.")
+
+        program = Program(program_name, [Routine(name, [Rung(number, text) for number, text in rungs]) for name, rungs, _ in results],
+                          main_routine_name=results[0][0])
+        controller = Controller(controller_name, tags=[Tag(t, dt) for t, dt in tag_types.items()], programs=[program])
+
+        result = {"success": True, "routines": [name for name, _, _ in results],
+                  "tag_count": len(tag_types), "conflicts": conflicts}
+        target_name = program_name if target == "Program" else controller_name
+        if return_text:
+            result["program_text"] = "".join(iter_l5x(controller, target, target_name))
+            if output_file:
+                write_l5x([result["program_text"]], output_file)
+        elif output_file:
+            write_l5x(iter_l5x(controller, target, target_name), output_file)
+        return result
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
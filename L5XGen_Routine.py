@@ -1,8 +1,19 @@
 # L5XGen_Routine.py
-import openpyxl
 import re
-from datetime import datetime
-from L5XGen_Tag import infer_tag_types, make_tag_xml, sanitize_tag
+import openpyxl
+from L5XGen_Tag import infer_tag_types_from_instructions, collect_tag_types, make_tag_xml, sanitize_tag
+from L5XGen_ILTokenizer import tokenize_il, clean_il_line
+from L5XGen_Writer import write_l5x, escape_attribute
+from L5XGen_Model import Controller, Program, Routine, Rung, Tag, iter_l5x, rung_xml
+
+# Used by AppendRungs to find its way around an existing export without parsing it
+TARGET_TYPE_PATTERN = re.compile(r'<RSLogix5000Content\b[^>]*?\bTargetType="([^"]*)"')
+TARGET_COUNT_PATTERN = re.compile(r'(<RSLogix5000Content\b[^>]*?\bTargetCount=")(\d+)(")')
+RLL_CONTENT_PATTERN = re.compile(r'<RLLContent\b[^>]*?(/?)>')
+RUNG_NUMBER_PATTERN = re.compile(r'<Rung\b[^>]*?\bNumber="(\d+)"')
+TAG_NAME_PATTERN = re.compile(r'<Tag Name="([^"]*)"')
+# Up to this many new tag names are looked up one by one; more are checked against one scan of the tags
+TAG_LOOKUPS = 4
 
 def ProcessRoutineExcel(filepath):
     """
@@ -18,68 +29,161 @@ def ProcessRoutineExcel(filepath):
     except Exception as e:
         return f"Error processing Excel file: {e}"
 
-def GenerateRoutine(text: str, output_file: str = None) -> dict:
+def build_routine_controller(lines, routine_name: str = "Main_Routine", program_name: str = "Main_Program",
+                             controller_name: str = "SLMBuilt_Program") -> Controller:
+    """
+    Builds the L5XGen_Model controller for IL lines (a string or a list of lines): the inferred tags
+    and one program with one routine. Tags and rungs are generators, so they are produced while the
+    routine is written and never held in memory; the controller can be written once.
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    tags = infer_tag_types_from_instructions(tokenize_il(line) for line in lines)
+
+    # Rung numbers follow the input line numbers, blank lines included
+    rungs = (Rung(i, cl) for i, cl in enumerate(map(clean_il_line, lines)) if cl)
+    routine = Routine(routine_name, rungs)
+    return Controller(controller_name, tags=(Tag(t, dt) for t, dt in tags.items()),
+                      programs=[Program(program_name, [routine])])
+
+def iter_routine_l5x(lines, routine_name: str = "Main_Routine", program_name: str = "Main_Program",
+                     controller_name: str = "SLMBuilt_Program"):
+    """Yields the Routine L5X for IL lines piece by piece (see L5XGen_Writer)."""
+    controller = build_routine_controller(lines, routine_name, program_name, controller_name)
+    yield from iter_l5x(controller, "Routine", routine_name)
+
+def GenerateRoutine(text: str, output_file: str = None, return_text: bool = True) -> dict:
     """
     Converts IL code in string format to RSLogix 5000 Routine XML.
     Returns a dict with 'success' and 'rung_text' or 'error'.
-    If output_file is given, the result is also written to disk.
+    If output_file is given, the result is streamed to disk; with return_text=False the
+    document is never held in memory and 'rung_text' is omitted.
     """
-    routine_name = "Main_Routine"
-    program_name = "Main_Program"
-    controller_name = "SLMBuilt_Program"
-    software_revision = "32.04"
-    export_options = ("References NoRawData L5KData DecoratedData Context Dependencies "
-                      "ForceProtectedEncoding AllProjDocTrans")
-
-    def clean_line(line):
-        line = re.sub(r"<!\[CDATA\[(.*?)\]\]>", r"\1", line).strip()
-        line = re.sub(r"[?]", "", line)
-        return re.sub(r"\s+", " ", line)
-
     try:
-        lines = text.splitlines()
-        tags = infer_tag_types(lines)
-        tag_blocks = "\n".join(make_tag_xml(t, dt) for t, dt in tags.items())
-
-        rung_blocks = ""
-        for i, line in enumerate(lines):
-            cl = clean_line(line)
-            if cl:
-                rung_blocks += f'''<Rung Number="{i}" Type="N">
-<Text>
-<![CDATA[{cl}]]>
-</Text>
-</Rung>
-'''
-
-        now = datetime.now().strftime("%a %b %d %H:%M:%S %Y")
-        rung_text = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
-<RSLogix5000Content SchemaRevision="1.0" SoftwareRevision="{software_revision}" TargetName="{routine_name}" TargetType="Routine" TargetSubType="RLL" ContainsContext="true" ExportDate="{now}" ExportOptions="{export_options}">
-  <Controller Use="Context" Name="{controller_name}">
-    <DataTypes Use="Context">
-    </DataTypes>
-    <Tags Use="Context">
-{tag_blocks}
-    </Tags>
-    <Programs Use="Context">
-      <Program Use="Context" Name="{program_name}">
-        <Routines Use="Context">
-          <Routine Use="Target" Name="{routine_name}" Type="RLL">
-            <RLLContent>
-{rung_blocks.strip()}
-            </RLLContent>
-          </Routine>
-        </Routines>
-      </Program>
-    </Programs>
-  </Controller>
-</RSLogix5000Content>'''
+        if output_file and not return_text:
+            write_l5x(iter_routine_l5x(text), output_file)
+            return {"success": True}
 
+        rung_text = "".join(iter_routine_l5x(text))
         if output_file:
-            with open(output_file, "w", encoding="utf-8") as f:
-                f.write(rung_text)
+            write_l5x([rung_text], output_file)
 
         return {"success": True, "rung_text": rung_text}
 
     except Exception as e:
         return {"success": False, "error": str(e)}
+
+def _line_start(text: str, position: int, floor: int) -> int:
+    """Position of the line break before position (not before floor), where new elements are inserted."""
+    return max(text.rfind("\n", floor, position), floor)
+
+def AppendRungs(l5x_text: str, text: str, output_file: str = None, routine_name: str = None,
+                return_text: bool = True) -> dict:
+    """
+    Appends the IL lines in text as new rungs to a Routine (or Rung) L5X export, such as one made
+    by GenerateRoutine, without regenerating it.
+    Only the new lines go through tag inference; tags the document already declares are skipped,
+    and the new rungs are numbered after the last existing rung. The document is spliced at the end
+    of the controller tags and of the routine's rungs, found by searching back from the end, so the
+    cost follows the size of the change rather than the routine.
+    routine_name picks the routine in an export with several (default: the last one, which is the
+    target of Routine and Rung exports).
+    Returns a dict with 'success', 'rung_text', 'rungs_added' and 'tags_added', or 'error'.
+    If output_file is given, the result is also written to disk; with return_text=False the
+    document is written in pieces and 'rung_text' is omitted.
+    """
+    try:
+        lines = text.splitlines()
+        rung_texts = [cl for cl in map(clean_il_line, lines) if cl]
+        if not rung_texts:
+            raise ValueError("No IL lines to append.")
+
+        target = TARGET_TYPE_PATTERN.search(l5x_text)
+        is_rung_export = target is not None and target.group(1) == "Rung"
+
+        # The routine to extend and the end of its rungs
+        if routine_name:
+            routine = re.search(rf'<Routine\b[^>]*?\bName="{re.escape(escape_attribute(routine_name))}"', l5x_text)
+            routine_start = routine.start() if routine else -1
+        else:
+            routine_start = l5x_text.rfind("<Routine ")
+        if routine_start < 0:
+            raise ValueError(f"Routine '{routine_name}' not found." if routine_name else "No routine found in the L5X.")
+        content = RLL_CONTENT_PATTERN.search(l5x_text, routine_start)
+        if content is None or l5x_text.find("</Routine>", routine_start, content.start()) >= 0:
+            raise ValueError("The routine has no RLLContent (only ladder routines can be appended to).")
+        if content.group(1):
+            # <RLLContent/>: empty routine, the new rungs become its content
+            rung_start, rung_end = content.start(), content.end()
+            rung_prefix, rung_suffix = content.group(0)[:-2] + ">\n", "\n</RLLContent>"
+            last_number = None
+        else:
+            if routine_name:
+                content_end = l5x_text.find("</RLLContent>", content.end())
+            else:
+                content_end = l5x_text.rfind("</RLLContent>", content.end())
+            if content_end < 0:
+                raise ValueError("The routine's RLLContent is not closed.")
+            rung_start = rung_end = _line_start(l5x_text, content_end, content.end())
+            rung_prefix, rung_suffix = "\n", ""
+            last_rung = l5x_text.rfind("<Rung ", content.end(), content_end)
+            number = RUNG_NUMBER_PATTERN.match(l5x_text, last_rung) if last_rung >= 0 else None
+            last_number = int(number.group(1)) if number else None
+
+        # Controller tags end right before <Programs>; only tags not declared before the routine are new
+        programs_at = l5x_text.rfind("<Programs", 0, routine_start)
+        if programs_at < 0:
+            raise ValueError("No <Programs> element found before the routine.")
+        tag_types = collect_tag_types(tokenize_il(line) for line in lines)
+        if len(tag_types) <= TAG_LOOKUPS:
+            new_tags = [(t, dt) for t, dt in tag_types.items()
+                        if l5x_text.find(f'<Tag Name="{escape_attribute(t)}"', 0, content.start()) < 0]
+        else:
+            existing = set(TAG_NAME_PATTERN.findall(l5x_text, 0, content.start()))
+            new_tags = [(t, dt) for t, dt in tag_types.items() if escape_attribute(t) not in existing]
+
+        tag_block = "\n".join(make_tag_xml(t, dt) for t, dt in new_tags)
+        previous_end = programs_at
+        while previous_end and l5x_text[previous_end - 1].isspace():
+            previous_end -= 1
+        previous_start = l5x_text.rfind("<", 0, previous_end)
+        previous = l5x_text[previous_start:previous_end]
+        if not new_tags:
+            tag_start = tag_end = rung_start
+            tag_block = ""
+        elif previous == "</Tags>":
+            tag_start = tag_end = _line_start(l5x_text, previous_start, 0)
+            tag_block = "\n" + tag_block
+        elif previous.startswith("<Tags") and previous.endswith("/>"):
+            tag_start, tag_end = previous_start, previous_end
+            tag_block = f"{previous[:-2].rstrip()}>\n{tag_block}\n</Tags>"
+        else:
+            tag_start = tag_end = programs_at
+            tag_block = f'<Tags Use="Context">\n{tag_block}\n</Tags>\n    '
+
+        # Rung exports keep every rung at Number 0 (the importing routine renumbers them)
+        first_number = 0 if is_rung_export or last_number is None else last_number + 1
+        role = "Target" if is_rung_export else ""
+        rung_block = rung_prefix + "\n".join(
+            rung_xml(Rung(first_number + (0 if is_rung_export else i), cl), role) for i, cl in enumerate(rung_texts)) + rung_suffix
+
+        if is_rung_export:
+            # TargetCount is in the root element, a few hundred characters in
+            root_end = l5x_text.find(">", l5x_text.find("<RSLogix5000Content")) + 1
+            root = TARGET_COUNT_PATTERN.sub(lambda m: f"{m.group(1)}{int(m.group(2)) + len(rung_texts)}{m.group(3)}",
+                                            l5x_text[:root_end], count=1)
+            pieces = [root, l5x_text[root_end:tag_start]]
+        else:
+            pieces = [l5x_text[:tag_start]]
+        pieces += [tag_block, l5x_text[tag_end:rung_start], rung_block, l5x_text[rung_end:]]
+
+        result = {"success": True, "rungs_added": len(rung_texts), "tags_added": [t for t, _ in new_tags]}
+        if return_text:
+            result["rung_text"] = "".join(pieces)
+            pieces = [result["rung_text"]]
+        if output_file:
+            write_l5x(pieces, output_file)
+        return result
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
@@ -1,66 +1,32 @@
 # L5XGen_Rung.py
 
-import re
-from datetime import datetime
-from L5XGen_Tag import infer_tag_types, make_tag_xml, sanitize_tag
+from L5XGen_Tag import infer_tag_types_from_instructions
+from L5XGen_ILTokenizer import tokenize_il, clean_il_line as clean_line
+from L5XGen_Model import Controller, Program, Routine, Rung, Tag, iter_l5x
 
-def clean_line(line):
-    line = re.sub(r"<!\[CDATA\[(.*?)\]\]>", r"\1", line).strip()
-    line = re.sub(r"[?]", "", line)
-    return re.sub(r"\s+", " ", line)
+def iter_rung_l5x(lines, routine_name: str = "Main_Routine", program_name: str = "Main_Program",
+                  controller_name: str = "SLMBuilt_Program"):
+    """
+    Yields the Rung L5X snippet for IL lines (a string or a list of lines) piece by piece,
+    tags first, then one rung at a time.
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    tags = infer_tag_types_from_instructions(tokenize_il(line) for line in lines)
+
+    # A rung export is pasted into an existing routine, which renumbers it
+    routine = Routine(routine_name, [Rung(0, cl) for cl in map(clean_line, lines) if cl])
+    controller = Controller(controller_name, tags=[Tag(t, dt) for t, dt in tags.items()],
+                            programs=[Program(program_name, [routine])])
+    yield from iter_l5x(controller, "Rung", routine_name)
 
 def GenerateRung(text: str) -> dict:
     """
     Converts IL code in string format to a valid RSLogix 5000 Rung XML snippet.
     Returns a dictionary with 'success' and 'rung_text' or 'error'.
     """
-
-    # === Configurable variables ===
-    routine_name = "Main_Routine"
-    program_name = "Main_Program"
-    controller_name = "SLMBuilt_Program"
-    software_revision = "32.04"
-    export_options = ("References NoRawData L5KData DecoratedData Context "
-                      "RoutineLabels AliasExtras IOTags NoStringData "
-                      "ForceProtectedEncoding AllProjDocTrans")
-
     try:
-        lines = text.splitlines()
-        tags = infer_tag_types(lines)
-        tag_blocks = "\n".join(make_tag_xml(t, dt) for t, dt in tags.items())
-
-        rung_blocks = ""
-        for line in lines:
-            cl = clean_line(line)
-            if cl:
-                rung_blocks += f'''<Rung Use="Target" Number="0" Type="N">
-<Text><![CDATA[{cl}]]></Text>
-</Rung>
-'''
-
-        now = datetime.now().strftime("%a %b %d %H:%M:%S %Y")
-        rung_text = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
-<RSLogix5000Content SchemaRevision="1.0" SoftwareRevision="{software_revision}" TargetType="Rung" TargetCount="1" ContainsContext="true" ExportDate="{now}" ExportOptions="{export_options}">
-<Controller Use="Context" Name="{controller_name}">
-<DataTypes Use="Context"/>
-<Tags Use="Context">
-{tag_blocks}
-</Tags>
-<Programs Use="Context">
-<Program Use="Context" Name="{program_name}">
-<Routines Use="Context">
-<Routine Use="Context" Name="{routine_name}">
-<RLLContent Use="Context">
-{rung_blocks.strip()}
-</RLLContent>
-</Routine>
-</Routines>
-</Program>
-</Programs>
-</Controller>
-</RSLogix5000Content>
-'''
-        return {"success": True, "rung_text": rung_text}
+        return {"success": True, "rung_text": "".join(iter_rung_l5x(text))}
 
     except Exception as e:
         return {"success": False, "error": str(e)}
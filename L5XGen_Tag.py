@@ -2,6 +2,9 @@
 
 import re
 from collections import defaultdict
+from functools import lru_cache
+from L5XGen_ILTokenizer import tokenize_il
+from L5XGen_Writer import escape_attribute
 
 # Instruction sets by data type
 BOOL_INSTR = {"XIC", "XIO", "OTE", "OTL", "OTU", "ONS"}
@@ -10,6 +13,8 @@ STRING_INSTR = {"FIND", "CONCAT", "INSERT", "MID", "DELETE"}
 TIMER_INSTR = {"TON", "TOF", "TON.DN", "TOF.DN"}
 COUNTER_INSTR = {"CTU", "CTD", "CTU.DN", "CTD.DN"}
 
+# Tag names repeat on almost every rung; the regex work is done once per distinct name
+@lru_cache(maxsize=65536)
 def sanitize_tag(tag):
     """
     Replace non-word chars with underscore,
@@ -28,46 +33,71 @@ def sanitize_tag(tag):
     return tag
 
 
+def instruction_dtype(instr):
+    """Data type of the tags an instruction operates on."""
+    instr = instr.upper()
+    if instr in BOOL_INSTR:
+        return "BOOL"
+    if instr in REAL_INSTR:
+        return "REAL"
+    if instr in STRING_INSTR:
+        return "STRING"
+    if instr in TIMER_INSTR:
+        return "TIMER"
+    if instr in COUNTER_INSTR:
+        return "COUNTER"
+    return "DINT"
+
 def infer_tag_types(lines):
     """
     Infer tag types from instruction lines.
     Return dict {tag_name: dtype} without duplicates.
     If duplicate tag encountered, append _1, _2, ... suffix.
     """
+    return infer_tag_types_from_instructions(tokenize_il(line.strip()) for line in lines)
+
+def _instruction_tags(instruction_lists):
+    """Yields (tag, dtype) for every tag operand, in order. Operands that are parenthesized expressions are not tags."""
+    for instructions in instruction_lists:
+        for instruction in instructions:
+            if not instruction.operands:
+                continue
+            dtype = instruction_dtype(instruction.name)
+
+            for raw_tag in map(str.strip, instruction.operands):
+                if "(" in raw_tag:
+                    continue
+                tag = sanitize_tag(raw_tag)
+                if tag:
+                    yield tag, dtype
+
+def infer_tag_types_from_instructions(instruction_lists):
+    """
+    infer_tag_types for lines that were already tokenized (L5XGen_ILTokenizer), one instruction list per line.
+    """
     tag_types = {}
     tag_counts = defaultdict(int)  # track counts for duplicates
-    pattern = re.compile(r"(\w+)\(([^()]+)\)")
-    
-    for line in lines:
-        for instr, tags_str in pattern.findall(line.strip()):
-            instr = instr.upper()
-            if instr in BOOL_INSTR:
-                dtype = "BOOL"
-            elif instr in REAL_INSTR:
-                dtype = "REAL"
-            elif instr in STRING_INSTR:
-                dtype = "STRING"
-            elif instr in TIMER_INSTR:
-                dtype = "TIMER"
-            elif instr in COUNTER_INSTR:
-                dtype = "COUNTER"
-            else:
-                dtype = "DINT"
-
-            for raw_tag in map(str.strip, tags_str.split(',')):
-                tag = sanitize_tag(raw_tag)
-                if not tag:
-                    continue
-                
-                base_tag = tag
-                count = tag_counts[base_tag]
-                # If tag already used, append suffix _1, _2, ...
-                while tag in tag_types:
-                    count += 1
-                    tag = f"{base_tag}_{count}"
-                tag_counts[base_tag] = count
-                
-                tag_types[tag] = dtype
+
+    for tag, dtype in _instruction_tags(instruction_lists):
+        base_tag = tag
+        count = tag_counts[base_tag]
+        # If tag already used, append suffix _1, _2, ...
+        while tag in tag_types:
+            count += 1
+            tag = f"{base_tag}_{count}"
+        tag_counts[base_tag] = count
+
+        tag_types[tag] = dtype
+    return tag_types
+
+def collect_tag_types(instruction_lists):
+    """
+    Return dict {tag_name: dtype} with one entry per tag name, for tag tables shared by several
+    routines. A tag used by instructions of different types keeps the type of its first use.
+    """
+    tag_types = {}
+    for tag, dtype in _instruction_tags(instruction_lists):
+        tag_types.setdefault(tag, dtype)
     return tag_types
 
 
@@ -76,6 +106,7 @@ def make_tag_xml(tag, dtype):
     """
     Generate XML block for a tag based on its data type.
     """
+    tag = escape_attribute(tag)
     if dtype == "BOOL":
         return f'''<Tag Name="{tag}" TagType="Base" DataType="BOOL" Radix="Decimal" Constant="false" ExternalAccess="Read/Write">
   <Data Format="L5K"><![CDATA[0]]></Data>
@@ -1,6 +1,7 @@
 #L5XGen_UDT.py
 import datetime
 import re
+from L5XGen_Model import Controller, DataType, Member, to_l5x
 
 # Priority map for sorting members by type and whether array or not
 TYPE_PRIORITY = {
@@ -43,11 +44,45 @@ def get_type_priority(tag_type: str, dimension: int) -> int:
         key = tag_type
     return TYPE_PRIORITY.get(key, TYPE_PRIORITY["OTHER"])
 
-def format_description(description: str) -> str:
-    """Format description into XML CDATA block if present."""
-    if description:
-        return f"\n          <Description>\n            <![CDATA[{description}]]>\n          </Description>"
-    return ""
+def build_udt_members(sorted_tags) -> list:
+    """
+    Turns sorted tag dicts into L5XGen_Model Members. Individual BOOLs are packed 8 at a time into a
+    hidden SINT with one BIT member per bool.
+    """
+    members = []
+    bool_pack = []
+
+    def flush_bool_pack():
+        """Flush accumulated BOOL bits into a packed SINT and BIT members."""
+        if not bool_pack:
+            return
+        hidden_sint_name = f"ZZZZZZZZZZ{bool_pack[0]['name']}"
+        members.append(Member(hidden_sint_name, "SINT", hidden=True))
+        for bit_index, tag in enumerate(bool_pack):
+            members.append(Member(tag["name"], "BIT", external_access=tag.get("external_access", "Read/Write"),
+                                  description=tag["description"], target=hidden_sint_name, bit_number=bit_index))
+        bool_pack.clear()
+
+    for tag in sorted_tags:
+        dtype = tag["type"]
+        dimension = tag["dimension"]
+
+        if dtype == "BOOL" and dimension == 0:
+            # Bit-pack individual BOOL tags into SINT packs of 8 bits
+            bool_pack.append(tag)
+            if len(bool_pack) == 8:
+                flush_bool_pack()
+        else:
+            # Flush any pending bool pack before adding non-BOOL or arrays
+            flush_bool_pack()
+            # Radix only Decimal for integral types and BOOL, else NullType
+            radix = "Decimal" if dtype in ["BOOL", "SINT", "INT", "DINT"] else "NullType"
+            members.append(Member(tag["name"], dtype, dimension, radix, hidden=tag.get("hidden", False),
+                                  external_access=tag.get("external_access", "Read/Write"), description=tag["description"]))
+
+    # Flush remaining BOOL bit pack if any
+    flush_bool_pack()
+    return members
 
 def generate_udt_l5x_from_tags(data_dict, controller_name="Controller") -> dict:
     """
@@ -130,73 +165,8 @@ def generate_udt_l5x_from_tags(data_dict, controller_name="Controller") -> dict:
         # Sort tags by type priority and name
         sorted_tags = sorted(cleaned_tags, key=lambda t: (get_type_priority(t["type"], t["dimension"]), t["name"].lower()))
 
-        l5x_members = []
-        bool_pack = []
-
-        def flush_bool_pack():
-            """Flush accumulated BOOL bits into a packed SINT and BIT members."""
-            nonlocal l5x_members, bool_pack
-            if not bool_pack:
-                return
-            first_bool_name = bool_pack[0]['name']
-            hidden_sint_name = f"ZZZZZZZZZZ{first_bool_name}"
-            # Add hidden SINT to hold bits
-            l5x_members.append(
-                f'''          <Member Name="{hidden_sint_name}" DataType="SINT" Dimension="0" Radix="Decimal" Hidden="true" ExternalAccess="Read/Write"/>'''
-            )
-            # Add bit members referencing the hidden SINT bits
-            for bit_index, tag in enumerate(bool_pack):
-                desc_block = format_description(tag["description"])
-                external_access = tag.get("external_access", "Read/Write")
-                l5x_members.append(
-                    f'''          <Member Name="{tag['name']}" DataType="BIT" Dimension="0" Radix="Decimal" Hidden="false" Target="{hidden_sint_name}" BitNumber="{bit_index}" ExternalAccess="{external_access}">{desc_block}
-          </Member>'''
-                )
-            bool_pack.clear()
-
-        # Build members XML
-        for tag in sorted_tags:
-            dtype = tag["type"]
-            dimension = tag["dimension"]
-
-            if dtype == "BOOL" and dimension == 0:
-                # Bit-pack individual BOOL tags into SINT packs of 8 bits
-                bool_pack.append(tag)
-                if len(bool_pack) == 8:
-                    flush_bool_pack()
-            else:
-                # Flush any pending bool pack before adding non-BOOL or arrays
-                flush_bool_pack()
-
-                desc_block = format_description(tag["description"])
-
-                # Radix only Decimal for integral types and BOOL, else NullType
-                if dtype in ["BOOL", "SINT", "INT", "DINT"]:
-                    radix = "Decimal"
-                else:
-                    radix = "NullType"
-
-                l5x_members.append(
-                    f'''          <Member Name="{tag['name']}" DataType="{dtype}" Dimension="{dimension}" Radix="{radix}" Hidden="{str(tag.get("hidden", False)).lower()}" ExternalAccess="{tag.get("external_access", "Read/Write")}">{desc_block}
-          </Member>'''
-                )
-
-        # Flush remaining BOOL bit pack if any
-        flush_bool_pack()
-
-        # Compose final L5X XML string
-        udt_l5x = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
-<RSLogix5000Content SchemaRevision="1.0" SoftwareRevision="32.04" TargetName="{udt_name}" TargetType="DataType" ContainsContext="true" ExportDate="{now}" ExportOptions="References NoRawData L5KData DecoratedData Context Dependencies ForceProtectedEncoding AllProjDocTrans">
-  <Controller Use="Context" Name="{controller_name}">
-    <DataTypes Use="Context">
-      <DataType Use="Target" Name="{udt_name}" Family="NoFamily" Class="User">
-        <Members>
-{chr(10).join(l5x_members)}
-        </Members>
-      </DataType>
-    </DataTypes>
-  </Controller>
-</RSLogix5000Content>"""
+        controller = Controller(controller_name, data_types=[DataType(udt_name, build_udt_members(sorted_tags))])
+        udt_l5x = to_l5x(controller, "DataType", udt_name, export_date=now)
 
         return {
             "success": True,
@@ -0,0 +1,64 @@
+# L5XGen_Writer.py
+#
+# Streaming output for the L5X generators. The iter_*_l5x functions in L5XGen_Routine, L5XGen_Rung
+# and L5XGen_UDT yield a document piece by piece; the helpers here escape and CDATA-wrap those
+# pieces, group them into larger chunks and write them to a file or an HTTP response, so a routine
+# with 100k+ rungs never has to exist as one string.
+
+import os
+
+CHUNK_SIZE = 64 * 1024   # characters per chunk handed to the file or response
+
+ATTRIBUTE_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;",
+                                   "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"})
+
+def escape_attribute(value) -> str:
+    """Escapes a value for use inside a double-quoted XML attribute."""
+    return str(value).translate(ATTRIBUTE_ESCAPES)
+
+def cdata(text) -> str:
+    """
+    Wraps text in a CDATA section. A ']]>' inside the text would end the section early,
+    so it is split across two sections.
+    """
+    return "<![CDATA[" + str(text).replace("]]>", "]]]]><![CDATA[>") + "]]>"
+
+def join_blocks(blocks, separator: str = "\n"):
+    """Yields blocks with separator between them, like separator.join(blocks) without building the string."""
+    first = True
+    for block in blocks:
+        if not first:
+            yield separator
+        first = False
+        yield block
+
+def buffered(pieces, size: int = CHUNK_SIZE):
+    """Groups many small pieces into chunks of about size characters."""
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+def write_l5x(chunks, output_file) -> int:
+    """
+    Writes the chunks to output_file (a path or an open text file) and returns the number of
+    characters written. A path is written to a temporary file first and then moved into place,
+    so a failure half way never leaves a truncated L5X behind.
+    """
+    if hasattr(output_file, "write"):
+        return sum(output_file.write(chunk) for chunk in buffered(chunks))
+
+    temp_file = f"{output_file}.tmp"
+    try:
+        with open(temp_file, "w", encoding="utf-8") as f:
+            written = sum(f.write(chunk) for chunk in buffered(chunks))
+        os.replace(temp_file, output_file)
+        return written
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
@@ -0,0 +1,190 @@
+# Metrics_Registry.py
+#
+# Minimal Prometheus-style metrics (counters, gauges, histograms with labels) rendered in the
+# text exposition format served by app.py at /metrics. Modules that already keep their own
+# counters (model_Client, model_ResponseCache, model_IntentionAnalyzer) register a collector
+# that turns them into samples at scrape time.
+
+import time
+import threading
+from contextlib import contextmanager
+
+# Seconds; model calls on CPU can take minutes
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Seconds; most pipeline stages apart from the model call are sub-millisecond
+STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the with-block, also when it raises."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(key, list(entry["counts"]), entry["sum"], entry["count"]) for key, entry in self._values.items()]
+        lines = []
+        for key, counts, total, count in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels({**labels, "le": _format_value(float(bound))})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        collector() is called on every scrape and returns [(name, kind, documentation, [(labels, value), ...]), ...].
+        """
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"[Metrics_Registry] Collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# === Shared metrics ===
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "llm4l5x_http_requests_total", "HTTP requests by endpoint, method and status code.", ("endpoint", "method", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "llm4l5x_http_request_duration_seconds", "Time until the response is returned (first byte for streams).", ("endpoint",)))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "llm4l5x_http_requests_in_flight", "HTTP requests currently being handled.", ("endpoint",)))
+
+INTENT_REQUESTS = REGISTRY.register(Counter(
+    "llm4l5x_intent_requests_total", "Chat requests by endpoint and detected intent.", ("endpoint", "intent")))
+INTENT_LATENCY = REGISTRY.register(Histogram(
+    "llm4l5x_intent_request_duration_seconds", "End-to-end chat request time by detected intent.", ("endpoint", "intent")))
+
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "llm4l5x_stage_duration_seconds", "Time spent in each pipeline stage.", ("pipeline", "stage"), buckets=STAGE_BUCKETS))
+PIPELINE_ERRORS = REGISTRY.register(Counter(
+    "llm4l5x_pipeline_errors_total", "Questions or rows that ended with an error.", ("pipeline",)))
+EXCEL_ROWS = REGISTRY.register(Counter(
+    "llm4l5x_excel_rows_total", "Excel rows processed by outcome.", ("outcome",)))
+
+MODEL_LATENCY = REGISTRY.register(Histogram(
+    "llm4l5x_model_request_duration_seconds", "Model call time including retries, measured once a concurrency slot is free.", ("model", "mode")))
+MODEL_TOKENS = REGISTRY.register(Counter(
+    "llm4l5x_model_tokens_total", "Prompt and completion tokens reported by the backend.", ("model", "kind")))
@@ -1,6 +1,8 @@
 # Validator_InstructionDetection.py
 
 import re
+from collections import deque
+from functools import lru_cache
 
 instruction_keywords = {
     'TON': ['ON Timer','timer on', 'on delay timer', 'TON', 'TOn','ToN', 'time delay on', 'time on', 'timer start', 'turn on after delay',
@@ -49,83 +51,140 @@ preferred_order = [
     'OTU', 'OTL', 'OTE','ADD', 'SUB', 'MUL', 'DIV'
 ]
 
+DETECTION_CACHE_SIZE = 4096   # distinct lines remembered by detect_instruction
+
+def build_keyword_matcher():
+    """
+    Compiles the keyword tables into an Aho-Corasick automaton, so one pass over a line finds
+    every keyword occurrence. Keywords are numbered by priority: instructions in preferred_order,
+    longest keyword first within an instruction - the order the original per-keyword search used.
+    Returns (goto, fail, outputs, keyword_table); outputs[state] lists (priority, length, needs_word_boundary)
+    sorted by priority, and keyword_table[priority] is (keyword, instruction).
+    """
+    keyword_table = []
+    seen = set()
+    for instruction in preferred_order:
+        keywords = [k.lower() for k in instruction_keywords.get(instruction, [])]
+        for kw in sorted(keywords, key=lambda k: -len(k)):  # longest match first
+            if (instruction, kw) not in seen:
+                seen.add((instruction, kw))
+                keyword_table.append((kw, instruction))
+
+    goto, outputs = [{}], [[]]
+    for priority, (kw, _) in enumerate(keyword_table):
+        state = 0
+        for ch in kw:
+            if ch not in goto[state]:
+                goto.append({})
+                outputs.append([])
+                goto[state][ch] = len(goto) - 1
+            state = goto[state][ch]
+        outputs[state].append((priority, len(kw), kw.isalnum()))
+
+    # Breadth-first fail links; each state also reports the keywords of its fail state
+    fail = [0] * len(goto)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for ch, child in goto[state].items():
+            fallback = fail[state]
+            while fallback and ch not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[child] = goto[fallback].get(ch, 0)
+            outputs[child] = outputs[child] + outputs[fail[child]]
+            queue.append(child)
+    outputs = [tuple(sorted(entries)) for entries in outputs]
+    return goto, fail, outputs, keyword_table
+
+KEYWORD_GOTO, KEYWORD_FAIL, KEYWORD_OUTPUTS, KEYWORD_TABLE = build_keyword_matcher()
+
+def _is_word_char(ch: str) -> bool:
+    # Same definition as regex \w on str
+    return ch.isalnum() or ch == '_'
+
+def match_keyword(text: str):
+    """
+    Returns the priority of the best keyword found in text (an index into KEYWORD_TABLE), or None.
+    Keywords made only of letters/digits must sit on word boundaries, like r'\bkw\b'.
+    """
+    goto, fail, outputs = KEYWORD_GOTO, KEYWORD_FAIL, KEYWORD_OUTPUTS
+    best = None
+    state = 0
+    length = len(text)
+    for end, ch in enumerate(text, 1):
+        while state and ch not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(ch, 0)
+        for priority, kw_length, bounded in outputs[state]:
+            if best is not None and priority >= best:
+                break
+            if bounded:
+                start = end - kw_length
+                if (start > 0 and _is_word_char(text[start - 1])) or (end < length and _is_word_char(text[end])):
+                    continue
+            best = priority
+            break
+        if best == 0:
+            break
+    return best
+
+# Fallbacks for phrasings the keyword tables miss, checked in this order
+TIMER_RISING_PATTERN = re.compile(r'(?=.*\btimer\b)(?=.*\brising\s+(scan|pulse|edge)\b)')
+TIMER_FALLING_PATTERN = re.compile(r'(?=.*\btimer\b)(?=.*\bfalling\s+(scan|pulse|edge)\b)')
+RESET_TO_ZERO_PATTERN = re.compile(r'\breset\b.*\bto\s+(0|zero)\b')
+TIMER_NOT_DONE_PATTERN = re.compile(r"\btimer\b.*\b(not|no|n't|isn't|hasn't|haven't)\b.*\b(done|completed|reached)\b")
+COUNTER_NOT_DONE_PATTERN = re.compile(r"\bcounter\b.*\b(not|no|n't|isn't|hasn't|haven't)\b.*\b(done|completed|reached)\b")
+TIMER_DONE_PATTERN = re.compile(r'\btimer\b.*\b(reached|completed|done)\b')
+COUNTER_DONE_PATTERN = re.compile(r'\bcounter\b.*\b(reached|completed|done)\b')
+
+def rebuild_keyword_matcher():
+    """Recompiles the matcher after instruction_keywords or preferred_order were changed at runtime."""
+    global KEYWORD_GOTO, KEYWORD_FAIL, KEYWORD_OUTPUTS, KEYWORD_TABLE
+    KEYWORD_GOTO, KEYWORD_FAIL, KEYWORD_OUTPUTS, KEYWORD_TABLE = build_keyword_matcher()
+    _detect_instruction_cached.cache_clear()
+
 def detect_instruction(question: str):
+    """
+    Rule-based instruction detection for one line.
+    Returns (found_keywords, instruction, operand_count); instruction and operand_count are None if nothing matched.
+    Results are memoized per line.
+    """
+    found_keywords, matched_instruction, operand_count = _detect_instruction_cached(question)
+    return list(found_keywords), matched_instruction, operand_count
 
-    found_keywords = []
-    matched_instruction = None
+@lru_cache(maxsize=DETECTION_CACHE_SIZE)
+def _detect_instruction_cached(question: str):
     question_lower = question.lower()
 
     # Prioritized keyword search
-    for instruction in preferred_order:
-        keywords = [k.lower() for k in instruction_keywords.get(instruction, [])]
-        sorted_keywords = sorted(keywords, key=lambda k: -len(k))  # longest match first
-        for kw in sorted_keywords:
-            if kw.isalnum():
-                pattern = r'\b' + re.escape(kw) + r'\b'
-            else:
-                pattern = re.escape(kw)
-            if re.search(pattern, question_lower):
-                found_keywords.append(kw)
-                matched_instruction = instruction
-                operand_count = instruction_operand_counts.get(instruction)
-                return found_keywords, matched_instruction, operand_count
+    best = match_keyword(question_lower)
+    if best is not None:
+        kw, instruction = KEYWORD_TABLE[best]
+        return (kw,), instruction, instruction_operand_counts.get(instruction)
 
     if ('value' in question_lower and 
     ('assign' in question_lower or 'set' in question_lower)):
-        found_keywords.append('assign/set value')
-        matched_instruction = 'MOV'
-        operand_count = instruction_operand_counts.get('MOV')
-        return found_keywords, matched_instruction, operand_count
-
-    if re.search(r'(?=.*\btimer\b)(?=.*\brising\s+(scan|pulse|edge)\b)', question_lower):
-        found_keywords.append('Timer on rising scan')
-        matched_instruction = 'TON'
-        operand_count = instruction_operand_counts.get('TON')
-        return found_keywords, matched_instruction, operand_count
-
-    if re.search(r'(?=.*\btimer\b)(?=.*\bfalling\s+(scan|pulse|edge)\b)', question_lower):
-        found_keywords.append('Timer on falling scan')
-        matched_instruction = 'TOF'
-        operand_count = instruction_operand_counts.get('TOF')
-        return found_keywords, matched_instruction, operand_count
-
-    if re.search(r'\breset\b.*\bto\s+(0|zero)\b', question_lower):
-        found_keywords.append('reset to 0 or zero')
-        matched_instruction = 'CLR'
-        operand_count = instruction_operand_counts.get('CLR')
-        return found_keywords, matched_instruction, operand_count
-
-    timer_not_done_pattern = r"\btimer\b.*\b(not|no|n't|isn't|hasn't|haven't)\b.*\b(done|completed|reached)\b"
-    timer_not_done_match = re.search(timer_not_done_pattern, question_lower)
-    if timer_not_done_match:
-        found_keywords.append('timer not done')
-        matched_instruction = 'XIO' 
-        operand_count = 1
-        return found_keywords, matched_instruction, operand_count
-
-    counter_not_done_pattern = r"\bcounter\b.*\b(not|no|n't|isn't|hasn't|haven't)\b.*\b(done|completed|reached)\b"
-    counter_not_done_match = re.search(counter_not_done_pattern, question_lower)
-    if counter_not_done_match:
-        found_keywords.append('counter not done')
-        matched_instruction = 'XIO'  
-        operand_count = 1
-        return found_keywords, matched_instruction, operand_count
-    
-    timer_done_pattern = r'\btimer\b.*\b(reached|completed|done)\b'
-    timer_done_match = re.search(timer_done_pattern, question_lower)
-    if timer_done_match:
-        found_keywords.append('timer done')
-        matched_instruction = 'XIC'  
-        operand_count = 1
-        return found_keywords, matched_instruction, operand_count
-    
-    counter_done_pattern = r'\bcounter\b.*\b(reached|completed|done)\b'
-    counter_done_match = re.search(counter_done_pattern, question_lower)
-    if counter_done_match:
-        found_keywords.append('counter done')
-        matched_instruction = 'XIC' 
-        operand_count = 1
-        return found_keywords, matched_instruction, operand_count
-
-    return found_keywords, None, None
+        return ('assign/set value',), 'MOV', instruction_operand_counts.get('MOV')
+
+    if TIMER_RISING_PATTERN.search(question_lower):
+        return ('Timer on rising scan',), 'TON', instruction_operand_counts.get('TON')
+
+    if TIMER_FALLING_PATTERN.search(question_lower):
+        return ('Timer on falling scan',), 'TOF', instruction_operand_counts.get('TOF')
+
+    if RESET_TO_ZERO_PATTERN.search(question_lower):
+        return ('reset to 0 or zero',), 'CLR', instruction_operand_counts.get('CLR')
+
+    if TIMER_NOT_DONE_PATTERN.search(question_lower):
+        return ('timer not done',), 'XIO', 1
+
+    if COUNTER_NOT_DONE_PATTERN.search(question_lower):
+        return ('counter not done',), 'XIO', 1
+
+    if TIMER_DONE_PATTERN.search(question_lower):
+        return ('timer done',), 'XIC', 1
+
+    if COUNTER_DONE_PATTERN.search(question_lower):
+        return ('counter done',), 'XIC', 1
 
+    return (), None, None
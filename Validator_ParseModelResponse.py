@@ -1,57 +1,167 @@
 # Validator_ParseModelResponse.py
 
 import re
+from abc import ABC, abstractmethod
 
-def parse_model_output(raw_output: str):
-    lines = raw_output.splitlines()
-    instructions = []
+def parse_model_output(raw_output: str, protocol: str = "full", line_texts=None):
+    return [instruction for _, instruction in parse_model_output_labeled(raw_output, protocol, line_texts)]
 
-    current_line_num = None
-    line_text_accum = []
-    output_instr = None
-    keyword_str = None
-    operation_str = None
+def parse_model_output_labeled(raw_output: str, protocol: str = "full", line_texts=None):
+    """
+    Same as parse_model_output, but each instruction is paired with its 'LineX' label:
+    returns [(label, (line_text, output_instr, keyword_str, operation_str)), ...].
+    protocol and line_texts are passed to create_output_parser.
+    """
+    parser = create_output_parser(protocol, line_texts)
+    return parser.feed(raw_output) + parser.close()
 
-    line_pattern = re.compile(r"^line\s*\w*\s*:", re.IGNORECASE)
-    output_pattern = re.compile(r"^output operation\s*:", re.IGNORECASE)
-    found_pattern = re.compile(r"^found keyword\s*:", re.IGNORECASE)
-    inferred_pattern = re.compile(r"^inferred operation\s*:", re.IGNORECASE)
+def create_output_parser(protocol: str = "full", line_texts=None):
+    """
+    Returns the incremental parser for the protocol the model was prompted with.
+    line_texts (the input lines, Line1 first) is only used by the compact protocol, which does not echo them.
+    """
+    if protocol == "compact":
+        return IncrementalCompactOutputParser(line_texts)
+    return IncrementalModelOutputParser()
 
-    def save_instruction():
-        if current_line_num and line_text_accum and output_instr and keyword_str and operation_str:
-            line_text = " ".join(line_text_accum).strip()
-            instructions.append((line_text, output_instr, keyword_str, operation_str))
+LINE_PATTERN = re.compile(r"^line\s*\w*\s*:", re.IGNORECASE)
+OUTPUT_PATTERN = re.compile(r"^output operation\s*:", re.IGNORECASE)
+FOUND_PATTERN = re.compile(r"^found keyword\s*:", re.IGNORECASE)
+INFERRED_PATTERN = re.compile(r"^inferred operation\s*:", re.IGNORECASE)
 
-    for line in lines:
+class IncrementalOutputParser(ABC):
+    """
+    Line buffering shared by the protocol parsers: text fed in chunks is handed to _process_line
+    one complete line at a time. feed() and close() return the (label, instruction) tuples completed.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self.instructions = []
+
+    def feed(self, chunk: str):
+        """Consumes a chunk; returns the instructions it completed."""
+        self._buffer += chunk
+        pieces = self._buffer.splitlines(keepends=True)
+        # The last piece is still being written unless it ends with a line break
+        if pieces and pieces[-1].splitlines()[0] == pieces[-1]:
+            self._buffer = pieces.pop()
+        else:
+            self._buffer = ""
+
+        completed = []
+        for piece in pieces:
+            self._process_line(piece, completed)
+        return completed
+
+    def close(self):
+        """Consumes the unterminated last line and returns the remaining instructions, if any."""
+        completed = []
+        if self._buffer:
+            self._process_line(self._buffer, completed)
+            self._buffer = ""
+        self._finish(completed)
+        return completed
+
+    @abstractmethod
+    def _process_line(self, line: str, completed: list):
+        """Parses one line of output, appending any instruction it completes to completed."""
+
+    def _finish(self, completed: list):
+        """Called by close() once all text is consumed."""
+
+class IncrementalModelOutputParser(IncrementalOutputParser):
+    """
+    Parses model output chunk by chunk as it streams in. feed() returns every (label, instruction)
+    completed by the new text - a block is complete once the next 'LineX:' header starts - and
+    close() returns the last one. Fed the whole text, it gives exactly parse_model_output_labeled's result.
+    Like the original parser, fields are not reset between blocks.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.current_line_num = None
+        self.line_text_accum = []
+        self.output_instr = None
+        self.keyword_str = None
+        self.operation_str = None
+
+    def _finish(self, completed: list):
+        # Save the last instruction collected
+        self._save_instruction(completed)
+
+    def _save_instruction(self, completed: list):
+        if self.current_line_num and self.line_text_accum and self.output_instr and self.keyword_str and self.operation_str:
+            line_text = " ".join(self.line_text_accum).strip()
+            instruction = (self.current_line_num, (line_text, self.output_instr, self.keyword_str, self.operation_str))
+            self.instructions.append(instruction)
+            completed.append(instruction)
+
+    def _process_line(self, line: str, completed: list):
         line = line.strip()
 
-        if line_pattern.match(line):
+        if LINE_PATTERN.match(line):
             # Save the previous instruction before starting new one
-            save_instruction()
-            current_line_num = line.split(":", 1)[0].strip()
-            line_text_accum = []
+            self._save_instruction(completed)
+            self.current_line_num = line.split(":", 1)[0].strip()
+            self.line_text_accum = []
 
             # Capture any text on same line after colon, if present
             parts = line.split(":", 1)
             if len(parts) > 1 and parts[1].strip():
-                line_text_accum.append(parts[1].strip())
+                self.line_text_accum.append(parts[1].strip())
 
-        elif output_pattern.match(line):
-            output_instr = line.split(":", 1)[1].strip()
+        elif OUTPUT_PATTERN.match(line):
+            self.output_instr = line.split(":", 1)[1].strip()
 
-        elif found_pattern.match(line):
-            keyword_str = line.split(":", 1)[1].strip()
+        elif FOUND_PATTERN.match(line):
+            self.keyword_str = line.split(":", 1)[1].strip()
 
-        elif inferred_pattern.match(line):
-            operation_str = line.split(":", 1)[1].strip()
+        elif INFERRED_PATTERN.match(line):
+            self.operation_str = line.split(":", 1)[1].strip()
 
         else:
             # If it is a non-empty line and we are inside a current Line block,
             # append it as part of instruction text (handles new line values)
-            if current_line_num and line:
-                line_text_accum.append(line)
+            if self.current_line_num and line:
+                self.line_text_accum.append(line)
+
+COMPACT_RECORD_PATTERN = re.compile(r"^(line\s*\d+)\s*:\s*(.*)$", re.IGNORECASE)
+INSTRUCTION_PATTERN = re.compile(r"^(\w+)\s*\(.*\)$")
+
+class IncrementalCompactOutputParser(IncrementalOutputParser):
+    """
+    Incremental parser for the compact protocol (model_ILCodeGen_compact_prompt.txt): one
+    'LineX: <keyword> | <instruction>' record per line, complete as soon as its line break arrives.
+    The model does not echo the input, so line_text is taken from line_texts and operation_str is
+    the instruction name. Records without a keyword are accepted if the rest is an instruction.
+    Yields the same (label, (line_text, output_instr, keyword_str, operation_str)) tuples as
+    IncrementalModelOutputParser.
+    """
+
+    def __init__(self, line_texts=None):
+        super().__init__()
+        self.line_texts = list(line_texts or [])
+
+    def _process_line(self, line: str, completed: list):
+        record = COMPACT_RECORD_PATTERN.match(line.strip())
+        if not record:
+            return
+        label = record.group(1).strip()
+        keyword_str, separator, output_instr = record.group(2).rpartition("|")
+        keyword_str, output_instr = keyword_str.strip(), output_instr.strip()
+        instruction_name = INSTRUCTION_PATTERN.match(output_instr)
+        if not output_instr or (not separator and not instruction_name):
+            return
 
-    # Save the last instruction collected
-    save_instruction()
+        number = line_label_number(label)
+        line_text = self.line_texts[number - 1] if number and number <= len(self.line_texts) else ""
+        operation_str = instruction_name.group(1).upper() if instruction_name else output_instr
+        instruction = (label, (line_text, output_instr, keyword_str, operation_str))
+        self.instructions.append(instruction)
+        completed.append(instruction)
 
-    return instructions
+def line_label_number(label: str):
+    """Returns the number in a 'LineX' label ('Line3' -> 3), or None."""
+    match = re.search(r"\d+", label or "")
+    return int(match.group(0)) if match else None
@@ -3,8 +3,28 @@
 import re
 from Validator_InstructionDetection import detect_instruction
 
+def validate_instruction(line_text, output_operation):
+    """
+    Checks one model output operation against the rule engine.
+    Returns (found_keywords, detected_instr, operand_count, match) where match is "Yes" or "No".
+    """
+    found_keywords, detected_instr, operand_count = detect_instruction(line_text)
+
+    match = "No"
+    match_instr = re.match(r"(\w+)\(([^()]*)\)", output_operation)
+    if match_instr:
+        model_instr = match_instr.group(1)
+        operands = [op.strip() for op in match_instr.group(2).split(",") if op.strip()]
+        model_operand_count = len(operands)
+
+        if detected_instr and model_instr.upper() == detected_instr.upper() and model_operand_count == operand_count:
+            match = "Yes"
+
+    return found_keywords, detected_instr, operand_count, match
+
 def process_instruction_pairs(instruction_pairs, question):
     ops = []
+    line_texts = []
     all_matches = []
     instruction_lines = []
     model_keywords_list = []
@@ -15,26 +35,16 @@ def process_instruction_pairs(instruction_pairs, question):
     num = 0
 
     for line_text, output_operation, keyword_str, inferred_operation in instruction_pairs:
-        found_keywords, detected_instr, operand_count = detect_instruction(line_text)
+        found_keywords, detected_instr, operand_count, match = validate_instruction(line_text, output_operation)
         num += 1
 
         print(f"Line{num}:------------------------------------>>>")
         print(f"|^-^| Validator - Found Keywords: {found_keywords}")
         print(f"|^-^| Validator - Instruction: {detected_instr}({operand_count})" if detected_instr else "|^-^| Validator - Instruction: None")
-
-        match = "No"
-        match_instr = re.match(r"(\w+)\(([^()]*)\)", output_operation)
-        if match_instr:
-            model_instr = match_instr.group(1)
-            operands = [op.strip() for op in match_instr.group(2).split(",") if op.strip()]
-            model_operand_count = len(operands)
-
-            if detected_instr and model_instr.upper() == detected_instr.upper() and model_operand_count == operand_count:
-                match = "Yes"
-
         print(f"|^-^| Validator - Match: {match}\n")
 
         ops.append(output_operation)
+        line_texts.append(line_text)
         all_matches.append(match)
         instruction_lines.append(output_operation)
         model_keywords_list.append(keyword_str)
@@ -45,6 +55,7 @@ def process_instruction_pairs(instruction_pairs, question):
 
     return {
         "ops": ops,
+        "line_texts": line_texts,
         "matches": all_matches,
         "instruction_lines": instruction_lines,
         "model_keywords_list": model_keywords_list,
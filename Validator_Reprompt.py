@@ -59,3 +59,24 @@ def generate_reprompt(question, model_outputs, detected_instrs, operand_counts,
     )
 
     return reprompt_text
+
+def generate_partial_reprompt(lines):
+    """
+    Generate a focused prompt that re-asks only the mismatched lines.
+
+    Parameters:
+        lines (List[tuple]): (line_number, line_text, detected_instr, operand_count, previous_output) per mismatched line.
+
+    Returns:
+        str: 'LineN: <text>' entries, each followed by the instruction the validator expects, in the
+             input format the IL system prompt already understands. Line numbers are kept so the
+             answers can be merged back.
+    """
+    sections = []
+    for line_number, line_text, detected_instr, operand_count, previous_output in lines:
+        sections.append(
+            f"Line{line_number}: {line_text}\n"
+            f"Expected Operation: {detected_instr} with {operand_count} operand{'s' if operand_count != 1 else ''} "
+            f"(not {previous_output})"
+        )
+    return "\n\n".join(sections)
@@ -1,18 +1,26 @@
-from flask import Flask, render_template, request, jsonify, send_file, Response
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context, g
 from werkzeug.utils import secure_filename
-import os, sys, time, logging, re
-from io import BytesIO
+import os, sys, time, logging, re, json, threading
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from model_IntentionAnalyzer import get_intention_response
-from model_UDTGen import extract_udt_tags
-from Chat_ProcessSingleInput import process_question
-from L5XGen_Rung import GenerateRung
+from model_IntentionAnalyzer import get_intention_response, classify_intention_rules, RULE_CONFIDENCE_THRESHOLD
+from model_UDTGen import extract_udt_tags, parse_udt_fields
+from model_Client import submit_async
+from model_WarmUp import start_warmup, get_readiness
+from Chat_ProcessSingleInput import process_question, process_question_async, stream_question
+from model_ILCodeGen import IL_PROTOCOLS
+from Validator_InstructionDetection import detect_instruction
+from L5XGen_Rung import iter_rung_l5x
+from L5XGen_Routine import AppendRungs
+from L5XGen_Writer import buffered
 from Attach_L5Xanalyzer import analyze_l5x_type
 from L5XOpt_UDT import optimize_and_regenerate_udt, extract_udt_definition
 from L5XGen_UDT import generate_udt_l5x_from_tags
-from Attach_ProcessExcel import process_excel_file
+from Attach_ProcessExcel import process_excel_file, DEFAULT_EXCEL_CONCURRENCY, DEFAULT_EXCEL_BATCH_SIZE
+from Metrics_Registry import REGISTRY, HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT, INTENT_REQUESTS, INTENT_LATENCY
 
 app = Flask(__name__)
 app.config.update({
@@ -26,6 +34,76 @@ known_udts = {}
 
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx', 'xlsx', 'l5x'}
 
+# Speculative chat: start generation in parallel with intent classification (opt-in)
+SPECULATIVE_CHAT = os.environ.get("LLM4L5X_SPECULATIVE_CHAT", "0") == "1"
+CODE_INTENTIONS = {"Create IL Code", "Create Rung"}
+speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")
+speculation_stats = {"started": 0, "hits": 0, "misses": 0, "skipped": 0}
+speculation_lock = threading.Lock()
+METRIC_INTENTS = {"Create IL Code", "Create Rung", "Create Routine", "Create UDT", "Create AOI", "Create L5X Program", "Unknown"}
+
+# Preload phi4/phi4-mini and prime their system prompts so the first request is not a cold start
+if os.environ.get("LLM4L5X_WARMUP", "1") == "1":
+    start_warmup()
+
+def _collect_speculation_metrics():
+    with speculation_lock:
+        stats = dict(speculation_stats)
+    return [("llm4l5x_speculation_total", "counter", "Speculative chat generations by outcome.",
+             [({"outcome": outcome}, count) for outcome, count in stats.items()])]
+
+REGISTRY.register_collector(_collect_speculation_metrics)
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.time()
+    g.metrics_endpoint = request.endpoint or "unknown"
+    HTTP_IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+
+@app.after_request
+def record_request_metrics(response):
+    # For streamed responses this is the time until the first byte
+    if "metrics_start" in g:
+        HTTP_LATENCY.observe(time.time() - g.metrics_start, endpoint=g.metrics_endpoint)
+        HTTP_REQUESTS.inc(endpoint=g.metrics_endpoint, method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if "metrics_start" in g:
+        HTTP_IN_FLIGHT.dec(endpoint=g.metrics_endpoint)
+
+def record_intent(endpoint, intention, start):
+    # Intents come from model output or the client; anything unexpected shares one label
+    intention = intention if intention in METRIC_INTENTS else "Other"
+    INTENT_REQUESTS.inc(endpoint=endpoint, intent=intention)
+    INTENT_LATENCY.observe(time.time() - start, endpoint=endpoint, intent=intention)
+
+def request_protocol(value):
+    """Returns the IL output protocol a request asked for, None for the server default; raises ValueError if unknown."""
+    if not value:
+        return None
+    protocol = str(value).strip().lower()
+    if protocol not in IL_PROTOCOLS:
+        raise ValueError(f"Unknown protocol '{value}'. Use one of: {', '.join(IL_PROTOCOLS)}.")
+    return protocol
+
+def request_flag(value, default: bool) -> bool:
+    """
+    Returns an on/off request option: JSON true/false, or "1"/"0" as for the LLM4L5X_* env flags
+    ("true"/"false" too). None means default; anything else raises ValueError.
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    flag = str(value).strip().lower()
+    if flag in ("1", "true"):
+        return True
+    if flag in ("0", "false"):
+        return False
+    raise ValueError(f"Invalid boolean value '{value}'. Use true/false or 1/0.")
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -40,7 +118,11 @@ def error_response(msg, status=400):
     return jsonify(create_response(msg)), status
 
 def handle_udt_generation(user_input):
-    tags = extract_udt_tags(user_input)
+    tags = parse_udt_fields(user_input)
+    if tags:
+        app.logger.info(f"UDT fields parsed locally ({len(tags['tags'])} fields), skipping model call")
+    else:
+        tags = extract_udt_tags(user_input)
     if not tags.get("tags"):
         return {"success": False, "error": "Could not extract UDT definitions. Specify fields like 'a BOOL called start'."}
     udt_name = tags.get("udt_name", "GeneratedUDT")
@@ -55,9 +137,8 @@ def handle_udt_generation(user_input):
         }
     return {"success": False, "error": f"Failed to generate UDT L5X: {res.get('error', 'Unknown error')}"}
 
-def process_code_generation_intention(user_input, intention_type):
-    result = process_question(user_input)
-    output = result.get("final_output", f"Failed to generate {intention_type}.")
+def code_generation_response(result, intention_type):
+    output = result.get("final_output") or f"Failed to generate {intention_type}."
     download = None
     if output.startswith("<?xml"):
         download = {'file_content': output,
@@ -65,34 +146,30 @@ def process_code_generation_intention(user_input, intention_type):
                     'content_type': 'application/xml'}
     return output, bool(output), download
 
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/favicon.ico')
-def favicon():
-    return app.send_static_file('favicon.ico')
+def process_code_generation_intention(user_input, intention_type, result=None, protocol=None):
+    if result is None:
+        result = process_question(user_input, protocol)
+    return code_generation_response(result, intention_type)
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    start = time.time()
-    data = request.get_json() or {}
-    user_msg = data.get('message', '').strip()
-    if not user_msg:
-        return error_response('No message received.', 400)
-    app.logger.info(f"[Chat] User: {user_msg}")
+def detect_intention(user_msg):
     intention_raw = get_intention_response(user_msg)
     app.logger.info(f"[Chat] Intention Raw: {intention_raw}")
     intention_match = re.search(r"Intent:\s*(.+)", intention_raw)
-    intention = intention_match.group(1).strip("`") if intention_match else "Unknown"
-
+    return intention_match.group(1).strip("`") if intention_match else "Unknown"
+
+def handle_chat_intention(user_msg, intention, speculative_result=None, protocol=None):
+    """
+    Runs the non-streaming handler for a classified chat intention.
+    speculative_result, if given, is the already computed process_question / UDT result for this intention.
+    protocol is the IL output protocol for code generation (None = server default).
+    Returns (response_text, is_code, download_info).
+    """
     response_text, is_code, download_info = "", False, None
-    requires_confirmation, confirmation_data = False, None
 
-    if intention in ["Create IL Code", "Create Rung"]:
-        response_text, is_code, download_info = process_code_generation_intention(user_msg, intention)
+    if intention in CODE_INTENTIONS:
+        response_text, is_code, download_info = process_code_generation_intention(user_msg, intention, speculative_result, protocol)
     elif intention == "Create UDT":
-        udt_result = handle_udt_generation(user_msg)
+        udt_result = speculative_result or handle_udt_generation(user_msg)
         if udt_result["success"]:
             response_text = udt_result["message"]
             download_info = {
@@ -111,8 +188,169 @@ def chat():
         }
         response_text = fallback.get(intention, f"Intention '{intention}' detected. Please clarify.")
 
+    return response_text, is_code, download_info
+
+def guess_intention(user_msg):
+    """
+    Cheap prior for speculation: the rule classifier's best guess, or IL code when the
+    message already reads like an instruction the validator recognizes.
+    """
+    intention, _ = classify_intention_rules(user_msg)
+    if intention:
+        return intention
+    _, detected_instr, _ = detect_instruction(user_msg)
+    return "Create IL Code" if detected_instr else None
+
+def start_speculation(user_msg, protocol=None):
+    """
+    Starts the generation the guessed intention would need. Returns (guess, future) or (None, None).
+    """
+    guess = guess_intention(user_msg)
+    if guess in CODE_INTENTIONS:
+        future = submit_async(process_question_async(user_msg, protocol))
+    elif guess == "Create UDT":
+        future = speculation_pool.submit(handle_udt_generation, user_msg)
+    else:
+        return None, None
+    with speculation_lock:
+        speculation_stats["started"] += 1
+    return guess, future
+
+def same_handler(guess, intention):
+    return guess == intention or (guess in CODE_INTENTIONS and intention in CODE_INTENTIONS)
+
+def speculative_chat(user_msg, protocol=None):
+    """
+    Runs intent classification and the speculatively started generation in parallel.
+    Keeps the speculative result when the classified intent needs the same handler, cancels it otherwise.
+    Returns (intention, speculative_result or None).
+    """
+    intention_rule, confidence = classify_intention_rules(user_msg)
+    if intention_rule and confidence >= RULE_CONFIDENCE_THRESHOLD:
+        # The rule fast path answers immediately; nothing to overlap with
+        with speculation_lock:
+            speculation_stats["skipped"] += 1
+        return detect_intention(user_msg), None
+
+    guess, future = start_speculation(user_msg, protocol)
+    intention = detect_intention(user_msg)
+    if future is None:
+        with speculation_lock:
+            speculation_stats["skipped"] += 1
+        return intention, None
+
+    if same_handler(guess, intention):
+        result = future.result()
+        outcome = "hits"
+    else:
+        future.cancel()
+        result = None
+        outcome = "misses"
+    with speculation_lock:
+        speculation_stats[outcome] += 1
+        stats = dict(speculation_stats)
+    app.logger.info(f"[Chat] Speculation guess={guess} intent={intention} -> {outcome[:-1]} | {stats}")
+    return intention, result
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/favicon.ico')
+def favicon():
+    return app.send_static_file('favicon.ico')
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    start = time.time()
+    data = request.get_json() or {}
+    user_msg = data.get('message', '').strip()
+    if not user_msg:
+        return error_response('No message received.', 400)
+    try:
+        protocol = request_protocol(data.get('protocol'))
+        speculative = request_flag(data.get('speculative'), SPECULATIVE_CHAT)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    app.logger.info(f"[Chat] User: {user_msg}")
+    if speculative:
+        intention, speculative_result = speculative_chat(user_msg, protocol)
+    else:
+        intention, speculative_result = detect_intention(user_msg), None
+
+    requires_confirmation, confirmation_data = False, None
+    response_text, is_code, download_info = handle_chat_intention(user_msg, intention, speculative_result, protocol)
+    record_intent("chat", intention, start)
+
     return jsonify(create_response(response_text, is_code, time.time() - start, download_info, requires_confirmation, confirmation_data))
 
+@app.route('/chat_stream', methods=['POST'])
+def chat_stream():
+    """
+    Server-Sent Events variant of /chat. Emits 'status' and 'intent' first, then for code generation
+    every model 'token' and every validated 'line' as it completes, and finally a 'final' event
+    carrying the same payload /chat returns.
+    """
+    start = time.time()
+    data = request.get_json() or {}
+    user_msg = data.get('message', '').strip()
+    if not user_msg:
+        return error_response('No message received.', 400)
+    try:
+        protocol = request_protocol(data.get('protocol'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+    app.logger.info(f"[ChatStream] User: {user_msg}")
+
+    def generate():
+        yield sse_event("status", {"stage": "intent"})
+        try:
+            intention = detect_intention(user_msg)
+            yield sse_event("intent", {"intent": intention})
+
+            if intention in ["Create IL Code", "Create Rung"]:
+                yield sse_event("status", {"stage": "generation"})
+                for event, payload in stream_question(user_msg, protocol):
+                    if event == "final":
+                        response_text, is_code, download_info = code_generation_response(payload, intention)
+                        record_intent("chat_stream", intention, start)
+                        yield sse_event("final", create_response(response_text, is_code, time.time() - start, download_info))
+                    else:
+                        yield sse_event(event, payload)
+            else:
+                response_text, is_code, download_info = handle_chat_intention(user_msg, intention, protocol=protocol)
+                record_intent("chat_stream", intention, start)
+                yield sse_event("final", create_response(response_text, is_code, time.time() - start, download_info))
+        except Exception as e:
+            app.logger.exception("Error in /chat_stream")
+            yield sse_event("final", create_response(f"Error: {e}", False, time.time() - start))
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once all models are loaded and primed, 503 before that."""
+    readiness = get_readiness()
+    return jsonify(readiness), (200 if readiness["ready"] else 503)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/speculation_stats', methods=['GET'])
+def get_speculation_stats():
+    with speculation_lock:
+        stats = dict(speculation_stats)
+    decided = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / decided, 4) if decided else 0.0
+    stats["enabled_by_default"] = SPECULATIVE_CHAT
+    return jsonify(stats)
+
 @app.route('/confirm_intention', methods=['POST'])
 def confirm_intention():
     start = time.time()
@@ -121,10 +359,14 @@ def confirm_intention():
     original_question = data.get('original_question', '').strip()
     if not intention:
         return error_response('No intention confirmed.', 400)
+    try:
+        protocol = request_protocol(data.get('protocol'))
+    except ValueError as e:
+        return error_response(str(e), 400)
 
     response_text, is_code, download_info = "", False, None
     if intention in ["Create IL Code", "Create Rung"]:
-        response_text, is_code, download_info = process_code_generation_intention(original_question, intention)
+        response_text, is_code, download_info = process_code_generation_intention(original_question, intention, protocol=protocol)
     elif intention == "Create UDT":
         udt_result = handle_udt_generation(original_question)
         if udt_result["success"]:
@@ -138,6 +380,7 @@ def confirm_intention():
             response_text = udt_result["error"]
     else:
         response_text = f"Intention '{intention}' confirmed. Please clarify further."
+    record_intent("confirm_intention", intention, start)
 
     return jsonify(create_response(response_text, is_code, time.time() - start, download_info))
 
@@ -155,6 +398,10 @@ def attach_file():
     ext = filename.rsplit('.', 1)[1].lower()
 
     if ext == 'xlsx':
+        try:
+            protocol = request_protocol(request.form.get('protocol'))
+        except ValueError as e:
+            return error_response(str(e), 400)
         try:
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             file.save(filepath)
@@ -163,7 +410,14 @@ def attach_file():
             log_path = os.path.join(app.config['UPLOAD_FOLDER'], f"Log_{filename}")
             output_path = os.path.join(app.config['UPLOAD_FOLDER'], f"Output_{filename.rsplit('.', 1)[0]}.L5X")
 
-            success = process_excel_file(filepath, mode=mode, log_file_path=log_path, output_l5x_path=output_path)
+            concurrency = request.form.get('concurrency', DEFAULT_EXCEL_CONCURRENCY, type=int)
+            batch_size = request.form.get('batch_size', DEFAULT_EXCEL_BATCH_SIZE, type=int)
+            # program/controller modes: one routine per sheet, or rows grouped by this column
+            group_column = request.form.get('group_column') or None
+
+            success = process_excel_file(filepath, mode=mode, log_file_path=log_path, output_l5x_path=output_path,
+                                         concurrency=concurrency, batch_size=batch_size, protocol=protocol,
+                                         group_column=group_column)
 
             if success and os.path.exists(output_path):
                 return send_file(
@@ -258,30 +512,54 @@ def generate_rung_from_saved_code():
         if not raw_il_code:
             return jsonify({'success': False, 'error': 'No code content provided to generate rung.'}), 400
 
-        rung_generation_result = GenerateRung(raw_il_code)
-
-        if rung_generation_result["success"]:
-            l5x_content_to_download = rung_generation_result["rung_text"]
-            filename = original_filename 
-            if not filename.lower().endswith('.l5x'):
-                filename += '.L5X'
+        # Tags are inferred before the first chunk, so input errors surface here rather than mid-download
+        chunks = buffered(iter_rung_l5x(raw_il_code))
+        try:
+            first_chunk = next(chunks, "")
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e) or 'Failed to generate rung L5X.'}), 500
 
-            buffer = BytesIO()
-            buffer.write(l5x_content_to_download.encode('utf-8'))
-            buffer.seek(0)
+        filename = original_filename
+        if not filename.lower().endswith('.l5x'):
+            filename += '.L5X'
 
-            return send_file(
-                buffer,
-                as_attachment=True,
-                download_name=filename,
-                mimetype='application/xml'
-            )
-        else:
-            return jsonify({'success': False, 'error': rung_generation_result.get('error', 'Failed to generate rung L5X.')}), 500
+        # Streamed as it is generated, so large rung sets are never held as one string
+        return Response(
+            stream_with_context(chain([first_chunk], chunks)),
+            mimetype='application/xml',
+            headers={'Content-Disposition': f'attachment; filename="{secure_filename(filename) or "generated_rung.L5X"}"'}
+        )
 
     except Exception as e:
         app.logger.exception("Error in /generate_rung_from_saved_code")
         return jsonify({'success': False, 'error': f'Internal server error during rung regeneration: {e}'}), 500
 
+@app.route('/append_rungs', methods=['POST'])
+def append_rungs():
+    try:
+        data = request.get_json() or {}
+        l5x_content = data.get('l5x_content')
+        raw_il_code = data.get('code_content')
+        filename = data.get('filename', f"appended_routine_{int(time.time())}.L5X")
+
+        if not l5x_content or not raw_il_code:
+            return jsonify({'success': False, 'error': 'Both an existing L5X and code content are required.'}), 400
+
+        append_result = AppendRungs(l5x_content, raw_il_code, routine_name=data.get('routine_name') or None)
+        if not append_result["success"]:
+            return jsonify({'success': False, 'error': append_result.get('error', 'Failed to append rungs.')}), 400
+
+        if not filename.lower().endswith('.l5x'):
+            filename += '.L5X'
+        return Response(
+            append_result["rung_text"],
+            mimetype='application/xml',
+            headers={'Content-Disposition': f'attachment; filename="{secure_filename(filename) or "appended_routine.L5X"}"'}
+        )
+
+    except Exception as e:
+        app.logger.exception("Error in /append_rungs")
+        return jsonify({'success': False, 'error': f'Internal server error while appending rungs: {e}'}), 500
+
 if __name__ == '__main__':
     app.run(debug=True, port=5003)
@@ -1,10 +1,6 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-
-model_path = r"E:\LLM\phi4mini\models--microsoft--Phi-4-mini-instruct\snapshots\model"
-tokenizer = AutoTokenizer.from_pretrained(model_path)
-model = AutoModelForCausalLM.from_pretrained(model_path)
-
-pipe = pipeline("text-generation", model=model, tokenizer=tokenizer)
+# The model itself lives in the shared inference worker (python model_HFWorker.py),
+# so importing this module no longer loads a private copy per process.
+from model_HFWorker import generate_text
 
 SYSTEM_MESSAGE = ""
 
@@ -20,13 +16,8 @@ def get_model_response(question: str) -> str:
             {"role": "user", "content": question}
         ]
 
-        # Apply chat template
-        prompt = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-
-        # Generate output
-        output = pipe(prompt, max_new_tokens=1000, do_sample=False, return_full_text=False)
-
-        return output[0]['generated_text'].strip()
+        # Chat template is applied by the worker; requests are batched with other callers
+        return generate_text(messages, max_new_tokens=1000)
 
     except Exception as e:
         print(f"❌ Error generating response: {e}")
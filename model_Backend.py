@@ -0,0 +1,259 @@
+# model_Backend.py
+
+import os
+import json
+import time
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+
+from model_ResponseCache import make_cache_key, normalize_text
+
+# === Configurable variables ===
+# openai       - Ollama or any OpenAI-compatible server (model_Client.BASE_URL)
+# transformers - local model served by model_HFWorker
+# replay       - recorded responses from REPLAY_PATH, no model server needed
+# record       - openai backend, every response appended to REPLAY_PATH
+BACKEND_NAME = os.environ.get("LLM4L5X_BACKEND", "openai").lower()
+REPLAY_PATH = os.environ.get("LLM4L5X_REPLAY_PATH", "model_recordings.jsonl")
+REPLAY_LATENCY_MS = float(os.environ.get("LLM4L5X_REPLAY_LATENCY_MS", "0"))         # fixed delay per call
+REPLAY_MS_PER_TOKEN = float(os.environ.get("LLM4L5X_REPLAY_MS_PER_TOKEN", "0"))     # added per ~4 characters of output
+REPLAY_ON_MISS = os.environ.get("LLM4L5X_REPLAY_ON_MISS", "error")                  # error | empty
+
+CHARS_PER_TOKEN = 4
+
+
+class ModelBackend(ABC):
+    """
+    Performs one raw chat request. Caching, concurrency limits, retries and counters
+    stay in model_Client, so every backend gets them for free.
+    """
+    name = "base"
+
+    @abstractmethod
+    def complete(self, model: str, messages: list, temperature: float, max_tokens: int):
+        """
+        Returns (content, finish_reason, usage); usage is {"prompt_tokens", "completion_tokens"}
+        or None when the backend cannot tell.
+        """
+
+    async def acomplete(self, model: str, messages: list, temperature: float, max_tokens: int):
+        return await asyncio.to_thread(self.complete, model, messages, temperature, max_tokens)
+
+    def stream(self, model: str, messages: list, temperature: float, max_tokens: int):
+        """Yields (text_delta, finish_reason, usage) tuples. Default: the whole answer as one chunk."""
+        yield self.complete(model, messages, temperature, max_tokens)
+
+
+def usage_dict(usage):
+    """Converts an OpenAI usage object to a plain dict (None if the server sent none)."""
+    if usage is None:
+        return None
+    return {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0}
+
+
+def estimate_usage(messages: list, content: str) -> dict:
+    """Rough token counts for backends that do not report them."""
+    prompt_chars = sum(len(m["content"]) for m in messages)
+    return {"prompt_tokens": prompt_chars // CHARS_PER_TOKEN, "completion_tokens": len(content) // CHARS_PER_TOKEN}
+
+
+class OpenAIBackend(ModelBackend):
+    """Ollama / OpenAI-compatible server through model_Client's pooled clients."""
+    name = "openai"
+
+    def complete(self, model, messages, temperature, max_tokens):
+        from model_Client import get_client
+        response = get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content, response.choices[0].finish_reason, usage_dict(response.usage)
+
+    async def acomplete(self, model, messages, temperature, max_tokens):
+        from model_Client import get_async_client
+        response = await get_async_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content, response.choices[0].finish_reason, usage_dict(response.usage)
+
+    def stream(self, model, messages, temperature, max_tokens):
+        from model_Client import get_client
+        stream = get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        try:
+            for chunk in stream:
+                usage = usage_dict(getattr(chunk, "usage", None))
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or "", chunk.choices[0].finish_reason, usage
+                elif usage:
+                    yield "", None, usage
+        finally:
+            stream.close()
+
+
+class TransformersBackend(ModelBackend):
+    """Local transformers model owned by the model_HFWorker process; 'model' is ignored."""
+    name = "transformers"
+
+    def complete(self, model, messages, temperature, max_tokens):
+        from model_HFWorker import generate_text
+        return generate_text(messages, max_new_tokens=max_tokens), None, None
+
+
+def replay_key(model: str, messages: list) -> str:
+    """Recordings are matched on model, system prompt hash and normalized user text, not on sampling parameters."""
+    return make_cache_key(model, messages)
+
+
+class ReplayBackend(ModelBackend):
+    """
+    Serves recorded responses with configurable synthetic latency, so the non-LLM parts of the
+    pipeline can be benchmarked and load-tested without a model server.
+    """
+    name = "replay"
+
+    def __init__(self, path: str = REPLAY_PATH, latency_ms: float = REPLAY_LATENCY_MS,
+                 ms_per_token: float = REPLAY_MS_PER_TOKEN, on_miss: str = REPLAY_ON_MISS):
+        self.path = path
+        self.latency_ms = latency_ms
+        self.ms_per_token = ms_per_token
+        self.on_miss = on_miss
+        self.recordings = {}
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def load(self, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.add(record["key"], record["content"], record.get("finish_reason", "stop"), record.get("usage"))
+
+    def add(self, key: str, content: str, finish_reason: str = "stop", usage: dict = None):
+        self.recordings[key] = (content, finish_reason, usage)
+
+    def add_response(self, model: str, messages: list, content: str, finish_reason: str = "stop", usage: dict = None):
+        """Registers the response for a request without going through a recording file."""
+        self.add(replay_key(model, messages), content, finish_reason, usage)
+
+    def _lookup(self, model, messages):
+        record = self.recordings.get(replay_key(model, messages))
+        with self._lock:
+            self.stats["hits" if record else "misses"] += 1
+        if record:
+            content, finish_reason, usage = record
+            return content, finish_reason, usage or estimate_usage(messages, content)
+        if self.on_miss == "empty":
+            return "", "stop", estimate_usage(messages, "")
+        user_text = " | ".join(normalize_text(m["content"]) for m in messages if m["role"] != "system")
+        raise KeyError(f"No recorded '{model}' response for: {user_text[:120]}")
+
+    def _delay(self, content: str) -> float:
+        return (self.latency_ms + self.ms_per_token * len(content) / CHARS_PER_TOKEN) / 1000.0
+
+    def complete(self, model, messages, temperature, max_tokens):
+        content, finish_reason, usage = self._lookup(model, messages)
+        time.sleep(self._delay(content))
+        return content, finish_reason, usage
+
+    async def acomplete(self, model, messages, temperature, max_tokens):
+        content, finish_reason, usage = self._lookup(model, messages)
+        await asyncio.sleep(self._delay(content))
+        return content, finish_reason, usage
+
+    def stream(self, model, messages, temperature, max_tokens):
+        content, finish_reason, usage = self._lookup(model, messages)
+        time.sleep(self.latency_ms / 1000.0)
+        step = CHARS_PER_TOKEN
+        for i in range(0, len(content), step):
+            time.sleep(self.ms_per_token / 1000.0)
+            last = i + step >= len(content)
+            yield content[i:i + step], (finish_reason if last else None), (usage if last else None)
+
+
+class RecordingBackend(ModelBackend):
+    """Wraps another backend and appends every response to a replay file."""
+    name = "record"
+
+    def __init__(self, inner: ModelBackend, path: str = REPLAY_PATH):
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _append(self, model, messages, content, finish_reason, usage):
+        record = {
+            "key": replay_key(model, messages),
+            "model": model,
+            "user": " | ".join(normalize_text(m["content"]) for m in messages if m["role"] != "system"),
+            "content": content,
+            "finish_reason": finish_reason or "stop",
+            "usage": usage
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def complete(self, model, messages, temperature, max_tokens):
+        content, finish_reason, usage = self.inner.complete(model, messages, temperature, max_tokens)
+        self._append(model, messages, content, finish_reason, usage)
+        return content, finish_reason, usage
+
+    async def acomplete(self, model, messages, temperature, max_tokens):
+        content, finish_reason, usage = await self.inner.acomplete(model, messages, temperature, max_tokens)
+        self._append(model, messages, content, finish_reason, usage)
+        return content, finish_reason, usage
+
+    def stream(self, model, messages, temperature, max_tokens):
+        parts, last_reason, last_usage = [], None, None
+        for delta, finish_reason, usage in self.inner.stream(model, messages, temperature, max_tokens):
+            parts.append(delta)
+            last_reason = finish_reason or last_reason
+            last_usage = usage or last_usage
+            yield delta, finish_reason, usage
+        self._append(model, messages, "".join(parts), last_reason, last_usage)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name: str = BACKEND_NAME) -> ModelBackend:
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "transformers":
+        return TransformersBackend()
+    if name == "replay":
+        return ReplayBackend()
+    if name == "record":
+        return RecordingBackend(OpenAIBackend())
+    raise ValueError(f"Unknown model backend '{name}'. Use openai, transformers, replay or record.")
+
+
+def get_backend() -> ModelBackend:
+    """Returns the configured backend (LLM4L5X_BACKEND)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend: ModelBackend):
+    """Replaces the active backend, e.g. with a ReplayBackend for benchmarks."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
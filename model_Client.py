@@ -0,0 +1,426 @@
+# model_Client.py
+
+import os
+import time
+import asyncio
+import itertools
+import threading
+import weakref
+from collections import deque
+
+import httpx
+import openai
+
+from model_ResponseCache import RESPONSE_CACHE, make_cache_key
+from model_Backend import get_backend
+from Metrics_Registry import REGISTRY, MODEL_LATENCY, MODEL_TOKENS
+
+# === Configurable variables ===
+BASE_URL = os.environ.get("LLM4L5X_MODEL_URL", "http://localhost:11434/v1")
+API_KEY = os.environ.get("LLM4L5X_API_KEY", "nokeyneeded")
+
+CONNECT_TIMEOUT = float(os.environ.get("LLM4L5X_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("LLM4L5X_READ_TIMEOUT", "120"))
+QUEUE_TIMEOUT = float(os.environ.get("LLM4L5X_QUEUE_TIMEOUT", "300"))
+
+MAX_RETRIES = int(os.environ.get("LLM4L5X_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5   # seconds, doubled on every retry
+BACKOFF_MAX = 8.0
+
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 60.0
+
+# Max requests in flight per model, as "model=limit,..."; anything beyond waits for a free slot
+MODEL_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, _, limit in (entry.partition("=") for entry in os.environ.get("LLM4L5X_MODEL_CONCURRENCY", "phi4=2,phi4-mini=4").split(","))
+    if name.strip()
+}
+DEFAULT_CONCURRENCY = int(os.environ.get("LLM4L5X_DEFAULT_CONCURRENCY", "2"))
+
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,   # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError
+)
+# A read timeout means the server is already too slow; retrying would only add load
+NON_RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+)
+
+_client = None
+_client_lock = threading.Lock()
+_semaphores = {}
+_semaphore_lock = threading.Lock()
+
+# Async clients are bound to the event loop that created them
+_async_clients = weakref.WeakKeyDictionary()
+_background_loop = None
+_background_lock = threading.Lock()
+
+# Per-model counters: calls, errors, retries, truncated, in_flight, total_latency
+CLIENT_STATS = {}
+_stats_lock = threading.Lock()
+
+
+def get_client() -> openai.OpenAI:
+    """
+    Returns the process-wide OpenAI-compatible client.
+    The underlying httpx pool keeps connections to the model server alive between calls.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                    limits=httpx.Limits(
+                        max_connections=MAX_CONNECTIONS,
+                        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=KEEPALIVE_EXPIRY
+                    )
+                )
+                # Retries are handled here (see chat_completion), not by the SDK
+                _client = openai.OpenAI(
+                    base_url=BASE_URL,
+                    api_key=API_KEY,
+                    http_client=http_client,
+                    max_retries=0
+                )
+    return _client
+
+
+class _ModelSlots:
+    """
+    Per-model request slots shared by threads and event loops, so sync, streaming and async calls
+    together never exceed MODEL_CONCURRENCY. Waiters are served first come, first served; a released
+    slot is handed straight to the next waiter, and an async waiter never blocks its loop.
+    """
+
+    def __init__(self, slots: int):
+        self._lock = threading.Lock()
+        self._free = slots
+        self._waiters = deque()   # threading.Event for threads, (loop, future) for coroutines
+
+    def acquire(self, timeout: float) -> bool:
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return True
+            event = threading.Event()
+            self._waiters.append(event)
+        if event.wait(timeout):
+            return True
+        with self._lock:
+            # The slot may have been handed over right as the wait ran out
+            if event.is_set():
+                return True
+            self._waiters.remove(event)
+            return False
+
+    async def acquire_async(self, timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return True
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[1]), timeout=timeout)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                handed_over = waiter not in self._waiters
+                if not handed_over:
+                    self._waiters.remove(waiter)
+            if handed_over:
+                self.release()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self._free += 1
+                return
+            waiter = self._waiters.popleft()
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+                return
+        loop, future = waiter
+        try:
+            loop.call_soon_threadsafe(_resolve, future)
+        except RuntimeError:
+            # The waiter's loop is closed; pass the slot on
+            self.release()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+def _get_semaphore(model: str) -> _ModelSlots:
+    with _semaphore_lock:
+        if model not in _semaphores:
+            _semaphores[model] = _ModelSlots(MODEL_CONCURRENCY.get(model, DEFAULT_CONCURRENCY))
+        return _semaphores[model]
+
+
+def _record(model: str, **deltas):
+    with _stats_lock:
+        stats = CLIENT_STATS.setdefault(model, {"calls": 0, "errors": 0, "retries": 0, "truncated": 0, "in_flight": 0, "total_latency": 0.0})
+        for key, value in deltas.items():
+            stats[key] += value
+
+
+def _check_truncation(model: str, finish_reason, max_tokens: int):
+    """Logs and counts responses cut off by the max_tokens budget, so budgets can be tuned."""
+    if finish_reason == "length":
+        _record(model, truncated=1)
+        print(f"[model_Client] {model} response truncated at max_tokens={max_tokens}")
+
+
+def _record_usage(model: str, usage):
+    if usage:
+        MODEL_TOKENS.inc(usage["prompt_tokens"], model=model, kind="prompt")
+        MODEL_TOKENS.inc(usage["completion_tokens"], model=model, kind="completion")
+
+
+def _collect_client_metrics():
+    """Exposes CLIENT_STATS on /metrics."""
+    stats = get_client_stats()
+    families = [
+        ("llm4l5x_model_requests_total", "counter", "Model calls started.", "calls"),
+        ("llm4l5x_model_errors_total", "counter", "Model calls that failed after all retries.", "errors"),
+        ("llm4l5x_model_retries_total", "counter", "Retried model call attempts.", "retries"),
+        ("llm4l5x_model_truncated_total", "counter", "Responses cut off by max_tokens.", "truncated"),
+        ("llm4l5x_model_requests_in_flight", "gauge", "Model calls currently running.", "in_flight"),
+    ]
+    return [(name, kind, doc, [({"model": model}, values[key]) for model, values in stats.items()])
+            for name, kind, doc, key in families]
+
+
+REGISTRY.register_collector(_collect_client_metrics)
+
+
+def get_client_stats() -> dict:
+    """Returns a snapshot of the per-model call counters."""
+    with _stats_lock:
+        return {model: dict(stats) for model, stats in CLIENT_STATS.items()}
+
+
+def chat_completion(model: str, messages: list, temperature: float, max_tokens: int, use_cache: bool = False) -> str:
+    """
+    Sends one chat completion request through the configured backend (see model_Backend).
+    Waits for a free per-model slot, retries transient failures with exponential backoff
+    and returns the stripped message content. Raises on final failure.
+    With use_cache=True, identical requests are answered from RESPONSE_CACHE.
+    """
+    cache_key = None
+    if use_cache and RESPONSE_CACHE is not None:
+        cache_key = make_cache_key(model, messages, temperature=temperature, max_tokens=max_tokens)
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+    content = _create_completion(model, messages, temperature, max_tokens)
+    if cache_key is not None and content:
+        RESPONSE_CACHE.set(cache_key, content)
+    return content
+
+
+def _create_completion(model: str, messages: list, temperature: float, max_tokens: int) -> str:
+    semaphore = _get_semaphore(model)
+    if not semaphore.acquire(timeout=QUEUE_TIMEOUT):
+        _record(model, errors=1)
+        raise TimeoutError(f"Timed out waiting for a free '{model}' slot after {QUEUE_TIMEOUT}s")
+
+    _record(model, calls=1, in_flight=1)
+    start_time = time.time()
+    try:
+        attempt = 0
+        while True:
+            try:
+                content, finish_reason, usage = get_backend().complete(model, messages, temperature, max_tokens)
+                _check_truncation(model, finish_reason, max_tokens)
+                _record_usage(model, usage)
+                return (content or "").strip()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= MAX_RETRIES or isinstance(e, NON_RETRYABLE_ERRORS):
+                    raise
+                delay = min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX)
+                attempt += 1
+                _record(model, retries=1)
+                print(f"[model_Client] {model} call failed ({e.__class__.__name__}), retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+                time.sleep(delay)
+    except Exception:
+        _record(model, errors=1)
+        raise
+    finally:
+        elapsed = time.time() - start_time
+        _record(model, in_flight=-1, total_latency=elapsed)
+        MODEL_LATENCY.observe(elapsed, model=model, mode="sync")
+        semaphore.release()
+
+
+def stream_chat_completion(model: str, messages: list, temperature: float, max_tokens: int):
+    """
+    Streaming variant of chat_completion: yields content deltas as the model produces them.
+    Transient failures are retried only until the first token arrives.
+    Closing the generator closes the HTTP stream, which stops generation on the server.
+    """
+    semaphore = _get_semaphore(model)
+    if not semaphore.acquire(timeout=QUEUE_TIMEOUT):
+        _record(model, errors=1)
+        raise TimeoutError(f"Timed out waiting for a free '{model}' slot after {QUEUE_TIMEOUT}s")
+
+    _record(model, calls=1, in_flight=1)
+    start_time = time.time()
+    stream = None
+    try:
+        attempt = 0
+        while True:
+            try:
+                stream = get_backend().stream(model, messages, temperature, max_tokens)
+                first = next(stream, None)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt >= MAX_RETRIES or isinstance(e, NON_RETRYABLE_ERRORS):
+                    raise
+                delay = min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX)
+                attempt += 1
+                _record(model, retries=1)
+                print(f"[model_Client] {model} stream failed ({e.__class__.__name__}), retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+                time.sleep(delay)
+
+        if first is None:
+            return
+        for delta, finish_reason, usage in itertools.chain([first], stream):
+            if delta:
+                yield delta
+            if finish_reason:
+                _check_truncation(model, finish_reason, max_tokens)
+            _record_usage(model, usage)
+    except Exception:
+        _record(model, errors=1)
+        raise
+    finally:
+        if stream is not None:
+            stream.close()
+        elapsed = time.time() - start_time
+        _record(model, in_flight=-1, total_latency=elapsed)
+        MODEL_LATENCY.observe(elapsed, model=model, mode="stream")
+        semaphore.release()
+
+
+# === Async API ===
+
+def get_async_client() -> openai.AsyncOpenAI:
+    """
+    Returns the AsyncOpenAI client for the running event loop, creating its pool on first use.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            )
+        )
+        client = openai.AsyncOpenAI(
+            base_url=BASE_URL,
+            api_key=API_KEY,
+            http_client=http_client,
+            max_retries=0
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def achat_completion(model: str, messages: list, temperature: float, max_tokens: int, use_cache: bool = False) -> str:
+    """
+    Async counterpart of chat_completion with the same caching, timeouts and retries. It shares
+    chat_completion's per-model slots, so sync and async calls together stay within MODEL_CONCURRENCY.
+    """
+    cache_key = None
+    if use_cache and RESPONSE_CACHE is not None:
+        cache_key = make_cache_key(model, messages, temperature=temperature, max_tokens=max_tokens)
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+    content = await _acreate_completion(model, messages, temperature, max_tokens)
+    if cache_key is not None and content:
+        RESPONSE_CACHE.set(cache_key, content)
+    return content
+
+
+async def _acreate_completion(model: str, messages: list, temperature: float, max_tokens: int) -> str:
+    semaphore = _get_semaphore(model)
+    if not await semaphore.acquire_async(QUEUE_TIMEOUT):
+        _record(model, errors=1)
+        raise TimeoutError(f"Timed out waiting for a free '{model}' slot after {QUEUE_TIMEOUT}s")
+
+    _record(model, calls=1, in_flight=1)
+    start_time = time.time()
+    try:
+        attempt = 0
+        while True:
+            try:
+                content, finish_reason, usage = await get_backend().acomplete(model, messages, temperature, max_tokens)
+                _check_truncation(model, finish_reason, max_tokens)
+                _record_usage(model, usage)
+                return (content or "").strip()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= MAX_RETRIES or isinstance(e, NON_RETRYABLE_ERRORS):
+                    raise
+                delay = min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX)
+                attempt += 1
+                _record(model, retries=1)
+                print(f"[model_Client] {model} call failed ({e.__class__.__name__}), retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+    except Exception:
+        _record(model, errors=1)
+        raise
+    finally:
+        elapsed = time.time() - start_time
+        _record(model, in_flight=-1, total_latency=elapsed)
+        MODEL_LATENCY.observe(elapsed, model=model, mode="async")
+        semaphore.release()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+    if _background_loop is None:
+        with _background_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="model_Client-loop", daemon=True).start()
+                _background_loop = loop
+    return _background_loop
+
+
+def submit_async(coro):
+    """
+    Schedules a coroutine on the shared background event loop without waiting.
+    Returns a concurrent.futures.Future; cancelling it cancels the coroutine (and its HTTP request).
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop())
+
+
+def run_sync(coro):
+    """
+    Runs a coroutine on the shared background event loop and blocks until it finishes.
+    Lets synchronous callers (Flask views, Excel processing) reuse the async pipeline
+    and its connection pool. Must not be called from the background loop itself.
+    Every coroutine shares this one loop thread, so CPU-bound work inside it belongs in
+    loop.run_in_executor (see Chat_ProcessSingleInput.run_off_loop).
+    """
+    return submit_async(coro).result()
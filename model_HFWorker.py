@@ -0,0 +1,206 @@
+# model_HFWorker.py
+#
+# Single long-lived inference worker for the local HuggingFace (transformers) backend.
+# One process owns the model; every Flask worker talks to it over a local authenticated socket.
+# Concurrent requests are grouped into padded batches (up to MAX_BATCH_SIZE, waiting at most
+# MAX_WAIT_MS for a batch to fill), which raises tokens/sec on CPU-only hosts.
+#
+# The socket unpickles what it receives, so worker and clients share a secret key:
+#   set LLM4L5X_HF_WORKER_AUTHKEY to a long random value (e.g. python -c "import secrets; print(secrets.token_hex(32))")
+#   in the environment of both the worker and the Flask app. Neither side starts without it.
+#
+# Start the worker:   python model_HFWorker.py
+# Use it:             from model_HFWorker import generate_text
+
+import os
+import time
+import queue
+import threading
+from multiprocessing.managers import BaseManager
+
+# === Configurable variables ===
+MODEL_PATH = os.environ.get("LLM4L5X_HF_MODEL_PATH", r"E:\LLM\phi4mini\models--microsoft--Phi-4-mini-instruct\snapshots\model")
+WORKER_HOST = os.environ.get("LLM4L5X_HF_WORKER_HOST", "127.0.0.1")
+WORKER_PORT = int(os.environ.get("LLM4L5X_HF_WORKER_PORT", "50555"))
+WORKER_AUTHKEY = os.environ.get("LLM4L5X_HF_WORKER_AUTHKEY", "")   # required, no default
+
+MAX_BATCH_SIZE = int(os.environ.get("LLM4L5X_HF_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.environ.get("LLM4L5X_HF_MAX_WAIT_MS", "25"))
+REQUEST_TIMEOUT = float(os.environ.get("LLM4L5X_HF_REQUEST_TIMEOUT", "600"))
+
+
+class _PendingRequest:
+    __slots__ = ("prompt", "max_new_tokens", "done", "result", "error")
+
+    def __init__(self, prompt: str, max_new_tokens: int):
+        self.prompt = prompt
+        self.max_new_tokens = max_new_tokens
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceWorker:
+    """
+    Owns the tokenizer and model. generate() is called from the manager's per-connection
+    threads; a single batcher thread drains the queue and runs the model.
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.tokenizer.padding_side = "left"   # decoder-only models generate after the prompt
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(model_path)
+        self.model.eval()
+
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "generated_tokens": 0, "busy_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+        threading.Thread(target=self._batch_loop, name="model_HFWorker-batcher", daemon=True).start()
+
+    def generate(self, prompt_or_messages, max_new_tokens: int = 1000) -> str:
+        """
+        Queues one request and blocks until its batch has been generated.
+        Accepts either a raw prompt string or chat messages (the chat template is applied here).
+        """
+        if isinstance(prompt_or_messages, list):
+            prompt = self.tokenizer.apply_chat_template(prompt_or_messages, tokenize=False, add_generation_prompt=True)
+        else:
+            prompt = prompt_or_messages
+
+        request = _PendingRequest(prompt, max_new_tokens)
+        self.queue.put(request)
+        if not request.done.wait(REQUEST_TIMEOUT):
+            raise TimeoutError(f"Inference request timed out after {REQUEST_TIMEOUT}s")
+        if request.error is not None:
+            raise RuntimeError(request.error)
+        return request.result
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["queued"] = self.queue.qsize()
+        stats["avg_batch_size"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["tokens_per_second"] = round(stats["generated_tokens"] / stats["busy_seconds"], 2) if stats["busy_seconds"] else 0.0
+        return stats
+
+    def _collect_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._collect_batch()
+            start_time = time.time()
+            try:
+                generated = self._run_batch(batch)
+            except Exception as e:
+                print(f"❌ Batch of {len(batch)} failed: {e}")
+                for request in batch:
+                    request.error = str(e)
+                    request.done.set()
+                continue
+
+            with self._stats_lock:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["generated_tokens"] += generated
+                self.stats["busy_seconds"] += time.time() - start_time
+            for request in batch:
+                request.done.set()
+
+    def _run_batch(self, batch) -> int:
+        inputs = self.tokenizer([r.prompt for r in batch], return_tensors="pt", padding=True)
+        max_new_tokens = max(r.max_new_tokens for r in batch)
+
+        with self.torch.no_grad():
+            output_ids = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+
+        prompt_length = inputs["input_ids"].shape[1]
+        generated = 0
+        for request, ids in zip(batch, output_ids):
+            # Each request only gets the tokens it asked for
+            new_ids = ids[prompt_length:prompt_length + request.max_new_tokens]
+            request.result = self.tokenizer.decode(new_ids, skip_special_tokens=True).strip()
+            generated += int((new_ids != self.tokenizer.pad_token_id).sum())
+        return generated
+
+
+class HFWorkerManager(BaseManager):
+    pass
+
+
+_worker = None
+_client_proxy = None
+_client_lock = threading.Lock()
+
+
+def get_authkey() -> bytes:
+    """The shared worker key; refuses to run without one, since anyone with the key can run code in the worker."""
+    if not WORKER_AUTHKEY:
+        raise RuntimeError("❌ LLM4L5X_HF_WORKER_AUTHKEY is not set. Set it to the same random secret for the "
+                           "inference worker and the app before starting either.")
+    return WORKER_AUTHKEY.encode("utf-8")
+
+
+def _get_worker():
+    return _worker
+
+
+def serve():
+    """Loads the model once and serves it until the process is stopped."""
+    global _worker
+    authkey = get_authkey()
+    print(f"Loading model from {MODEL_PATH} ...")
+    _worker = InferenceWorker()
+    HFWorkerManager.register("get_worker", callable=_get_worker, exposed=("generate", "get_stats"))
+    manager = HFWorkerManager(address=(WORKER_HOST, WORKER_PORT), authkey=authkey)
+    server = manager.get_server()
+    print(f"✅ Inference worker listening on {WORKER_HOST}:{WORKER_PORT} (batch <= {MAX_BATCH_SIZE}, wait <= {MAX_WAIT_MS}ms)")
+    server.serve_forever()
+
+
+def get_worker_proxy():
+    """
+    Connects to the running inference worker. The proxy is safe to share between threads
+    (each thread gets its own connection).
+    """
+    global _client_proxy
+    if _client_proxy is None:
+        with _client_lock:
+            if _client_proxy is None:
+                HFWorkerManager.register("get_worker")
+                manager = HFWorkerManager(address=(WORKER_HOST, WORKER_PORT), authkey=get_authkey())
+                manager.connect()
+                _client_proxy = manager.get_worker()
+    return _client_proxy
+
+
+def generate_text(prompt_or_messages, max_new_tokens: int = 1000) -> str:
+    """Generates a completion on the shared inference worker."""
+    return get_worker_proxy().generate(prompt_or_messages, max_new_tokens)
+
+
+if __name__ == "__main__":
+    serve()
@@ -1,29 +1,112 @@
 # Model_ILCodeGen.py
 
-import openai
+import os
+import re
 
-client = openai.OpenAI(
-    base_url="http://localhost:11434/v1",
-    api_key="nokeyneeded"
-)
+from model_Client import chat_completion, achat_completion, stream_chat_completion
 
-MODEL_NAME = "phi4-mini"
+MODEL_NAME = os.environ.get("LLM4L5X_IL_MODEL", "phi4-mini")
 
 with open("model_ILCodeGen_system_prompt.txt", "r", encoding="utf-8") as f:
     SYSTEM_MESSAGE = f.read().strip()
 
-def get_model_response(user_question: str) -> str:
+# Compact protocol: one 'LineX: <keyword> | <instruction>' record per line, the input is not echoed
+with open("model_ILCodeGen_compact_prompt.txt", "r", encoding="utf-8") as f:
+    COMPACT_SYSTEM_MESSAGE = f.read().strip()
+
+SYSTEM_MESSAGES = {"full": SYSTEM_MESSAGE, "compact": COMPACT_SYSTEM_MESSAGE}
+IL_PROTOCOLS = tuple(SYSTEM_MESSAGES)
+IL_PROTOCOL = os.environ.get("LLM4L5X_IL_PROTOCOL", "full").lower()   # default when a request does not choose one
+
+# Token budget: every output block echoes its line and adds three short fields
+IL_TOKENS_BASE = 32
+IL_TOKENS_PER_LINE = 64
+IL_MAX_TOKENS = 1000
+# A compact record is the keyword and the instruction only
+COMPACT_TOKENS_PER_LINE = 24
+
+# What get_model_response* return instead of raising when the model call fails
+IL_ERROR_MESSAGE = "An error occurred while generating IL code."
+
+# Splitting unlabeled questions into lines; a '.' only ends a sentence when followed by
+# whitespace, so Tmr1.DN and 2.5 stay intact
+LINE_LABEL_PATTERN = re.compile(r"^\s*line\s*\d+\s*:", re.IGNORECASE | re.MULTILINE)
+CLAUSE_PATTERN = re.compile(r"[;\n]|\.(?=\s|$)|\b(?:and\s+)?then\b", re.IGNORECASE)
+# Clauses joined by 'or' are answered as separate blocks of the same line (see the IL prompts)
+OR_PATTERN = re.compile(r"\bor\b", re.IGNORECASE)
+
+def resolve_protocol(protocol=None) -> str:
+    """Returns the output protocol to use ('full' or 'compact'); None means IL_PROTOCOL."""
+    protocol = (protocol or IL_PROTOCOL).lower()
+    if protocol not in SYSTEM_MESSAGES:
+        raise ValueError(f"Unknown IL protocol '{protocol}', expected one of {', '.join(IL_PROTOCOLS)}")
+    return protocol
+
+def split_question_lines(question: str) -> list:
+    """
+    Returns the question's lines: the text of each 'LineX:' entry if it is labeled,
+    otherwise its sentences and 'then' clauses.
+    """
+    if LINE_LABEL_PATTERN.search(question):
+        segments = LINE_LABEL_PATTERN.split(question)[1:]
+    else:
+        segments = CLAUSE_PATTERN.split(question)
+    lines = [" ".join(segment.split()).strip(" ,") for segment in segments]
+    return [line for line in lines if line]
+
+def il_messages(user_question: str, protocol=None) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGES[resolve_protocol(protocol)]},
+        {"role": "user", "content": user_question}
+    ]
+
+def il_token_estimate(user_question: str, protocol=None) -> int:
+    """
+    Output tokens the request needs: one block per line (split_question_lines) and per extra
+    'or' clause, plus the echoed input text. The compact protocol does not echo the input.
+    """
+    line_count = sum(1 + len(OR_PATTERN.findall(line)) for line in split_question_lines(user_question))
+    if resolve_protocol(protocol) == "compact":
+        return IL_TOKENS_BASE + COMPACT_TOKENS_PER_LINE * max(1, line_count)
+    return IL_TOKENS_BASE + IL_TOKENS_PER_LINE * max(1, line_count) + len(user_question) // 3
+
+def il_token_budget(user_question: str, protocol=None) -> int:
+    """max_tokens for the request: il_token_estimate, capped at IL_MAX_TOKENS."""
+    return min(il_token_estimate(user_question, protocol), IL_MAX_TOKENS)
+
+def get_model_response(user_question: str, protocol=None) -> str:
     try:
-        response = client.chat.completions.create(
+        return chat_completion(
             model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": SYSTEM_MESSAGE},
-                {"role": "user", "content": user_question}
-            ],
+            messages=il_messages(user_question, protocol),
             temperature=0.2,
-            max_tokens=1000
+            max_tokens=il_token_budget(user_question, protocol),
+            use_cache=True
         )
-        return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"Error generating IL code: {e}")
-        return "An error occurred while generating IL code."
+        return IL_ERROR_MESSAGE
+
+async def get_model_response_async(user_question: str, protocol=None) -> str:
+    try:
+        return await achat_completion(
+            model=MODEL_NAME,
+            messages=il_messages(user_question, protocol),
+            temperature=0.2,
+            max_tokens=il_token_budget(user_question, protocol),
+            use_cache=True
+        )
+    except Exception as e:
+        print(f"Error generating IL code: {e}")
+        return IL_ERROR_MESSAGE
+
+def stream_model_response(user_question: str, protocol=None):
+    """
+    Yields the IL model output chunk by chunk as it is generated.
+    """
+    yield from stream_chat_completion(
+        model=MODEL_NAME,
+        messages=il_messages(user_question, protocol),
+        temperature=0.2,
+        max_tokens=il_token_budget(user_question, protocol)
+    )
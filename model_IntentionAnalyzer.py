@@ -1,13 +1,13 @@
 # model_IntentionAnalyzer.py
 
-import openai
+import os
+import re
+import threading
 
-client = openai.OpenAI(
-    base_url="http://localhost:11434/v1",
-    api_key="nokeyneeded"
-)
+from model_Client import chat_completion, achat_completion
+from Metrics_Registry import REGISTRY
 
-MODEL_NAME = "phi4"
+MODEL_NAME = os.environ.get("LLM4L5X_INTENT_MODEL", "phi4")
 
 SYSTEM_MESSAGE = (
     "You are an AI agent designed to understand and classify a user's intent related to PLC programming tasks. "
@@ -27,18 +27,126 @@ SYSTEM_MESSAGE = (
     "Do NOT include any additional text, explanations, or conversational elements in your response beyond the specified 'Intent: <Item>' format."
 )
 
+# The answer is a single 'Intent: <Item>' line
+INTENT_MAX_TOKENS = 16
+
+# === Rule-based fast path ===
+# Messages the rules classify with at least this confidence skip the model call entirely
+RULE_CONFIDENCE_THRESHOLD = float(os.environ.get("LLM4L5X_INTENT_RULE_THRESHOLD", "0.8"))
+
+# "output", "make" and "need" are left out: they are everyday words in IL requests
+# ("make output Lamp_1 turn on when ...")
+ACTION_PATTERN = re.compile(
+    r"\b(create|generate|build|write|produce|construct|design|set\s*up|setup|develop|give\s+me)\b",
+    re.IGNORECASE
+)
+# The action has to act on the item: at most this many words between them ("create a new ladder rung"),
+# with no clause break or preposition ("turn on the output of program step 3")
+ACTION_ITEM_GAP = 3
+GAP_BREAK_PATTERN = re.compile(r"[.;:!?]|\b(?:of|when|if|then|that|which|where|while|and|or|but|in|on|at|to|for|is|are)\b",
+                               re.IGNORECASE)
+
+# Checked in this order; the item mentioned first after the action verb wins.
+# Bare "program" and "data type" are too common in IL requests ("program step 3", "data type check")
+# to decide on their own; those messages go to the model.
+ITEM_PATTERNS = [
+    ("Create UDT", re.compile(r"\budts?\b|\buser[\s-]*defined\s+(data\s*)?types?\b", re.IGNORECASE)),
+    ("Create AOI", re.compile(r"\baois?\b|\badd[\s-]*on\s+instructions?\b", re.IGNORECASE)),
+    ("Create L5X Program", re.compile(r"\bl5x\s+programs?\b", re.IGNORECASE)),
+    ("Create Routine", re.compile(r"\broutines?\b", re.IGNORECASE)),
+    ("Create Rung", re.compile(r"\brungs?\b", re.IGNORECASE)),
+    ("Create IL Code", re.compile(r"\bil(\s+code)?\b|\binstruction\s+list\b", re.IGNORECASE)),
+]
+
+INTENT_PATH_STATS = {"rule": 0, "model": 0}
+_stats_lock = threading.Lock()
+
+def _item_mentions(question: str, start: int = 0):
+    """[(position, intent)] of the first mention of each item at or after start, in text order."""
+    mentions = []
+    for intent, pattern in ITEM_PATTERNS:
+        match = pattern.search(question, start)
+        if match:
+            mentions.append((match.start(), intent))
+    return sorted(mentions)
+
+def _acts_on(gap: str) -> bool:
+    """True when the text between an action verb and an item is a short noun-phrase gap ("a new")."""
+    return len(gap.split()) <= ACTION_ITEM_GAP and not GAP_BREAK_PATTERN.search(gap)
+
+def classify_intention_rules(question: str):
+    """
+    Keyword/regex intent classifier.
+    Returns (intent, confidence); intent is None when no PLC item is mentioned.
+    Only an action verb directly followed by the item ("create a rung") reaches the
+    RULE_CONFIDENCE_THRESHOLD; anything looser is left to the model.
+    """
+    for action in ACTION_PATTERN.finditer(question):
+        mentions = _item_mentions(question, action.end())
+        if mentions and _acts_on(question[action.end():mentions[0][0]]):
+            # e.g. "create a routine with 5 rungs": the item the verb acts on wins
+            confidence = 0.95 if len({i for _, i in mentions}) == 1 else 0.85
+            return mentions[0][1], confidence
+
+    mentions = _item_mentions(question)
+    if not mentions:
+        return None, 0.0
+    return mentions[0][1], 0.6 if len({i for _, i in mentions}) == 1 else 0.4
+
+def _rule_intention(question: str):
+    intent, confidence = classify_intention_rules(question)
+    with _stats_lock:
+        if intent and confidence >= RULE_CONFIDENCE_THRESHOLD:
+            INTENT_PATH_STATS["rule"] += 1
+            return f"Intent: {intent}"
+        INTENT_PATH_STATS["model"] += 1
+    return None
+
+def get_intention_path_stats() -> dict:
+    with _stats_lock:
+        return dict(INTENT_PATH_STATS)
+
+def _collect_intent_metrics():
+    stats = get_intention_path_stats()
+    return [("llm4l5x_intent_classifications_total", "counter", "Intent classifications by path (rule fast path or model).",
+             [({"path": path}, count) for path, count in stats.items()])]
+
+REGISTRY.register_collector(_collect_intent_metrics)
+
 def get_intention_response(question: str) -> str:
+    rule_result = _rule_intention(question)
+    if rule_result:
+        return rule_result
+    try:
+        return chat_completion(
+            model=MODEL_NAME,
+            messages=[
+                {"role": "system", "content": SYSTEM_MESSAGE},
+                {"role": "user", "content": question}
+            ],
+            temperature=0.2,
+            max_tokens=INTENT_MAX_TOKENS,
+            use_cache=True
+        )
+    except Exception as e:
+        print(f"Error in intention analyzer: {e}")
+        return ""
+
+async def get_intention_response_async(question: str) -> str:
+    rule_result = _rule_intention(question)
+    if rule_result:
+        return rule_result
     try:
-        response = client.chat.completions.create(
+        return await achat_completion(
             model=MODEL_NAME,
             messages=[
                 {"role": "system", "content": SYSTEM_MESSAGE},
                 {"role": "user", "content": question}
             ],
             temperature=0.2,
-            max_tokens=1000
+            max_tokens=INTENT_MAX_TOKENS,
+            use_cache=True
         )
-        return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"Error in intention analyzer: {e}")
         return ""
@@ -0,0 +1,148 @@
+# model_ResponseCache.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from Metrics_Registry import REGISTRY
+
+# === Configurable variables ===
+CACHE_ENABLED = os.environ.get("LLM4L5X_CACHE_ENABLED", "1") != "0"
+CACHE_MAX_ENTRIES = int(os.environ.get("LLM4L5X_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.environ.get("LLM4L5X_CACHE_TTL", str(7 * 24 * 3600)))  # seconds, 0 = never expire
+CACHE_PATH = os.environ.get("LLM4L5X_CACHE_PATH", "")                       # empty = memory only
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so trivially re-typed questions share one entry. Case is kept (tag names)."""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def make_cache_key(model: str, messages: list, **params) -> str:
+    """
+    Builds the cache key from the model name, a hash of the system prompt(s),
+    the sampling parameters and the normalized user text.
+    Editing a system prompt changes its hash, so old entries are never served again.
+    """
+    system_text = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    user_text = [normalize_text(m["content"]) for m in messages if m["role"] != "system"]
+    key_data = {
+        "model": model,
+        "system": hashlib.sha256(system_text.encode("utf-8")).hexdigest(),
+        "params": params,
+        "user": user_text
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU cache of model responses with TTL expiry.
+    If 'path' is given, entries are also kept in a SQLite file so they survive restarts.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL, path: str = CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()   # key -> (created, value)
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "expired": 0}
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created REAL, value TEXT)")
+            if ttl:
+                self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - ttl,))
+            self._db.commit()
+
+    def _is_expired(self, created: float) -> bool:
+        return bool(self.ttl) and time.time() - created > self.ttl
+
+    def get(self, key: str):
+        """Returns the cached value or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self._is_expired(created):
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+                del self._entries[key]
+                self.stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT created, value FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    created, value = row
+                    if not self._is_expired(created):
+                        self._store(key, created, value)
+                        self.stats["hits"] += 1
+                        self.stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    if entry is None:
+                        self.stats["expired"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        created = time.time()
+        with self._lock:
+            self._store(key, created, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses (key, created, value) VALUES (?, ?, ?)", (key, created, value))
+                self._db.commit()
+
+    def _store(self, key: str, created: float, value: str):
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+RESPONSE_CACHE = ResponseCache() if CACHE_ENABLED else None
+
+
+def _collect_cache_metrics():
+    """Exposes RESPONSE_CACHE statistics on /metrics."""
+    if RESPONSE_CACHE is None:
+        return []
+    stats = RESPONSE_CACHE.get_stats()
+    return [
+        ("llm4l5x_cache_lookups_total", "counter", "Response cache lookups by result.",
+         [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]),
+        ("llm4l5x_cache_disk_hits_total", "counter", "Hits served from the SQLite store.", [({}, stats["disk_hits"])]),
+        ("llm4l5x_cache_evictions_total", "counter", "Entries dropped by the LRU limit.", [({}, stats["evictions"])]),
+        ("llm4l5x_cache_expired_total", "counter", "Entries dropped by the TTL.", [({}, stats["expired"])]),
+        ("llm4l5x_cache_entries", "gauge", "Entries held in memory.", [({}, stats["entries"])]),
+        ("llm4l5x_cache_hit_ratio", "gauge", "Hits / lookups since start.", [({}, stats["hit_rate"])]),
+    ]
+
+
+REGISTRY.register_collector(_collect_cache_metrics)
@@ -2,13 +2,8 @@
 
 import json
 import re
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-
-# Load local phi-4-mini model
-model_path = r"D:\LLM\phi4mini\models--microsoft--Phi-4-mini-instruct\snapshots\model"
-tokenizer = AutoTokenizer.from_pretrained(model_path)
-model = AutoModelForCausalLM.from_pretrained(model_path)
-pipe = pipeline("text-generation", model=model, tokenizer=tokenizer)
+# Local phi-4-mini is served by the shared inference worker (python model_HFWorker.py)
+from model_HFWorker import generate_text
 
 MODEL_NAME = "phi4-mini"
 
@@ -58,15 +53,7 @@ def extract_udt_tags(user_input: str) -> list:
         for chunk in chunk_fields(user_input):
             full_prompt = f"{SYSTEM_MESSAGE}\nUser Input:\n{chunk.strip()}\n"
 
-            result = pipe(
-                full_prompt,
-                max_new_tokens=512,
-                temperature=0.2,
-                do_sample=False,
-                return_full_text=False
-            )
-
-            content = result[0]['generated_text'].strip()
+            content = generate_text(full_prompt, max_new_tokens=512)
             print(f"\n[model_UDTGen Raw Model Output]\n{content}\n")
 
             json_match = re.search(r'\[.*?\]', content, re.DOTALL)
@@ -1,15 +1,11 @@
 # model_UDTGen.py
 
-import openai
+import os
 import json
 import re # Import the regex module
+from model_Client import chat_completion
 
-client = openai.OpenAI(
-    base_url="http://localhost:11434/v1",
-    api_key="nokeyneeded"
-)
-
-MODEL_NAME = "phi4"
+MODEL_NAME = os.environ.get("LLM4L5X_UDT_MODEL", "phi4")
 
 SYSTEM_MESSAGE = ( """
 You are a PLC automation assistant that extracts UDT field definitions and optionally a UDT name from user instructions.
@@ -56,20 +52,105 @@ Create a UDT named MotorStatus with the following fields: run_status, BOOL, indi
 """
 )
 
+# --- Token budget: JSON wrapper plus one object per field, descriptions echoed from the input ---
+UDT_TOKENS_BASE = 64
+UDT_TOKENS_PER_FIELD = 24
+UDT_MAX_TOKENS = 2000
+
+def udt_token_budget(user_input: str) -> int:
+    field_count = max(user_input.count(";") + 1, user_input.count(",") // 2)
+    budget = UDT_TOKENS_BASE + UDT_TOKENS_PER_FIELD * field_count + len(user_input) // 3
+    return min(budget, UDT_MAX_TOKENS)
+
+# --- Deterministic parser for input that already follows the grammar above ---
+# Explicit name: "named X", "called X", "titled X", "call it X"
+EXPLICIT_UDT_NAME_PATTERN = re.compile(r"\b(?:named|called|titled|call\s+it)\s+[\"']?([A-Za-z_][\w\-]*)", re.IGNORECASE)
+# Bare "UDT X": only taken when X looks like an identifier (see _looks_like_udt_name)
+BARE_UDT_NAME_PATTERN = re.compile(r"\budt\s+[\"']?([A-Za-z_][\w\-]*)", re.IGNORECASE)
+# Words that follow "UDT" in ordinary phrasing ("a UDT containing ...", "a UDT of pump data")
+UDT_NAME_STOP_WORDS = {
+    "named", "called", "titled", "with", "for", "of", "that", "which", "containing", "contains", "has", "having",
+    "holding", "including", "includes", "storing", "using", "to", "the", "a", "an", "and", "or", "in", "on", "is",
+    "as", "from", "like", "definition", "structure", "type", "fields", "members"
+}
+FIELD_TYPE_PATTERN = re.compile(r"^(BOOL|SINT|INT|DINT|REAL|STRING|TIMER|COUNTER)(?:\[(\d+)\])?$", re.IGNORECASE)
+FIELD_NAME_PATTERN = re.compile(r"^[A-Za-z_][^\s,;]*$")
+DEFAULT_UDT_NAME = "Generated_UDT"
+
+def _looks_like_udt_name(token: str) -> bool:
+    """A bare word after 'UDT' is a name only if it is capitalised or has '_' or a digit, and is not a function word."""
+    if token.lower() in UDT_NAME_STOP_WORDS:
+        return False
+    return token[0].isupper() or "_" in token or any(ch.isdigit() for ch in token)
+
+def extract_udt_name(text: str) -> str:
+    """UDT name stated in text, sanitized, or DEFAULT_UDT_NAME when none is given."""
+    name_match = EXPLICIT_UDT_NAME_PATTERN.search(text)
+    if not (name_match and name_match.group(1).lower() not in UDT_NAME_STOP_WORDS):
+        name_match = BARE_UDT_NAME_PATTERN.search(text)
+        if not (name_match and _looks_like_udt_name(name_match.group(1))):
+            return DEFAULT_UDT_NAME
+    return re.sub(r"[^A-Za-z0-9_]", "_", name_match.group(1))
+
+def parse_udt_fields(user_input: str):
+    """
+    Parses 'name, type[, description]' fields separated by semicolons without calling the model.
+    Applies the same rules as SYSTEM_MESSAGE (TYPE[N] arrays, BOOL arrays in multiples of 32,
+    description defaults to the name). Returns the same dict as extract_udt_tags, or None when
+    the input is free-form text that needs the model.
+    """
+    text = user_input.strip()
+    head, sep, fields_text = text.partition(":")
+    if not sep:
+        fields_text = text
+    if ";" not in fields_text and "," not in fields_text:
+        return None
+
+    udt_name = extract_udt_name(head if sep else text)
+
+    tags = []
+    for segment in fields_text.split(";"):
+        if not segment.strip():
+            continue
+        values = [v.strip() for v in segment.split(",")]
+        if not FIELD_NAME_PATTERN.match(values[0]):
+            return None  # prose, not a field definition
+        if len(values) not in (2, 3):
+            continue
+
+        type_match = FIELD_TYPE_PATTERN.match(values[1].replace(" ", ""))
+        if not type_match:
+            continue
+        base_type, size = type_match.group(1).upper(), type_match.group(2)
+        if size is not None:
+            dimension = int(size)
+            if dimension <= 0 or (base_type == "BOOL" and (dimension % 32 or dimension > 1024)):
+                continue
+
+        name = re.sub(r"[^A-Za-z0-9_]", "_", values[0])
+        description = values[2] if len(values) == 3 and values[2] else name
+        tags.append({
+            "name": name,
+            "type": f"{base_type}[{size}]" if size is not None else base_type,
+            "description": description
+        })
+
+    if not tags:
+        return None
+    return {"udt_name": udt_name, "tags": tags}
+
 def extract_udt_tags(user_input: str) -> dict: # Change return type hint to dict
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
             model=MODEL_NAME,
             messages=[
                 {"role": "system", "content": SYSTEM_MESSAGE}, # SYSTEM_MESSAGE is global
                 {"role": "user", "content": user_input}
             ],
             temperature=0.1,
-            max_tokens=2000
+            max_tokens=udt_token_budget(user_input)
         )
 
-        content = response.choices[0].message.content.strip()
-
         print(f"\n[model_UDTGen Raw Model Output]\n{content}\n") # Keep this for continued debugging visibility
 
         # --- NEW CODE: Extract JSON from Markdown code block ---
@@ -0,0 +1,153 @@
+# model_WarmUp.py
+
+import os
+import time
+import hashlib
+import threading
+
+import httpx
+
+from model_Client import BASE_URL, CONNECT_TIMEOUT, READ_TIMEOUT
+from model_Backend import get_backend
+import model_ILCodeGen
+import model_IntentionAnalyzer
+import model_UDTGen
+
+# === Configurable variables ===
+KEEP_ALIVE = os.environ.get("LLM4L5X_KEEP_ALIVE", "30m")                    # how long Ollama keeps a model loaded
+REFRESH_INTERVAL = float(os.environ.get("LLM4L5X_KEEP_ALIVE_REFRESH", "600"))  # seconds between keep-alive pings, 0 = off
+WARMUP_TIMEOUT = float(os.environ.get("LLM4L5X_WARMUP_TIMEOUT", "600"))      # first load of a large model can be slow
+
+# Ollama's native API lives next to its OpenAI-compatible /v1 endpoint
+OLLAMA_API_URL = BASE_URL.rstrip("/").removesuffix("/v1")
+
+# (model, system prompt) pairs to preload and prime
+WARMUP_TARGETS = [
+    (model_ILCodeGen.MODEL_NAME, model_ILCodeGen.SYSTEM_MESSAGES[model_ILCodeGen.resolve_protocol()]),
+    (model_IntentionAnalyzer.MODEL_NAME, model_IntentionAnalyzer.SYSTEM_MESSAGE),
+    (model_UDTGen.MODEL_NAME, model_UDTGen.SYSTEM_MESSAGE)
+]
+
+READINESS = {"ready": False, "started": None, "finished": None, "targets": {}}
+_readiness_lock = threading.Lock()
+_warmup_thread = None
+
+
+def _target_key(model: str, system_prompt: str) -> str:
+    return f"{model}:{hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()[:8]}"
+
+
+def warm_target(http_client: httpx.Client, model: str, system_prompt: str) -> float:
+    """
+    Loads the model with the configured keep-alive and evaluates its system prompt once,
+    generating a single token, so the prompt prefix is cached for the first real request.
+    Returns the elapsed seconds.
+    """
+    start_time = time.time()
+    response = http_client.post(f"{OLLAMA_API_URL}/api/chat", json={
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "ping"}
+        ],
+        "stream": False,
+        "keep_alive": KEEP_ALIVE,
+        "options": {"num_predict": 1}
+    })
+    response.raise_for_status()
+    return time.time() - start_time
+
+
+def keep_alive(http_client: httpx.Client, model: str):
+    """Resets the model's unload timer without generating anything."""
+    response = http_client.post(f"{OLLAMA_API_URL}/api/generate", json={"model": model, "keep_alive": KEEP_ALIVE})
+    response.raise_for_status()
+
+
+def _set_target(key: str, **fields):
+    with _readiness_lock:
+        READINESS["targets"].setdefault(key, {}).update(fields)
+
+
+def _set_model_status(model: str, status: str, error: str = None):
+    """
+    Records a keep-alive result for every target of model and recomputes READINESS["ready"],
+    so readiness drops while a model is failing and comes back with the next successful ping.
+    """
+    with _readiness_lock:
+        for target in READINESS["targets"].values():
+            if target.get("model") == model:
+                target.update(status=status, error=error, checked=time.time())
+        READINESS["ready"] = bool(READINESS["targets"]) and all(
+            target.get("status") == "warm" for target in READINESS["targets"].values())
+
+
+def warm_up_models():
+    """
+    Preloads and primes every WARMUP_TARGETS entry. READINESS["ready"] turns True once all succeeded.
+    """
+    with _readiness_lock:
+        READINESS["started"] = time.time()
+    all_warm = True
+    with httpx.Client(timeout=httpx.Timeout(WARMUP_TIMEOUT, connect=CONNECT_TIMEOUT)) as http_client:
+        for model, system_prompt in WARMUP_TARGETS:
+            key = _target_key(model, system_prompt)
+            _set_target(key, model=model, status="loading")
+            try:
+                elapsed = warm_target(http_client, model, system_prompt)
+                _set_target(key, status="warm", load_time=round(elapsed, 2), error=None)
+                print(f"[model_WarmUp] {model} warm in {elapsed:.2f}s")
+            except Exception as e:
+                all_warm = False
+                _set_target(key, status="error", error=str(e))
+                print(f"[model_WarmUp] Failed to warm {model}: {e}")
+    with _readiness_lock:
+        READINESS["ready"] = all_warm
+        READINESS["finished"] = time.time()
+    return all_warm
+
+
+def _warmup_loop():
+    while not warm_up_models():
+        time.sleep(min(30.0, REFRESH_INTERVAL or 30.0))
+
+    if not REFRESH_INTERVAL:
+        return
+    models = sorted({model for model, _ in WARMUP_TARGETS})
+    with httpx.Client(timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)) as http_client:
+        while True:
+            time.sleep(REFRESH_INTERVAL)
+            for model in models:
+                try:
+                    keep_alive(http_client, model)
+                    _set_model_status(model, "warm")
+                except Exception as e:
+                    _set_model_status(model, "error", str(e))
+                    print(f"[model_WarmUp] Keep-alive for {model} failed: {e}")
+
+
+def start_warmup():
+    """
+    Starts warm-up (retried until it succeeds) and the keep-alive refresher in a daemon thread.
+    Safe to call more than once.
+    """
+    global _warmup_thread
+    if get_backend().name not in ("openai", "record"):
+        # Only the Ollama server has models to preload; other backends are ready immediately
+        with _readiness_lock:
+            READINESS["ready"] = True
+        return None
+    if _warmup_thread is None:
+        _warmup_thread = threading.Thread(target=_warmup_loop, name="model_WarmUp", daemon=True)
+        _warmup_thread.start()
+    return _warmup_thread
+
+
+def get_readiness() -> dict:
+    with _readiness_lock:
+        return {
+            "ready": READINESS["ready"],
+            "started": READINESS["started"],
+            "finished": READINESS["finished"],
+            "targets": {key: dict(value) for key, value in READINESS["targets"].items()}
+        }
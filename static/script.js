@@ -419,6 +419,39 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    /**
+     * Reads a Server-Sent Events response body and calls onEvent(event, data) for every event.
+     * @param {Response} response - The fetch response with a text/event-stream body.
+     * @param {function} onEvent - Callback receiving the event name and its parsed JSON data.
+     */
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                const dataLines = [];
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+                });
+                if (dataLines.length) {
+                    onEvent(event, JSON.parse(dataLines.join('\n')));
+                }
+            }
+        }
+    }
+
     /**
      * Handles sending user messages to the server.
      */
@@ -492,23 +525,45 @@ document.addEventListener('DOMContentLoaded', () => {
                     downloadFile(downloadInfo);
                 }
 
-            } else { // Regular chat message via /chat endpoint
-                response = await fetch('/chat', {
+            } else { // Regular chat message via the streaming /chat_stream endpoint
+                response = await fetch('/chat_stream', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ message: messageText })
                 });
 
-                if (chatWindow.contains(loadingMessageDiv)) {
-                    chatWindow.removeChild(loadingMessageDiv);
-                }
-
                 if (!response.ok) {
+                    if (chatWindow.contains(loadingMessageDiv)) {
+                        chatWindow.removeChild(loadingMessageDiv);
+                    }
                     const errorData = await response.json();
                     throw new Error(errorData.response?.text || errorData.message || 'Server error.');
                 }
 
-                const data = await response.json();
+                // Show each validated LineX block as soon as the server emits it
+                let streamedLinesPre = null;
+                let data = null;
+                await readEventStream(response, (event, payload) => {
+                    if (event === 'line') {
+                        if (!streamedLinesPre) {
+                            streamedLinesPre = document.createElement('pre');
+                            streamedLinesPre.classList.add('code-style');
+                            loadingMessageDiv.appendChild(streamedLinesPre);
+                        }
+                        streamedLinesPre.textContent += `Line${payload.index + 1}: ${payload.output_operation}  [${payload.match === 'Yes' ? '✔' : '✘'}]\n`;
+                        scrollToBottom();
+                    } else if (event === 'final') {
+                        data = payload;
+                    }
+                });
+
+                if (chatWindow.contains(loadingMessageDiv)) {
+                    chatWindow.removeChild(loadingMessageDiv);
+                }
+                if (!data) {
+                    throw new Error('Stream ended without a response.');
+                }
+
                 const { text: botResponseText, is_code: isCode, duration, download: downloadInfo, requires_confirmation: requiresConfirmation, confirmation_data: confirmationData } = data.response;
 
                 addMessage('bot', botResponseText, isCode ? 'code' : 'text', duration, requiresConfirmation, confirmationData);
@@ -0,0 +1,89 @@
+# test_Chat_ProcessSingleInput.py
+#
+# Single-question and batch pipeline with the model calls replaced by canned output.
+
+import asyncio
+import pytest
+
+import Chat_ProcessSingleInput as pipeline
+from model_ILCodeGen import IL_ERROR_MESSAGE
+
+QUESTION = "Check if Start_PB is pressed then turn on Motor"
+
+@pytest.fixture
+def model_output(monkeypatch):
+    """Answers every model call with the output set on the returned dict."""
+    canned = {"output": ""}
+
+    async def fake_response(prompt, protocol=None):
+        return canned["output"]
+
+    monkeypatch.setattr(pipeline, "TEMPLATE_SYNTHESIS", False)
+    monkeypatch.setattr(pipeline, "get_model_response_async", fake_response)
+    return canned
+
+@pytest.mark.parametrize("output", [IL_ERROR_MESSAGE, "", "Sorry, I cannot help with that."])
+def test_unusable_model_output_is_an_error(model_output, output):
+    model_output["output"] = output
+    result = asyncio.run(pipeline.process_question_async(QUESTION, "full"))
+    assert result["final_output"] == "Error"
+    assert result["error"]
+
+def test_model_error_message_is_reported(model_output):
+    model_output["output"] = IL_ERROR_MESSAGE
+    result = asyncio.run(pipeline.process_question_async(QUESTION, "full"))
+    assert result["error"] == IL_ERROR_MESSAGE
+
+def test_parsed_output_is_sanitized(model_output):
+    model_output["output"] = ("Line1: Check if Start_PB is pressed\nFound Keyword: is pressed\n"
+                              "Inferred Operation: CHECK IF ON\nOutput Operation: XIC(Start_PB)\n\n"
+                              "Line2: turn on Motor\nFound Keyword: turn on\n"
+                              "Inferred Operation: OUTPUT ENERGIZE\nOutput Operation: OTE(Motor)")
+    result = asyncio.run(pipeline.process_question_async(QUESTION, "full"))
+    assert result["error"] is None
+    assert "XIC(Start_PB)" in result["final_output"] and "OTE(Motor)" in result["final_output"]
+
+def echo_blocks(prompt, protocol=None):
+    """A model that answers every LineN of the prompt with one block."""
+    blocks = []
+    for line in prompt.splitlines():
+        label, _, text = line.partition(":")
+        blocks.append(f"{label}: {text.strip()}\nFound Keyword: turn on\n"
+                      f"Inferred Operation: OUTPUT ENERGIZE\nOutput Operation: OTE(Lamp)")
+    return "\n\n".join(blocks)
+
+def test_batches_stay_within_the_output_cap(monkeypatch):
+    prompts = []
+
+    async def fake_response(prompt, protocol=None):
+        prompts.append(prompt)
+        return echo_blocks(prompt)
+
+    monkeypatch.setattr(pipeline, "TEMPLATE_SYNTHESIS", False)
+    monkeypatch.setattr(pipeline, "get_model_response_async", fake_response)
+    questions = [f"Check if Start_{i} is pressed then turn on Lamp_{i}" for i in range(30)]
+    # Together the rows need far more than one capped answer
+    assert pipeline.il_token_estimate(pipeline.build_batch_prompt(questions), "full") > pipeline.IL_MAX_TOKENS
+
+    results = pipeline.process_question_batch(questions, "full")
+    assert len(prompts) > 1
+    assert all(pipeline.il_token_estimate(prompt, "full") <= pipeline.IL_MAX_TOKENS for prompt in prompts)
+    assert all(prompt.startswith("Line1:") and "\n" in prompt for prompt in prompts)   # no single-question retries
+    assert sum(prompt.count("\n") + 1 for prompt in prompts) == 2 * len(questions)
+    assert all(result["batched"] and result["error"] is None for result in results)
+
+def test_batched_rows_are_reprompted(monkeypatch):
+    prompts = []
+
+    async def fake_response(prompt, protocol=None):
+        prompts.append(prompt)
+        return echo_blocks(prompt)
+
+    monkeypatch.setattr(pipeline, "TEMPLATE_SYNTHESIS", False)
+    monkeypatch.setattr(pipeline, "REPROMPT_MODE", "full")
+    monkeypatch.setattr(pipeline, "get_model_response_async", fake_response)
+    # The canned OTE does not match the 'is pressed' lines, so every row needs a reprompt
+    results = pipeline.process_question_batch(["Check if Start_1 is pressed then turn on Lamp_1",
+                                               "Check if Start_2 is pressed then turn on Lamp_2"], "full")
+    assert all(result["batched"] and result["reprompted"] for result in results)
+    assert len(prompts) == 3
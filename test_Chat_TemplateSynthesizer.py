@@ -0,0 +1,26 @@
+# test_Chat_TemplateSynthesizer.py
+#
+# Template synthesis must leave anything it cannot resolve with confidence to the model.
+
+import pytest
+
+from Chat_TemplateSynthesizer import synthesize_line
+
+@pytest.mark.parametrize("line", [
+    "Set Speed_SP equal to 5",
+    "set Speed_SP to be equal to Max_Speed",
+    "Assign Speed_SP equal to 5",
+    "Speed_SP should be set equal to 5",
+    "Make Speed_SP equal to 5",
+    "Store 5 equal to Speed_SP",
+])
+def test_assignments_are_not_comparisons(line):
+    assert synthesize_line(line) is None
+
+@pytest.mark.parametrize("line, expected", [
+    ("Check if Speed_SP is equal to 5", "EQ(Speed_SP,5)"),
+    ("Check if Count_1 equals 10", "EQ(Count_1,10)"),
+    ("Check if Level_1 is greater than 50", "GT(Level_1,50)"),
+])
+def test_comparisons(line, expected):
+    assert synthesize_line(line)[1] == expected
@@ -0,0 +1,31 @@
+# test_model_IntentionAnalyzer.py
+#
+# Rule-based intent fast path: only an action acting on a PLC item may skip the model.
+
+import pytest
+
+from model_IntentionAnalyzer import classify_intention_rules, RULE_CONFIDENCE_THRESHOLD
+
+@pytest.mark.parametrize("question", [
+    "Check if Start_PB is pressed then turn on the output of program step 3",
+    "Make output Lamp_1 turn on when data type check var3 is equal to 5",
+    "I need a rung",
+    "Turn on Lamp when the routine is done",
+    "write to the rung",
+])
+def test_il_requests_go_to_the_model(question):
+    intent, confidence = classify_intention_rules(question)
+    assert intent is None or confidence < RULE_CONFIDENCE_THRESHOLD
+
+@pytest.mark.parametrize("question, expected", [
+    ("Write IL code for a motor start", "Create IL Code"),
+    ("Generate a rung: if Start then Motor", "Create Rung"),
+    ("Create a new ladder rung that latches Motor", "Create Rung"),
+    ("create a routine with 5 rungs", "Create Routine"),
+    ("Create a UDT named Pump: a, BOOL", "Create UDT"),
+    ("please build an L5X program with two routines", "Create L5X Program"),
+    ("create an AOI", "Create AOI"),
+])
+def test_direct_requests_use_the_rules(question, expected):
+    intent, confidence = classify_intention_rules(question)
+    assert intent == expected and confidence >= RULE_CONFIDENCE_THRESHOLD
@@ -0,0 +1,37 @@
+# test_model_UDTGen.py
+#
+# UDT name extraction in the deterministic field parser (parse_udt_fields).
+
+import pytest
+
+from model_UDTGen import parse_udt_fields, extract_udt_name, DEFAULT_UDT_NAME
+
+FIELDS = "Speed, REAL; Running, BOOL"
+
+@pytest.mark.parametrize("text, expected", [
+    ("Create a UDT called Pump", "Pump"),
+    ("Create a UDT titled Conveyor_Data", "Conveyor_Data"),
+    ("Create a UDT named MotorStatus with the following fields", "MotorStatus"),
+    ("Make a UDT, call it Valve2", "Valve2"),
+    ("Create UDT MotorStatus with the following fields", "MotorStatus"),
+    ("Create UDT motor_data", "motor_data"),
+    ("Create a UDT containing", DEFAULT_UDT_NAME),
+    ("Create a UDT that has", DEFAULT_UDT_NAME),
+    ("Create a UDT of pump data", DEFAULT_UDT_NAME),
+    ("Create a UDT for the pumps", DEFAULT_UDT_NAME),
+    ("Create a UDT with fields", DEFAULT_UDT_NAME),
+    ("create a udt pumps", DEFAULT_UDT_NAME),
+])
+def test_extract_udt_name(text, expected):
+    assert extract_udt_name(text) == expected
+
+@pytest.mark.parametrize("head, expected", [
+    ("Create a UDT called Pump", "Pump"),
+    ("a UDT containing", DEFAULT_UDT_NAME),
+    ("a UDT that has", DEFAULT_UDT_NAME),
+    ("a UDT of pump data", DEFAULT_UDT_NAME),
+])
+def test_parse_udt_fields_name(head, expected):
+    result = parse_udt_fields(f"{head}: {FIELDS}")
+    assert result["udt_name"] == expected
+    assert [tag["name"] for tag in result["tags"]] == ["Speed", "Running"]